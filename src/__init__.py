@@ -1 +1 @@
-__all__ = ["models", "preprocessor"]
+__all__ = ["benchmark", "models", "preprocessor"]
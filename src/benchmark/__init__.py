@@ -0,0 +1 @@
+__all__ = ["suite", "synthetic_chocolate"]
@@ -0,0 +1,398 @@
+# author: Manvir Kohli, Julie Song, Kelvin Wong
+# date: 2026-10-18
+
+"""This script benchmarks the preprocessing, the fit of a candidate of every
+tuner, the prediction throughput and the cold start of the command line on
+synthetic chocolate datasets of increasing size. Every benchmark runs in a fresh process, so that its peak
+memory is measured on its own, and the results are written as JSON, along
+with the commit they were measured on, to compare them across commits.
+
+Usage: src/benchmark/suite.py [--sizes=<sizes>] [--benchmarks=<names>] [--output=<output_json>] [--compare=<baseline_json>] [--source=<source_csv>]
+
+Options:
+--sizes=<sizes>              Comma-separated numbers of rows [default: 10000,100000,1000000]
+--benchmarks=<names>         Comma-separated benchmarks to run, e.g. fit_ridge,predict_ridge, all of them if omitted
+--output=<output_json>       Path to the results, results/benchmarks/<commit>.json if omitted
+--compare=<baseline_json>    Path to the results of another commit to compare with
+--source=<source_csv>        Path to the real dataset to sample from [default: data/raw/chocolate.csv]
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from docopt import docopt
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_percentage_error
+from sklearn.model_selection import ParameterSampler
+
+from ..models.chocolate_decision_tree import ChocolateDecisionTreeTuner
+from ..models.chocolate_knn import ChocolateKNNTuner
+from ..models.chocolate_random_forest import ChocolateRandomForestTuner
+from ..models.chocolate_ridge import ChocolateRidgeTuner
+from ..models.chocolate_svm_rbf import ChocolateSvmRbfTuner
+from ..models.compiled_scorer import compile_pipeline
+from ..models.model_artifact import dump_model
+from ..preprocessor.chocolate import make_preprocessor
+from ..profiling import peak_memory_mib
+from .synthetic_chocolate import ChocolateSynthesizer
+
+TARGET = 'rating'
+
+# Number of components of the Nystroem approximation of the RBF kernel
+NYSTROEM_COMPONENTS = 300
+
+
+def _svm_rbf_nystroem_tuner():
+    tuner = ChocolateSvmRbfTuner()
+    tuner.nystroem_components = NYSTROEM_COMPONENTS
+    return tuner
+
+
+TUNERS = {
+    'decision_tree': ChocolateDecisionTreeTuner,
+    'knn': ChocolateKNNTuner,
+    'random_forest': ChocolateRandomForestTuner,
+    'ridge': ChocolateRidgeTuner,
+    'svm_rbf': ChocolateSvmRbfTuner,
+    'svm_rbf_nystroem': _svm_rbf_nystroem_tuner
+}
+
+# Number of rows the models of the prediction benchmarks are fitted on
+PREDICT_TRAIN_ROWS = 10000
+
+# Number of rows predicted by the cold start benchmarks, and number of times
+# the command is run, of which the median time is reported
+COLD_START_ROWS = 10
+COLD_START_RUNS = 5
+
+# The largest datasets the benchmarks of a model run on, as a forest of
+# hundreds of deep trees and the kernel and neighbour models would take hours
+# on the largest ones, and the cold starts only use the first rows
+MAX_ROWS = {
+    'cold_start_help': 10000,
+    'cold_start_predict_ridge': 10000,
+    'cold_start_predict_ridge_compiled': 10000,
+    'fit_random_forest': 10000,
+    'fit_svm_rbf': 10000,
+    'predict_knn': 100000,
+    'predict_svm_rbf': 100000
+}
+
+
+def _sample_candidate(tuner, X, y):
+    # The first candidate the search of the tuner would try, in the pipeline
+    # the best candidate is refitted with
+    tuner.pipeline = tuner.create_pipeline()
+    tuner.pipeline.steps[0][1].fit(X, y)
+    candidate = next(iter(ParameterSampler(
+        tuner.param_distribution(), 1, random_state=522)))
+    pipeline = tuner.create_refit_pipeline() or tuner.pipeline
+    return clone(pipeline).set_params(**candidate), candidate
+
+
+def bench_preprocessor(X, y, sparse_output=False):
+    """
+    Time the fit and transform of the preprocessor
+
+    Parameters
+    ----------
+    X : pandas.DataFrame
+        The features
+    y : pandas.Series
+        The target
+    sparse_output : bool
+        Whether to benchmark the sparse preprocessor, defaulted to `False`
+
+    Returns
+    -------
+    dict :
+        The wall time in seconds
+    """
+    start_time = time.perf_counter()
+    make_preprocessor(sparse_output=sparse_output).fit_transform(X, y)
+    return {'seconds': time.perf_counter() - start_time}
+
+
+def bench_fit(X, y, family):
+    """
+    Time the fit of the first candidate of a tuner
+
+    Parameters
+    ----------
+    X : pandas.DataFrame
+        The features
+    y : pandas.Series
+        The target
+    family : str
+        The model family, a key of `TUNERS`
+
+    Returns
+    -------
+    dict :
+        The wall time in seconds and the candidate
+    """
+    pipeline, candidate = _sample_candidate(TUNERS[family](), X, y)
+    start_time = time.perf_counter()
+    pipeline.fit(X, y)
+    return {'seconds': time.perf_counter() - start_time,
+            'candidate': candidate}
+
+
+def bench_predict(X, y, family):
+    """
+    Time the predictions of the first candidate of a tuner, fitted on the
+    first `PREDICT_TRAIN_ROWS` rows, and score them on the other rows
+
+    Parameters
+    ----------
+    X : pandas.DataFrame
+        The features
+    y : pandas.Series
+        The target
+    family : str
+        The model family, a key of `TUNERS`
+
+    Returns
+    -------
+    dict :
+        The wall time in seconds, the throughput in rows per second and the
+        MAPE on the rows the candidate was not fitted on
+    """
+    X_train, y_train = X.iloc[:PREDICT_TRAIN_ROWS], y.iloc[:PREDICT_TRAIN_ROWS]
+    pipeline, candidate = _sample_candidate(TUNERS[family](), X_train, y_train)
+    pipeline.fit(X_train, y_train)
+    start_time = time.perf_counter()
+    y_pred = pipeline.predict(X)
+    seconds = time.perf_counter() - start_time
+    holdout_mape = (mean_absolute_percentage_error(
+        y.iloc[PREDICT_TRAIN_ROWS:], y_pred[PREDICT_TRAIN_ROWS:])
+        if len(X) > PREDICT_TRAIN_ROWS else None)
+    return {'seconds': seconds, 'rows_per_second': len(X) / seconds,
+            'holdout_mape': holdout_mape, 'candidate': candidate}
+
+
+def bench_cold_start(X, y, command, compiled=False):
+    """
+    Time a command of the command line in a fresh interpreter, from its start
+    to its exit
+
+    The `predict` command predicts `COLD_START_ROWS` rows with a Ridge
+    pipeline fitted on the first `PREDICT_TRAIN_ROWS` rows, or with the scorer
+    compiled from it.
+
+    Parameters
+    ----------
+    X : pandas.DataFrame
+        The features
+    y : pandas.Series
+        The target
+    command : str
+        `"help"` or `"predict"`
+    compiled : bool
+        Whether `predict` uses the compiled scorer, defaulted to `False`
+
+    Returns
+    -------
+    dict :
+        The median wall time in seconds of `COLD_START_RUNS` runs
+    """
+    package = __package__.split('.')[0]
+    root = os.path.dirname(os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__))))
+    with tempfile.TemporaryDirectory() as work_dir:
+        arguments = ['--help']
+        if command == 'predict':
+            X_train = X.iloc[:PREDICT_TRAIN_ROWS]
+            y_train = y.iloc[:PREDICT_TRAIN_ROWS]
+            pipeline, _ = _sample_candidate(
+                TUNERS['ridge'](), X_train, y_train)
+            pipeline.fit(X_train, y_train)
+            model_path = os.path.join(work_dir, 'ridge.joblib')
+            if compiled:
+                model_path = os.path.join(work_dir, 'ridge.scorer')
+                compile_pipeline(pipeline).save(model_path)
+            else:
+                dump_model(pipeline, model_path)
+            input_path = os.path.join(work_dir, 'rows.csv')
+            X.iloc[:COLD_START_ROWS].assign(**{TARGET: y}).to_csv(
+                input_path, index=False)
+            arguments = [
+                'predict', f'--input={input_path}',
+                f'--output={os.path.join(work_dir, "predictions.csv")}',
+                f'--model={model_path}']
+
+        seconds = []
+        for _ in range(COLD_START_RUNS):
+            start_time = time.perf_counter()
+            subprocess.run([sys.executable, '-m', package, *arguments],
+                           cwd=root, capture_output=True, check=True)
+            seconds.append(time.perf_counter() - start_time)
+    return {'seconds': statistics.median(seconds)}
+
+
+BENCHMARKS = {
+    'preprocessor': (bench_preprocessor, {}),
+    'preprocessor_sparse': (bench_preprocessor, {'sparse_output': True}),
+    **{f'fit_{family}': (bench_fit, {'family': family})
+       for family in TUNERS},
+    **{f'predict_{family}': (bench_predict, {'family': family})
+       for family in TUNERS},
+    'cold_start_help': (bench_cold_start, {'command': 'help'}),
+    'cold_start_predict_ridge': (bench_cold_start, {'command': 'predict'}),
+    'cold_start_predict_ridge_compiled': (
+        bench_cold_start, {'command': 'predict', 'compiled': True})
+}
+
+
+def _run_benchmark(name, data_path):
+    # Runs in a fresh process, where the peak memory before the benchmark is
+    # that of loading the data
+    X, y = joblib.load(data_path)
+    baseline = peak_memory_mib()
+    function, kwargs = BENCHMARKS[name]
+    try:
+        result = function(X, y, **kwargs)
+    except Exception as error:
+        result = {'error': f'{type(error).__name__}: {error}'}
+    return result | {'baseline_mib': baseline, 'peak_mib': peak_memory_mib()}
+
+
+def _to_json(value):
+    # The sampled candidates hold NumPy scalars
+    return value.tolist() if hasattr(value, 'tolist') else str(value)
+
+
+def _commit():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}-dirty' if dirty else commit
+
+
+def run_suite(sizes, benchmarks, source_path):
+    """
+    Run the benchmarks on synthetic datasets of every size
+
+    Parameters
+    ----------
+    sizes : list of int
+        Numbers of rows of the synthetic datasets
+    benchmarks : list of str
+        Names of the benchmarks, keys of `BENCHMARKS`
+    source_path : str
+        Path to the real dataset to sample from
+
+    Returns
+    -------
+    dict :
+        The environment of the run and a list of results, one per benchmark
+        and size, with the wall time in seconds and the peak memory in MiB
+    """
+    synthesizer = ChocolateSynthesizer(pd.read_csv(source_path))
+    results = []
+    # Every benchmark gets a fresh, spawned process
+    with tempfile.TemporaryDirectory() as data_dir, ProcessPoolExecutor(
+            1, mp_context=multiprocessing.get_context('spawn'),
+            max_tasks_per_child=1) as executor:
+        for n_rows in sizes:
+            data = synthesizer.sample(n_rows, random_state=522)
+            data_path = os.path.join(data_dir, f'{n_rows}.joblib')
+            joblib.dump((data.drop(columns=[TARGET]), data[TARGET]), data_path)
+            del data
+
+            for name in benchmarks:
+                result = {'benchmark': name, 'n_rows': n_rows}
+                if n_rows > MAX_ROWS.get(name, np.inf):
+                    result['skipped'] = f'more than {MAX_ROWS[name]} rows'
+                else:
+                    result |= executor.submit(
+                        _run_benchmark, name, data_path).result()
+                print(json.dumps(result, default=_to_json))
+                results.append(result)
+
+    return {
+        'commit': _commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scikit-learn': sklearn.__version__,
+            'cpu_count': os.cpu_count(),
+            'platform': platform.platform()
+        },
+        'results': results
+    }
+
+
+def compare(results, baseline):
+    """
+    Compare benchmark results with those of another commit
+
+    Parameters
+    ----------
+    results : dict
+        The results, as returned by `run_suite`
+    baseline : dict
+        The results of the other commit
+
+    Returns
+    -------
+    pandas.DataFrame :
+        The wall time and peak memory of both commits and their ratios, for
+        every benchmark and size both have measured
+    """
+    def table(run):
+        return pd.DataFrame([
+            r for r in run['results'] if 'seconds' in r
+        ]).set_index(['benchmark', 'n_rows'])[['seconds', 'peak_mib']]
+
+    comparison = table(baseline).join(
+        table(results), lsuffix='_baseline', how='inner')
+    comparison['speedup'] = (
+        comparison['seconds_baseline'] / comparison['seconds'])
+    comparison['memory_ratio'] = (
+        comparison['peak_mib'] / comparison['peak_mib_baseline'])
+    return comparison.round(3)
+
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+
+    source_path = opt["--source"]
+    assert os.path.isfile(source_path), "Please check the source filepath"
+    benchmarks = (opt["--benchmarks"].split(',') if opt["--benchmarks"]
+                  else list(BENCHMARKS))
+    assert set(benchmarks) <= set(BENCHMARKS), \
+        f"Please choose the benchmarks among {', '.join(BENCHMARKS)}"
+    sizes = [int(size) for size in opt["--sizes"].split(',')]
+
+    results = run_suite(sizes, benchmarks, source_path)
+    output_path = opt["--output"] or os.path.join(
+        'results', 'benchmarks', f"{results['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w') as file:
+        json.dump(results, file, indent=2, default=_to_json)
+    print(f"Saved the results to {output_path}")
+
+    if opt["--compare"]:
+        with open(opt["--compare"]) as file:
+            print(compare(results, json.load(file)).to_string())
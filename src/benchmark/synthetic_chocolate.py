@@ -0,0 +1,141 @@
+# author: Manvir Kohli, Julie Song, Kelvin Wong
+# date: 2026-10-18
+
+"""This script synthesizes a chocolate dataset of any size with the schema of
+`chocolate.csv`, sampled from the empirical distributions of the real data,
+e.g. to benchmark how the pipelines scale.
+
+Usage: src/benchmark/synthetic_chocolate.py --rows=<n_rows> --output=<output_csv> [--source=<source_csv>] [--seed=<seed>]
+
+Options:
+--rows=<n_rows>            Number of rows to synthesize
+--output=<output_csv>      Path to the CSV file to write the rows to
+--source=<source_csv>      Path to the real dataset [default: data/raw/chocolate.csv]
+--seed=<seed>              Seed of the random generator [default: 522]
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from docopt import docopt
+from sklearn.utils import check_random_state
+
+TEXT = 'most_memorable_characteristics'
+
+
+class ChocolateSynthesizer():
+    """
+    Synthesizes chocolate reviews from the empirical distributions of a
+    real dataset.
+
+    Every synthetic row starts from a real row drawn with replacement, which
+    keeps the joint distribution of the company and bean locations, the
+    ingredients, the cocoa percent, the review date and the rating. Its
+    characteristics are then replaced by a sample of the phrases of the real
+    reviews with the same rating, with the real distribution of the number of
+    phrases, so that the text grows in variety with the number of rows while
+    staying related to the rating.
+
+    Attributes
+    ----------
+    columns : list of str
+        The columns of the real dataset
+
+    Methods
+    -------
+    sample(n_rows, random_state = None)
+        Synthesize rows
+    """
+
+    def __init__(self, chocolate_df):
+        """
+        Parameters
+        ----------
+        chocolate_df : pandas.DataFrame
+            The real dataset, with the schema of `chocolate.csv`
+        """
+        self.columns = list(chocolate_df.columns)
+        self._rows = chocolate_df.drop(columns=[TEXT]).reset_index(drop=True)
+
+        phrases = chocolate_df[TEXT].str.split(',')
+        n_phrases = phrases.str.len().value_counts(normalize=True)
+        self._n_phrases = n_phrases.index.to_numpy()
+        self._n_phrases_p = n_phrases.to_numpy()
+
+        exploded = pd.DataFrame({
+            'rating': chocolate_df['rating'],
+            'phrase': phrases
+        }).explode('phrase')
+        exploded['phrase'] = exploded['phrase'].str.strip()
+        self._phrases = {
+            rating: group.to_numpy(dtype=object)
+            for rating, group in exploded.groupby('rating')['phrase']}
+
+    def sample(self, n_rows, random_state=None):
+        """
+        Synthesize rows
+
+        Parameters
+        ----------
+        n_rows : int
+            Number of rows to synthesize
+        random_state : int, numpy.random.RandomState or None
+            The seed or generator of the sample, defaulted to `None`
+
+        Returns
+        -------
+        pandas.DataFrame :
+            The synthetic rows, with the columns of the real dataset
+        """
+        random_state = check_random_state(random_state)
+        rows = self._rows.iloc[
+            random_state.randint(len(self._rows), size=n_rows)
+        ].reset_index(drop=True)
+
+        n_phrases = random_state.choice(
+            self._n_phrases, size=n_rows, p=self._n_phrases_p)
+        characteristics = np.empty(n_rows, dtype=object)
+        ratings = rows['rating'].to_numpy()
+        for rating, phrases in self._phrases.items():
+            indices = np.flatnonzero(ratings == rating)
+            counts = n_phrases[indices]
+            picks = phrases[
+                random_state.randint(len(phrases), size=counts.sum())]
+            characteristics[indices] = [
+                ', '.join(review)
+                for review in np.split(picks, np.cumsum(counts)[:-1])]
+        rows[TEXT] = characteristics
+        return rows[self.columns]
+
+
+def synthesize(n_rows, source_path='data/raw/chocolate.csv', random_state=522):
+    """
+    Synthesize a chocolate dataset
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows to synthesize
+    source_path : str
+        Path to the real dataset, defaulted to `"data/raw/chocolate.csv"`
+    random_state : int, numpy.random.RandomState or None
+        The seed or generator of the sample, defaulted to 522
+
+    Returns
+    -------
+    pandas.DataFrame :
+        The synthetic rows
+    """
+    synthesizer = ChocolateSynthesizer(pd.read_csv(source_path))
+    return synthesizer.sample(n_rows, random_state=random_state)
+
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+
+    source_path = opt["--source"]
+    assert os.path.isfile(source_path), "Please check the source filepath"
+    synthesize(
+        int(opt["--rows"]), source_path, random_state=int(opt["--seed"])
+    ).to_csv(opt["--output"], index=False)
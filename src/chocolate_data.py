@@ -0,0 +1,215 @@
+import csv
+import hashlib
+import os
+
+# pandas is imported by the functions building frames, so that the rows of a
+# file are read with `read_chocolate_rows` without loading it
+
+TARGET = 'rating'
+
+# The dtypes of the columns of `chocolate.csv`. The strings repeated across
+# reviews are categorical, so that they are stored and parsed once per
+# distinct value, while the tasting notes are nearly unique and stay strings.
+SCHEMA = {
+    'ref': 'int64',
+    'company_manufacturer': 'category',
+    'company_location': 'category',
+    'review_date': 'int64',
+    'country_of_bean_origin': 'category',
+    'specific_bean_origin_or_bar_name': 'category',
+    'cocoa_percent': 'category',
+    'ingredients': 'category',
+    'most_memorable_characteristics': 'object',
+    TARGET: 'float64'
+}
+
+# The strings read as missing values, those of `pandas.read_csv` by default,
+# so that `read_chocolate_csv` and `read_chocolate_rows` agree, e.g. on the
+# ingredients written as `NA`
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+    'nan', 'null'
+])
+
+# The range of the ratings of the Manhattan Chocolate Society
+RATING_RANGE = (1.0, 5.0)
+
+
+def _cache_format():
+    # Parquet needs `pyarrow`, otherwise the typed frame is pickled
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'pickle'
+    return 'parquet'
+
+
+def file_digest(path, block_size=2 ** 20):
+    """
+    Hash the content of a file
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+    block_size : int
+        Number of bytes read at once, defaulted to 1 MiB
+
+    Returns
+    -------
+    str :
+        The BLAKE2b hex digest of the content and of `SCHEMA`, so that the
+        cache of a file is invalidated when either changes
+    """
+    digest = hashlib.blake2b(repr(sorted(SCHEMA.items())).encode(),
+                             digest_size=16)
+    with open(path, 'rb') as file:
+        while block := file.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def validate_target(df):
+    """
+    Check that every review has a rating within `RATING_RANGE`
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The reviews
+    """
+    assert TARGET in df, "Please make sure the file contains the Ratings column"
+    ratings = df[TARGET]
+    assert ratings.notna().all(), "Please make sure every review has a rating"
+    assert ratings.between(*RATING_RANGE).all(), \
+        f"Please make sure the ratings are between {RATING_RANGE[0]} and " \
+        f"{RATING_RANGE[1]}"
+
+
+def read_chocolate_csv(path, **kwargs):
+    """
+    Parse a CSV file of chocolate reviews with the dtypes of `SCHEMA`
+
+    Columns missing from the file, e.g. the rating of reviews to predict, are
+    left out.
+
+    Parameters
+    ----------
+    path : str
+        Path to the CSV file
+    **kwargs
+        Extra arguments of `pandas.read_csv`, e.g. `chunksize`
+
+    Returns
+    -------
+    pandas.DataFrame or pandas.io.parsers.TextFileReader :
+        The reviews, or an iterator over chunks of them with `chunksize`
+    """
+    import pandas as pd
+
+    return pd.read_csv(path, dtype=SCHEMA, na_values=NA_VALUES,
+                       keep_default_na=False, **kwargs)
+
+
+def read_chocolate_rows(path):
+    """
+    Read the rows of a CSV file of chocolate reviews as dictionaries, with
+    the types of `SCHEMA`, without pandas
+
+    The integer and float columns are parsed as `int` and `float`, the others
+    are kept as strings, and the values of `NA_VALUES` are `None`, as they
+    are missing in `read_chocolate_csv`.
+
+    Parameters
+    ----------
+    path : str
+        Path to the CSV file
+
+    Returns
+    -------
+    iterator of dict :
+        The reviews, keyed by column
+    """
+    parsers = {'int64': int, 'float64': float}
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            yield {
+                column: None if value in NA_VALUES
+                else parsers.get(SCHEMA.get(column), str)(value)
+                for column, value in row.items()}
+
+
+def load_chocolate(path, cache_dir=None, target=True):
+    """
+    Load a CSV file of chocolate reviews, typed with `SCHEMA`, from a cache
+    keyed by the content of the file
+
+    The first load parses the CSV file and saves the typed frame to the
+    cache, as Parquet if `pyarrow` is installed and as a pickle otherwise.
+    Later loads of the same content skip the parsing, and memory-map the
+    Parquet file. The ratings are validated by every load with `target`, as
+    the cached frame may have been saved by a load without it.
+
+    Parameters
+    ----------
+    path : str
+        Path to the CSV file
+    cache_dir : str or None
+        The folder of the cache, defaulted to `None`, i.e. a `.cache` folder
+        next to the CSV file
+    target : bool
+        Whether to validate the rating column, defaulted to `True`
+
+    Returns
+    -------
+    pandas.DataFrame :
+        The typed reviews
+    """
+    import pandas as pd
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), '.cache')
+    cache_format = _cache_format()
+    cache_path = os.path.join(
+        cache_dir,
+        f'{os.path.splitext(os.path.basename(path))[0]}-{file_digest(path)}'
+        f'.{cache_format}')
+
+    if os.path.isfile(cache_path):
+        if cache_format == 'parquet':
+            df = pd.read_parquet(cache_path, memory_map=True)
+        else:
+            df = pd.read_pickle(cache_path)
+    else:
+        df = read_chocolate_csv(path)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written under a temporary name first, so that an interrupted write
+        # never leaves a truncated cache behind
+        temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+        if cache_format == 'parquet':
+            df.to_parquet(temporary_path, index=False)
+        else:
+            df.to_pickle(temporary_path)
+        os.replace(temporary_path, cache_path)
+    if target:
+        validate_target(df)
+    return df
+
+
+def split_target(df):
+    """
+    Split chocolate reviews into features and target
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The reviews
+
+    Returns
+    -------
+    tuple :
+        The features as a `pandas.DataFrame` and the target as a
+        `pandas.Series`
+    """
+    return df.drop(columns=[TARGET]), df[TARGET]
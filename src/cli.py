@@ -0,0 +1,267 @@
+# author: Manvir Kohli, Julie Song, Kelvin Wong
+# date: 2026-10-18
+
+"""This script is the command line of the chocolate rating models. It tunes
+the model families, evaluates the tuned models on the test data, predicts the
+ratings of a CSV file, compiles tuned models into standalone scorers, and
+runs the workers of the queue execution backend.
+
+Only the modules of the command run are imported, so that `--help`, the
+workers and the predictions of compiled scorers start without scikit-learn,
+and `tune` only imports the model family it tunes. It is run with
+`python -m src <command>`.
+
+Usage:
+  src tune <family> --train=<training_ds> --output=<output_folder> --output-cv=<output_cv_folder> [--sparse] [--search=<strategy>] [--n-cores=<n_cores>] [--inner-threads=<n_threads>] [--checkpoint-dir=<dir>] [--profile] [--text-features=<mode>] [--ngrams=<n>] [--backend=<backend>] [--queue-dir=<dir>] [--svd=<n_components>] [--nystroem=<n_components>] [--oob]
+  src evaluate [--test=<test_csv>] [--models=<model_dir>] [--cv-scores=<cv_dir>] [--output=<output_dir>] [--chunk-size=<n_rows>] [--n-jobs=<n_jobs>]
+  src predict --input=<input_csv> --output=<output_csv> [--model=<model_path>...] [--chunk-size=<n_rows>] [--n-jobs=<n_jobs>]
+  src compile --model=<model_path> [--output=<scorer_path>]
+  src worker --queue-dir=<dir> [--idle-timeout=<seconds>]
+  src (-h | --help)
+
+Commands:
+tune        Tune a model family, one of decision_tree, knn, random_forest, ridge or svm_rbf, or all of them in a single process
+evaluate    Score every tuned model and CV result file on the test data
+predict     Predict the ratings of a CSV file with tuned models or compiled scorers
+compile     Compile a tuned Ridge or decision tree into a standalone scorer
+worker      Run a worker of the queue execution backend
+
+Options:
+--train=<training_ds>          Path to the training dataset, which is a .csv file
+--output-cv=<output_cv_folder> Path to the folder to save the CV score files to
+--sparse                       Keep the preprocessed features sparse end to end
+--search=<strategy>            Search strategy, random, halving or adaptive [default: random]
+--n-cores=<n_cores>            Total number of cores to use, all CPUs if omitted
+--inner-threads=<n_threads>    Number of threads of each candidate fit [default: 1]
+--checkpoint-dir=<dir>         Folder to journal finished fits to, to resume an interrupted search
+--profile                      Trace the time and memory of every transformer and candidate fit
+--text-features=<mode>         Features of the tasting notes, count or hashing [default: count]
+--ngrams=<n>                   Longest n-grams of words of the tasting notes [default: 1]
+--backend=<backend>            Where the candidates are fitted, local or queue [default: local]
+--queue-dir=<dir>              Queue folder of the queue backend, served by `python -m src worker`
+--svd=<n_components>           kNN only: reduce the features to this many SVD components before finding neighbors
+--nystroem=<n_components>      SVM RBF only: approximate the kernel with this many Nystroem components
+--oob                          Random forest only: score the candidates out of bag rather than with CV (scikit-learn 1.4+)
+--test=<test_csv>              Path to the test dataset [default: data/raw/test_df.csv]
+--models=<model_dir>           Path to the folder of the tuned models [default: results/models]
+--cv-scores=<cv_dir>           Path to the folder of the CV results [default: results/cv_scores]
+--input=<input_csv>            Path to the CSV file to score
+--model=<model_path>           Path to a tuned model or compiled scorer, all the tuned models (results/models/tuned_*.joblib) if omitted
+--output=<output>              Path to save the output to: the tuned model folder of tune, the summary folder of evaluate (results if omitted), the predictions of predict, or the scorer of compile (the model path with a .scorer extension if omitted)
+--chunk-size=<n_rows>          Number of rows scored at once, 10000 for predict and 100000 for evaluate if omitted
+--n-jobs=<n_jobs>              Number of worker processes, 1 for predict and all CPUs (-1) for evaluate if omitted
+--idle-timeout=<seconds>       Stop the worker after this many seconds without candidates, never if omitted
+"""
+
+import importlib
+import logging
+import os
+import time
+
+from docopt import docopt
+
+# The tuner of every model family, as its module and class, so that only
+# the family tuned is imported. The most expensive families come first, as
+# in `tune_all`.
+TUNERS = {
+    'random_forest': ('.models.chocolate_random_forest',
+                      'ChocolateRandomForestTuner'),
+    'svm_rbf': ('.models.chocolate_svm_rbf', 'ChocolateSvmRbfTuner'),
+    'knn': ('.models.chocolate_knn', 'ChocolateKNNTuner'),
+    'decision_tree': ('.models.chocolate_decision_tree',
+                      'ChocolateDecisionTreeTuner'),
+    'ridge': ('.models.chocolate_ridge', 'ChocolateRidgeTuner')
+}
+
+# The options of a single family, as the family, the tuner attribute they
+# set, and the type of its value
+FAMILY_OPTIONS = {
+    '--svd': ('knn', 'svd_components', int),
+    '--nystroem': ('svm_rbf', 'nystroem_components', int),
+    '--oob': ('random_forest', 'oob_score', bool)
+}
+
+
+def load_tuner_class(family):
+    """
+    Import the tuner class of a model family
+
+    Parameters
+    ----------
+    family : str
+        The model family, a key of `TUNERS`
+
+    Returns
+    -------
+    type :
+        The `BaseChocolateModelTuner` subclass of the family
+    """
+    assert family in TUNERS, \
+        f"Please choose a model family among {', '.join(sorted(TUNERS))}"
+    module_name, class_name = TUNERS[family]
+    return getattr(importlib.import_module(module_name, __package__),
+                   class_name)
+
+
+def tune(opt):
+    """
+    Tune a model family, or all of them, with the options of `tune`
+
+    Parameters
+    ----------
+    opt : dict
+        The parsed command line
+    """
+    train_df_path = opt["--train"]
+    assert os.path.isfile(train_df_path), "Please check the input filepath"
+    family = opt["<family>"]
+    families = list(TUNERS) if family == "all" else [family]
+    tuners = [load_tuner_class(name)() for name in families]
+    for tuner in tuners:
+        tuner.sparse_output = opt["--sparse"]
+        tuner.search_strategy = opt["--search"]
+        tuner.n_cores = opt["--n-cores"] and int(opt["--n-cores"])
+        tuner.n_inner_threads = int(opt["--inner-threads"])
+        tuner.checkpoint_dir = opt["--checkpoint-dir"]
+        tuner.profile = opt["--profile"]
+        tuner.text_features = opt["--text-features"]
+        tuner.text_ngram_range = (1, int(opt["--ngrams"]))
+        tuner.execution_backend = opt["--backend"]
+        tuner.queue_dir = opt["--queue-dir"]
+    for option, (option_family, attribute, kind) in FAMILY_OPTIONS.items():
+        if not opt[option]:
+            continue
+        assert family == option_family, \
+            f"Please only pass {option} to tune {option_family}"
+        setattr(tuners[0], attribute, kind(opt[option]))
+
+    if family == "all":
+        from .models.tune_all import tune_all
+
+        tune_all(
+            tuners, train_df_path=train_df_path,
+            model_dump_dir=opt["--output"],
+            cv_score_output_dir=opt["--output-cv"])
+    else:
+        tuners[0].tune_and_dump(
+            train_df_path=train_df_path, model_dump_dir=opt["--output"],
+            cv_score_output_dir=opt["--output-cv"])
+
+
+def evaluate(opt):
+    """
+    Score the tuned models on the test data with the options of `evaluate`
+
+    Parameters
+    ----------
+    opt : dict
+        The parsed command line
+    """
+    from .test_data_performance import main as evaluate_models
+
+    evaluate_models(
+        test_path=opt["--test"], model_dir=opt["--models"],
+        cv_dir=opt["--cv-scores"], output_dir=opt["--output"] or "results",
+        chunk_size=int(opt["--chunk-size"] or 100000),
+        n_jobs=int(opt["--n-jobs"] or -1))
+
+
+def predict(opt, start_time):
+    """
+    Predict the ratings of a CSV file with the options of `predict`
+
+    Parameters
+    ----------
+    opt : dict
+        The parsed command line
+    start_time : float
+        The `time.perf_counter` of the start of the command line
+    """
+    import glob
+
+    from .predict import predict_file
+
+    input_path = opt["--input"]
+    assert os.path.isfile(input_path), "Please check the input filepath"
+    # Only the tuned models, rather than e.g. the online model checkpoint
+    model_paths = opt["--model"] or sorted(
+        glob.glob('results/models/tuned_*.joblib'))
+    assert model_paths, "Please check the model filepaths"
+    n_rows = predict_file(
+        input_path, opt["--output"], model_paths,
+        chunk_size=int(opt["--chunk-size"] or 10000),
+        n_jobs=int(opt["--n-jobs"] or 1))
+    print(
+        f"Predicted {n_rows} rows with {len(model_paths)} models in "
+        f"{time.perf_counter() - start_time:.2f}s"
+    )
+
+
+def compile_model(opt):
+    """
+    Compile a tuned model into a scorer with the options of `compile`
+
+    Parameters
+    ----------
+    opt : dict
+        The parsed command line
+    """
+    from .models.compiled_scorer import compile_pipeline
+    from .models.model_artifact import load_model
+
+    model_path = opt["--model"][0]
+    assert os.path.isfile(model_path), "Please check the model filepath"
+    scorer_path = opt["--output"] or f'{os.path.splitext(model_path)[0]}.scorer'
+    compile_pipeline(load_model(model_path, mmap_mode=None)).save(scorer_path)
+    print(f"Saved the scorer of {model_path} to {scorer_path}")
+
+
+def worker(opt):
+    """
+    Run a worker of the queue backend with the options of `worker`
+
+    Parameters
+    ----------
+    opt : dict
+        The parsed command line
+    """
+    from .models.execution import run_worker
+
+    queue_dir = opt["--queue-dir"]
+    idle_timeout = opt["--idle-timeout"] and float(opt["--idle-timeout"])
+    start_time = time.time()
+    n_tasks = run_worker(queue_dir, idle_timeout=idle_timeout)
+    print(
+        f"Worker {os.getpid()} ran {n_tasks} tasks from {queue_dir} in "
+        f"{time.time() - start_time:.1f}s"
+    )
+
+
+def main(argv=None):
+    """
+    Run a command of the command line
+
+    Parameters
+    ----------
+    argv : list of str or None
+        The arguments, defaulted to `None`, i.e. those of the process
+    """
+    start_time = time.perf_counter()
+    opt = docopt(__doc__, argv)
+    # The summaries of the commands, e.g. of every search tuned
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if opt["tune"]:
+        tune(opt)
+    elif opt["evaluate"]:
+        evaluate(opt)
+    elif opt["predict"]:
+        predict(opt, start_time)
+    elif opt["compile"]:
+        compile_model(opt)
+    elif opt["worker"]:
+        worker(opt)
+
+
+if __name__ == "__main__":
+    main()
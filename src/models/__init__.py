@@ -1,7 +1,18 @@
 __all__ = [
     "chocolate_decision_tree",
     "chocolate_knn",
+    "chocolate_online",
     "chocolate_random_forest",
     "chocolate_ridge",
-    "chocolate_svm_rbf"
+    "chocolate_svm_rbf",
+    "compiled_scorer",
+    "execution",
+    "fold_cached_search_cv",
+    "model_artifact",
+    "nested_models",
+    "parzen_sampler",
+    "rbf_kernel",
+    "ridge_path",
+    "search_journal",
+    "tune_all"
 ]
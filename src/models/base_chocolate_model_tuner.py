@@ -1,24 +1,39 @@
-import dill
+import logging
 import os
 import pandas as pd
 from scipy.stats import randint
-from sklearn.model_selection import RandomizedSearchCV
+
+from ..chocolate_data import load_chocolate, split_target
+from ..preprocessor.chocolate import make_preprocessor, make_text_transformer
+from ..profiling import Tracer, peak_memory_mib, trace_transformers
+from .nested_models import OutOfBagSplit
+from .fold_cached_search_cv import (
+    FoldCachedAdaptiveSearchCV, FoldCachedHalvingSearchCV, FoldCachedSearchCV)
+from .execution import make_executor
+from .model_artifact import dump_model
+
+logger = logging.getLogger(__name__)
+
+
+def _format_mib(memory):
+    return 'n/a' if memory is None else f'{memory:.1f} MiB'
 
 
 class BaseChocolateModelTuner():
     """
     Encapsulates all the logic needed to tune a particular family of models.
 
-    It uses `RandomizedSearchCV` in its core. Subclasses should provide their
-    own implementation for `create_pipeline` and `param_distribution` for this
-    to work.
+    It uses `FoldCachedSearchCV` in its core, a `RandomizedSearchCV` that fits
+    the preprocessor once per fold and only refits the final estimator per
+    candidate. Subclasses should provide their own implementation for
+    `create_pipeline` and `param_distribution` for this to work.
 
     Attributes
     ----------
     pipeline : sklearn.pipeline.Pipeline or None
         The pipeline object to run the training with
     search_n_iter : int
-        Number of iterations to run our `RandomizedSearchCV` with, defaulted
+        Number of iterations to run our `FoldCachedSearchCV` with, defaulted
         to 200
     search_cv : int
         Number of slices in CV, defaulted to 5
@@ -26,6 +41,71 @@ class BaseChocolateModelTuner():
         Name of the tuned model file, defaulted to `"model.joblib"`
     cv_file_name : str
         Name of the model cross-validation results file, defaulted to `"cv.csv"`
+    sparse_output : bool
+        Whether to keep every preprocessed block as a CSR matrix, so that the
+        estimator is fit on a sparse matrix end to end, defaulted to `False`
+    text_features : str
+        `"count"` to count the words of the tasting notes in a fitted
+        vocabulary, tuning its `max_features`, or `"hashing"` to hash them
+        into a fixed number of columns, tuning that number, so that nothing
+        is fitted up front and the memory does not grow with the vocabulary,
+        defaulted to `"count"`
+    text_ngram_range : tuple
+        The shortest and longest n-grams of words of the tasting notes,
+        defaulted to `(1, 1)`
+    search_strategy : str
+        `"random"` for a randomized search over all the candidates,
+        `"halving"` for successive halving, or `"adaptive"` for candidates
+        proposed from the scores of the previous ones and pruned after the
+        folds showing they cannot beat the best one, defaulted to `"random"`
+    halving_resource : str
+        The resource budgeted by successive halving, either `"n_samples"` or
+        an integer pipeline parameter, defaulted to `"n_samples"`
+    halving_factor : int
+        The proportion of candidates eliminated in each round, defaulted to 3
+    halving_min_resources : int or str
+        The resource of the first round, defaulted to `"exhaust"` so that the
+        last round uses `halving_max_resources`
+    halving_max_resources : int or str
+        The resource of the last round, defaulted to `"auto"`, i.e. all the
+        training samples
+    adaptive_prune_tolerance : float
+        How far below the best candidate, relative to its score, the mean
+        score of a candidate on its first folds may fall before the adaptive
+        search prunes it, defaulted to 0.1
+    n_cores : int or None
+        The total number of cores the search may use, defaulted to `None`,
+        i.e. all the CPUs
+    n_inner_threads : int
+        The number of threads of each candidate fit, for the estimator itself
+        (see `inner_n_jobs_param`) and its BLAS/OpenMP pools. The search runs
+        `n_cores // n_inner_threads` candidates at once. Defaulted to 1.
+    inner_n_jobs_param : str or None
+        The `n_jobs` parameter of the estimator in the pipeline, if it has
+        one, defaulted to `None`
+    execution_backend : str
+        Where the candidates are fitted when the search is not given an
+        executor, `"local"` for a pool of this machine or `"queue"` for the
+        workers serving `queue_dir`, possibly on several machines, see
+        `FileQueueExecutor`, defaulted to `"local"`
+    queue_dir : str or None
+        The queue folder of the `"queue"` backend, defaulted to `None`
+    checkpoint_dir : str or None
+        The folder to journal the finished fits of the search to, so that an
+        interrupted search resumes where it stopped, defaulted to `None`, i.e.
+        no journal
+    profile : bool
+        Whether to trace the time and peak memory of every transformer fit and
+        candidate fit, written next to the CV results by `dump`, defaulted to
+        `False`
+    nested_param : str or None
+        The number of trees of a forest in the pipeline, whose candidates
+        that only differ in it are evaluated from one fit, defaulted to
+        `None`
+    oob_score : bool
+        Whether to score the candidates out of bag, on forests fitted once on
+        the whole data, rather than with `search_cv` folds, defaulted to
+        `False`
     """
 
     def __init__(self):
@@ -35,6 +115,24 @@ class BaseChocolateModelTuner():
         self.search_metric = 'neg_mean_absolute_percentage_error'
         self.tuned_file_name = 'model.joblib'
         self.cv_file_name = 'cv.csv'
+        self.sparse_output = False
+        self.text_features = 'count'
+        self.text_ngram_range = (1, 1)
+        self.search_strategy = 'random'
+        self.halving_resource = 'n_samples'
+        self.halving_factor = 3
+        self.halving_min_resources = 'exhaust'
+        self.halving_max_resources = 'auto'
+        self.adaptive_prune_tolerance = 0.1
+        self.n_cores = None
+        self.n_inner_threads = 1
+        self.inner_n_jobs_param = None
+        self.execution_backend = 'local'
+        self.queue_dir = None
+        self.checkpoint_dir = None
+        self.profile = False
+        self.nested_param = None
+        self.oob_score = False
 
     def tune_and_dump(self, train_df_path, model_dump_dir, cv_score_output_dir):
         """
@@ -49,55 +147,198 @@ class BaseChocolateModelTuner():
         cv_score_output_dir : str
             Path to save the CV scores to
         """
-        TARGET = 'rating'
+        X_train, y_train = self.load_data(train_df_path)
+        random_search_cv = self.tune(X_train, y_train)
+        self.dump(random_search_cv, model_dump_dir, cv_score_output_dir)
+
+    @staticmethod
+    def load_data(train_df_path):
+        """
+        Load the training data and split it into features and target
+
+        The data is typed with `SCHEMA` and cached by `load_chocolate`, so that
+        only the first load of a file parses it.
+
+        Parameters
+        ----------
+        train_df_path : str
+            Path to the training dataframe CSV file
+
+        Returns
+        -------
+        tuple :
+            The features as a `pandas.DataFrame` and the target as a
+            `pandas.Series`
+        """
+        # Load data, checking the ratings, and split into features and target
+        return split_target(load_chocolate(train_df_path))
+
+    def tune(self, X_train, y_train, fitted_preprocessor=None, fold_cache=None,
+             executor=None):
+        """
+        Tune the hyperparameters of the pipeline
+
+        Parameters
+        ----------
+        X_train : pandas.DataFrame
+            The training features
+        y_train : pandas.Series
+            The training target
+        fitted_preprocessor : sklearn.compose.ColumnTransformer or None
+            The preprocessor already fitted on `X_train`, to read the
+            vocabulary from instead of fitting it again
+        fold_cache : FoldCache or None
+            The preprocessed CV folds shared with other tuners, `None` to
+            preprocess the folds in this search only
+        executor : concurrent.futures.Executor or None
+            The pool shared with other tuners to fit the candidates on, `None`
+            to use a joblib pool of this search only, or the queue of
+            `queue_dir` with the `"queue"` backend
 
-        # Load data and split into features and target
-        train_df = pd.read_csv(train_df_path)
-        
-        # Check if target column exists in the dataframe
-        assert TARGET in train_df, "Please make sure the file contains the Ratings column"
-        
-        X_train = train_df.drop(columns=[TARGET])
-        y_train = train_df[TARGET]
+        Returns
+        -------
+        FoldCachedSearchCV :
+            The fitted search
+        """
+        if executor is None and self.execution_backend != 'local':
+            with make_executor(
+                    self.execution_backend, queue_dir=self.queue_dir
+            ) as executor:
+                return self.tune(X_train, y_train, fitted_preprocessor,
+                                 fold_cache, executor)
 
-        # Create the pipeline for modelling
+        # Create the pipeline for modelling, where only the preprocessor
+        # needs to be fitted for `param_distribution` to read its vocabulary,
+        # unless the text features are hashed
         self.pipeline = self.create_pipeline()
-        self.pipeline.fit(X_train, y_train)
+        tracer = Tracer() if self.profile else None
+        if fitted_preprocessor is not None:
+            self.pipeline.set_params(
+                **{self.pipeline.steps[0][0]: fitted_preprocessor})
+        elif self.text_features == 'count' and tracer is not None:
+            preprocessor = self.pipeline.steps[0][1]
+            with trace_transformers(tracer, preprocessor):
+                preprocessor.fit(X_train, y_train)
+        elif self.text_features == 'count':
+            self.pipeline.steps[0][1].fit(X_train, y_train)
 
         # Tune hyperparameters
         param_dist = self.param_distribution()
 
-        # Perform `RandomizedSearchCV`
-        random_search_cv = RandomizedSearchCV(
-            self.pipeline,
-            random_state=522,
-            param_distributions=param_dist,
-            cv=self.search_cv,
-            scoring=self.search_metric,
-            n_iter=self.search_n_iter,
-            n_jobs=-1,
-            return_train_score=True
-        )
+        # Perform the search, with the preprocessing cached per fold
+        random_search_cv = self.create_search(param_dist)
+        random_search_cv.set_params(fold_cache=fold_cache, executor=executor)
 
         random_search_cv.fit(X_train, y_train)
+        # The shared cache and pool are not part of the tuned model
+        random_search_cv.set_params(fold_cache=None, executor=None)
+        if tracer is not None:
+            tracer.extend(random_search_cv.trace_)
+            random_search_cv.trace_ = tracer.events
+        self.report(random_search_cv)
+        return random_search_cv
 
+    def report(self, random_search_cv):
+        """
+        Log a summary of a fitted search: the fits saved by the search
+        strategy or the journal, the use of the core budget, the peak memory
+        and, when profiled, the slowest spans
+
+        Parameters
+        ----------
+        random_search_cv : FoldCachedSearchCV
+            The fitted search
+        """
+        if self.search_strategy == 'halving':
+            logger.info(
+                "Successive halving: %s candidates with %s %s, %d fits "
+                "instead of %d", random_search_cv.n_candidates_,
+                random_search_cv.n_resources_, self.halving_resource,
+                random_search_cv.n_fits_,
+                random_search_cv.n_candidates_[0] * self.search_cv)
+        if self.search_strategy == 'adaptive':
+            n_candidates = len(random_search_cv.cv_results_['params'])
+            # No best score is reached if every candidate failed
+            best = "no candidate scored on every fold" \
+                if random_search_cv.n_fits_to_best_ is None else (
+                    f"best score reached after "
+                    f"{random_search_cv.n_fits_to_best_} fits "
+                    f"({random_search_cv.time_to_best_:.1f} s)")
+            logger.info(
+                "Adaptive search: %d candidates, %d pruned after their first "
+                "folds, %d fits instead of %d, %s", n_candidates,
+                random_search_cv.n_pruned_, random_search_cv.n_fits_,
+                n_candidates * random_search_cv.n_splits_, best)
+        if random_search_cv.n_resumed_fits_:
+            logger.info("Resumed %d fits from %s",
+                        random_search_cv.n_resumed_fits_, self.checkpoint_dir)
+        n_outer_jobs, n_inner_threads = self.core_split()
+        # A search whose fits were all resumed may take no measurable time
+        search_time = random_search_cv.search_time_
+        n_threads = n_outer_jobs * n_inner_threads
+        utilization = 'n/a' if search_time <= 0 else \
+            f"{random_search_cv.cpu_time_ / (search_time * n_threads):.0%}"
+        logger.info(
+            "Core budget: %d candidates x %d threads, %s utilization over "
+            "%.1fs", n_outer_jobs, n_inner_threads, utilization, search_time)
+        logger.info(
+            "Peak memory: %s in the main process, %s in the workers",
+            _format_mib(peak_memory_mib()),
+            _format_mib(random_search_cv.worker_peak_memory_))
+        if getattr(random_search_cv, 'trace_', None) is not None:
+            tracer = Tracer()
+            tracer.extend(random_search_cv.trace_)
+            logger.info("Slowest spans:\n%s",
+                        tracer.summary().head(10).round(3).to_string())
+
+    def dump(self, random_search_cv, model_dump_dir, cv_score_output_dir):
+        """
+        Dump the best pipeline of a fitted search and its CV results to
+        specific directories
+
+        The model artifact only holds the refitted best pipeline, see
+        `dump_model`, along with a JSON metadata file describing the search.
+        The trace of a profiled search is saved next to the CV results, as
+        JSON lines and in the Chrome trace event format.
+
+        Parameters
+        ----------
+        random_search_cv : FoldCachedSearchCV
+            The fitted search
+        model_dump_dir : str
+            Path to dump the model to
+        cv_score_output_dir : str
+            Path to save the CV scores to
+        """
         # Check if the model directory already exists
         try:
             os.makedirs(model_dump_dir)
         except FileExistsError:
             pass
 
-        # Save the model
-        with open(f'{model_dump_dir}/{self.tuned_file_name}', 'wb') as file:
-            dill.dump(random_search_cv, file)
-        
+        # Save the best pipeline, without the search scaffolding
+        dump_model(
+            random_search_cv.best_estimator_,
+            f'{model_dump_dir}/{self.tuned_file_name}',
+            metadata={
+                'tuner': type(self).__name__,
+                'search': type(random_search_cv).__name__,
+                'search_metric': self.search_metric,
+                'best_params': random_search_cv.best_params_,
+                'best_score': random_search_cv.best_score_,
+                'n_candidates': len(random_search_cv.cv_results_['params']),
+                'n_splits': random_search_cv.n_splits_,
+                'refit_time': random_search_cv.refit_time_,
+                'cv_results': f'{cv_score_output_dir}/{self.cv_file_name}'
+            })
+
         # Create a dataframe with the cross-validation results
         cv_all_results = (
             pd.DataFrame(random_search_cv.cv_results_)
             .set_index("rank_test_score")
             .sort_index()
         )
-        
+
         # Check if the CV result directory already exists
         try:
             os.makedirs(cv_score_output_dir)
@@ -105,7 +346,106 @@ class BaseChocolateModelTuner():
             pass
 
         # Save the cross-validation results
-        cv_all_results.to_csv(f'{cv_score_output_dir}/{self.cv_file_name}')  
+        cv_all_results.to_csv(f'{cv_score_output_dir}/{self.cv_file_name}')
+
+        # Save the trace of a profiled search
+        if getattr(random_search_cv, 'trace_', None) is not None:
+            tracer = Tracer()
+            tracer.extend(random_search_cv.trace_)
+            trace_path = os.path.splitext(
+                f'{cv_score_output_dir}/{self.cv_file_name}')[0] + '_trace'
+            tracer.write_jsonl(f'{trace_path}.jsonl')
+            tracer.write_chrome_trace(f'{trace_path}.json')
+
+    def core_split(self):
+        """
+        Split the core budget between candidates and threads per candidate
+
+        Returns
+        -------
+        tuple :
+            The number of candidates fitted at once, and the number of
+            threads of each of them
+        """
+        n_cores = self.n_cores or os.cpu_count()
+        n_inner_threads = min(self.n_inner_threads, n_cores)
+        return max(n_cores // n_inner_threads, 1), n_inner_threads
+
+    def create_search(self, param_dist):
+        """
+        Create the hyperparameter search over `pipeline`
+
+        Parameters
+        ----------
+        param_dist : dict
+            The parameter distributions to sample candidates from
+
+        Returns
+        -------
+        FoldCachedSearchCV :
+            The unfitted search, a successive-halving one if
+            `search_strategy` is `"halving"`, an adaptive one if it is
+            `"adaptive"`
+        """
+        n_outer_jobs, n_inner_threads = self.core_split()
+        if self.inner_n_jobs_param is not None:
+            self.pipeline.set_params(
+                **{self.inner_n_jobs_param: n_inner_threads})
+
+        search_args = dict(
+            random_state=522,
+            param_distributions=param_dist,
+            cv=OutOfBagSplit() if self.oob_score else self.search_cv,
+            scoring=self.search_metric,
+            n_iter=self.search_n_iter,
+            n_jobs=n_outer_jobs,
+            n_inner_threads=n_inner_threads,
+            checkpoint_dir=self.checkpoint_dir,
+            profile=self.profile,
+            refit_estimator=self.create_refit_pipeline(),
+            nested_param=self.nested_param,
+            oob_score=self.oob_score,
+            return_train_score=True,
+            text_transformer=make_text_transformer(self.text_features)[0]
+        )
+
+        if self.search_strategy == 'random':
+            return FoldCachedSearchCV(self.pipeline, **search_args)
+        if self.search_strategy == 'halving':
+            # The resource is set by the search rather than sampled
+            search_args['param_distributions'] = {
+                name: distribution for name, distribution in param_dist.items()
+                if name != self.halving_resource
+            }
+            return FoldCachedHalvingSearchCV(
+                self.pipeline,
+                resource=self.halving_resource,
+                factor=self.halving_factor,
+                min_resources=self.halving_min_resources,
+                max_resources=self.halving_max_resources,
+                **search_args
+            )
+        if self.search_strategy == 'adaptive':
+            return FoldCachedAdaptiveSearchCV(
+                self.pipeline,
+                prune_tolerance=self.adaptive_prune_tolerance,
+                **search_args
+            )
+        raise ValueError(f"Unknown search strategy: {self.search_strategy}")
+
+    def create_preprocessor(self):
+        """
+        Create the column transformer for the pipeline
+
+        Returns
+        -------
+        sklearn.compose.ColumnTransformer : the preprocessor, sparse or not
+            depending on `sparse_output`, with the text features of
+            `text_features`
+        """
+        return make_preprocessor(
+            sparse_output=self.sparse_output, text_features=self.text_features,
+            ngram_range=self.text_ngram_range)
 
     def create_pipeline(self):
         """
@@ -117,6 +457,19 @@ class BaseChocolateModelTuner():
         """
         raise NotImplementedError("create_pipeline() not properly implemented")
 
+    def create_refit_pipeline(self):
+        """
+        Create the pipeline to refit with the best parameters on the whole
+        data, when it differs from the pipeline the candidates are evaluated
+        with
+
+        Returns
+        -------
+        sklearn.pipeline.Pipeline or None :
+            The pipeline, `None` to refit `pipeline`
+        """
+        return None
+
     def param_distribution(self):
         """
         Get param distribution
@@ -127,6 +480,14 @@ class BaseChocolateModelTuner():
             a dictionary pair to be passed to `RandomizedSearchCV` as
             `param_dist`
         """
+        if self.text_features == 'hashing':
+            # Powers of two, so that every fold is hashed once and narrower
+            # widths are derived from it
+            return {
+                "columntransformer__hashingvectorizer__n_features":
+                    [2 ** bits for bits in range(6, 13)]
+            }
+
         len_vocab = len(
             self.pipeline.named_steps["columntransformer"]
                 .named_transformers_["countvectorizer"]
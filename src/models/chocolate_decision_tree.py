@@ -1,25 +1,17 @@
 # author: Manvir Kohli, Julie Song, Kelvin Wong
 # date: 2022-11-26
 
-"""This script creates a Decision Tree model using the preprocessed input
+"""This module creates a Decision Tree model using the preprocessed input
 features from the chocolate exploration dataset. It dumps a tuned decision
 tree model.
 
-Usage: src/models/chocolate_decision_tree.py --train=<training_ds> --output=<output_folder> --output-cv=<output_cv_folder>
-
-Options:
---train=<training_ds>          Path to the training dataset, which is a .csv file
---output=<output_folder>       Path to the folder to save the modelling output to
---output-cv=<output_cv_folder> Path to the folder to save the CV score files to
+The model is tuned with `python -m src tune decision_tree`.
 """
 
-from docopt import docopt
 from scipy.stats import randint
 from sklearn.pipeline import make_pipeline
 from sklearn.tree import DecisionTreeRegressor
-import os
 
-from ..preprocessor.chocolate import preprocessor
 from .base_chocolate_model_tuner import BaseChocolateModelTuner
 
 
@@ -38,7 +30,8 @@ class ChocolateDecisionTreeTuner(BaseChocolateModelTuner):
         sklearn.pipeline.Pipeline : the pipeline to run tuning on
         """
 
-        return make_pipeline(preprocessor, DecisionTreeRegressor())
+        return make_pipeline(
+            self.create_preprocessor(), DecisionTreeRegressor(random_state=522))
 
     def param_distribution(self):
         """
@@ -50,19 +43,9 @@ class ChocolateDecisionTreeTuner(BaseChocolateModelTuner):
             a dictionary pair to be passed to `RandomizedSearchCV` as
             `param_dist`
         """
-        # `columntransformer__countvectorizer__max_features` is inherited
+        # `columntransformer__countvectorizer__max_features` is inherited, or
+        # the `n_features` of the hashed text features
         return super().param_distribution() | {
             "decisiontreeregressor__max_depth": randint(low=1, high=30)
         }
 
-
-opt = docopt(__doc__)
-
-if __name__ == "__main__":
-    # Check if input filepath is correct
-    train_df_path = opt["--train"]
-    assert os.path.isfile(train_df_path), "Please check the input filepath"
-    tuner = ChocolateDecisionTreeTuner()
-    tuner.tune_and_dump(
-        train_df_path=train_df_path, model_dump_dir=opt["--output"],
-        cv_score_output_dir=opt["--output-cv"])
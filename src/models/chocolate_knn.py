@@ -1,33 +1,72 @@
 # author: Manvir Kohli, Julie Song, Kelvin Wong
 # date: 2022-11-26
 
-"""This script creates a kNN using the preprocessed input features from the
+"""This module creates a kNN using the preprocessed input features from the
 chocolate exploration dataset. It dumps a tuned kNN model.
 
-Usage: ./src/models/chocolate_knn.py --train=<training_ds> --output=<output_folder> --output-cv=<output_cv_folder>
+The neighbors of every row are found once per fold and feature configuration,
+up to the largest `n_neighbors` searched, and every candidate of that
+configuration predicts from that neighbor graph. The best candidate is
+refitted as a plain kNN regressor. With `--svd`, the features are first
+reduced with a truncated SVD, so that the neighbors are found with a tree
+rather than by brute force.
 
-Options:
---train=<training_ds>          Path to the training dataset, which is a .csv file
---output=<output_folder>       Path to the folder to save the modelling output to
---output-cv=<output_cv_folder> Path to the folder to save the CV score files to
+The model is tuned with `python -m src tune knn`.
 """
 
-import numpy as np
-from docopt import docopt
-from scipy.stats import uniform, randint
+from scipy.stats import randint
+from sklearn.decomposition import TruncatedSVD
 from sklearn.pipeline import make_pipeline
-from sklearn.neighbors import KNeighborsRegressor
-import os
+from sklearn.neighbors import KNeighborsRegressor, KNeighborsTransformer
 
-from ..preprocessor.chocolate import preprocessor
 from .base_chocolate_model_tuner import BaseChocolateModelTuner
 
 
 class ChocolateKNNTuner(BaseChocolateModelTuner):
+    """
+    Tunes a kNN regressor over a precomputed neighbor graph.
+
+    A `KNeighborsTransformer` finds the `max_neighbors` nearest neighbors of
+    every row, and the regressor reads them from the graph with a
+    precomputed metric. The search fits the transformer once per fold and
+    feature configuration, so that the candidates that only differ in
+    `n_neighbors` and `weights` cost a lookup in the graph rather than a
+    search over all the training rows. The best candidate is refitted as a
+    plain `KNeighborsRegressor`, see `create_refit_pipeline`, so that the
+    saved model does not depend on the graph.
+
+    Attributes
+    ----------
+    max_neighbors : int
+        The largest `n_neighbors` searched, i.e. the neighbors in the graph,
+        defaulted to 99
+    svd_components : int or None
+        Number of components of a truncated SVD of the features before
+        finding the neighbors, defaulted to `None`, i.e. no reduction
+    """
+
     def __init__(self):
         super().__init__()
         self.tuned_file_name = "tuned_knn.joblib"
         self.cv_file_name = "cv_results_knn.csv"
+        self.inner_n_jobs_param = "kneighborstransformer__n_jobs"
+        self.max_neighbors = 99
+        self.svd_components = None
+
+    def create_preprocessing_steps(self):
+        """
+        Create the preprocessor, followed by the truncated SVD of
+        `svd_components` if any
+
+        Returns
+        -------
+        list :
+            The unfitted steps
+        """
+        steps = [self.create_preprocessor()]
+        if self.svd_components is not None:
+            steps.append(TruncatedSVD(self.svd_components, random_state=522))
+        return steps
 
     def create_pipeline(self):
         """
@@ -37,7 +76,23 @@ class ChocolateKNNTuner(BaseChocolateModelTuner):
         -------
         sklearn.pipeline.Pipeline : the pipeline to run tuning on
         """
-        return make_pipeline(preprocessor, KNeighborsRegressor())
+        return make_pipeline(
+            *self.create_preprocessing_steps(),
+            KNeighborsTransformer(
+                n_neighbors=self.max_neighbors, mode='distance'),
+            KNeighborsRegressor(metric='precomputed'))
+
+    def create_refit_pipeline(self):
+        """
+        Create the plain kNN pipeline the best candidate is refitted as
+
+        Returns
+        -------
+        sklearn.pipeline.Pipeline : the pipeline, whose regressor finds the
+            neighbors itself, with the same step names as `create_pipeline`
+        """
+        return make_pipeline(
+            *self.create_preprocessing_steps(), KNeighborsRegressor())
 
     def param_distribution(self):
         """
@@ -49,20 +104,11 @@ class ChocolateKNNTuner(BaseChocolateModelTuner):
             a dictionary pair to be passed to `RandomizedSearchCV` as
             `param_dist`
         """
-        # `columntransformer__countvectorizer__max_features` is inherited
+        # `columntransformer__countvectorizer__max_features` is inherited, or
+        # the `n_features` of the hashed text features
         return super().param_distribution() | {
-            "kneighborsregressor__leaf_size": uniform(5, 500),
-            "kneighborsregressor__n_neighbors": randint(low=1, high=100),
+            "kneighborsregressor__n_neighbors":
+                randint(low=1, high=self.max_neighbors + 1),
             "kneighborsregressor__weights": ['uniform', 'distance']
         }
 
-
-opt = docopt(__doc__)
-
-if __name__ == "__main__":
-    train_df_path = opt["--train"]
-    assert os.path.isfile(train_df_path), "Please check the input filepath"
-    tuner = ChocolateKNNTuner()
-    tuner.tune_and_dump(
-        train_df_path=train_df_path, model_dump_dir=opt["--output"],
-        cv_score_output_dir=opt["--output-cv"])
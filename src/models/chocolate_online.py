@@ -0,0 +1,154 @@
+# author: Manvir Kohli, Julie Song, Kelvin Wong
+# date: 2026-10-18
+
+"""This script trains an online model, a linear model fitted by stochastic
+gradient descent on hashed features, on a CSV file of chocolate reviews
+streamed in mini-batches. If the model already exists in the output folder,
+the reviews are folded into it in a single pass rather than fitting it again,
+so that new reviews are learned in milliseconds without tuning the models
+again. The model is dumped as a checkpoint after every file.
+
+Usage: src/models/chocolate_online.py --train=<reviews_csv> --output=<output_folder> [--batch-size=<n_rows>] [--passes=<n_passes>]
+
+Options:
+--train=<reviews_csv>          Path to the reviews to learn, which is a .csv file with ratings
+--output=<output_folder>       Path to the folder of the model checkpoint
+--batch-size=<n_rows>          Number of reviews of every update [default: 100]
+--passes=<n_passes>            Number of passes over the reviews of a new model [default: 10]
+"""
+
+import os
+import time
+
+from docopt import docopt
+from sklearn.linear_model import SGDRegressor
+
+from ..chocolate_data import read_chocolate_csv, split_target, validate_target
+from ..preprocessor.chocolate import make_streaming_preprocessor
+from ..preprocessor.streaming import IncrementalPipeline
+from .model_artifact import dump_model, load_metadata, load_model
+
+
+class ChocolateOnlineModel():
+    """
+    Trains an online model on batches of reviews, and folds new reviews into
+    it.
+
+    The preprocessor is a `StreamingColumnTransformer`, which needs no
+    vocabulary, and the final estimator an `SGDRegressor`, so that every
+    mini-batch updates the whole pipeline with `partial_fit`. The learning
+    rate decays with the number of reviews seen, so that a new batch adjusts
+    the model rather than overwriting what the earlier ones taught it.
+
+    Attributes
+    ----------
+    model_file_name : str
+        File name of the model checkpoint, defaulted to `"online_sgd.joblib"`
+    batch_size : int
+        Number of reviews of every update, defaulted to 100
+    n_passes : int
+        Number of passes over the reviews of a new model, defaulted to 10, as
+        a single pass over a few thousand reviews leaves the model far from
+        converged. The reviews folded into an existing model are learned in
+        a single pass.
+    """
+
+    def __init__(self):
+        self.model_file_name = 'online_sgd.joblib'
+        self.batch_size = 100
+        self.n_passes = 10
+
+    def create_pipeline(self):
+        """
+        Create pipeline
+
+        Returns
+        -------
+        IncrementalPipeline : the unfitted pipeline
+        """
+        return IncrementalPipeline([
+            ('streamingcolumntransformer', make_streaming_preprocessor()),
+            ('sgdregressor', SGDRegressor(eta0=0.1, random_state=522))
+        ])
+
+    def update(self, pipeline, reviews_path, n_passes=1):
+        """
+        Update a pipeline with the reviews of a CSV file, a mini-batch at a
+        time
+
+        Parameters
+        ----------
+        pipeline : IncrementalPipeline
+            The pipeline, fitted or not
+        reviews_path : str
+            Path to the reviews CSV file, which is streamed rather than loaded
+        n_passes : int
+            Number of passes over the reviews, defaulted to 1
+
+        Returns
+        -------
+        tuple :
+            The number of reviews and the number of mini-batch updates
+        """
+        n_reviews = n_updates = 0
+        for i in range(n_passes):
+            for batch in read_chocolate_csv(
+                    reviews_path, chunksize=self.batch_size):
+                if i == 0:
+                    validate_target(batch)
+                    n_reviews += len(batch)
+                pipeline.partial_fit(*split_target(batch))
+                n_updates += 1
+        return n_reviews, n_updates
+
+    def update_and_dump(self, reviews_path, model_dump_dir):
+        """
+        Fold the reviews of a CSV file into the model checkpoint, creating it
+        if needed
+
+        Parameters
+        ----------
+        reviews_path : str
+            Path to the reviews CSV file
+        model_dump_dir : str
+            Path to the folder of the model checkpoint
+        """
+        model_path = f'{model_dump_dir}/{self.model_file_name}'
+        if os.path.isfile(model_path):
+            # Read into memory, as the arrays are updated
+            pipeline = load_model(model_path, mmap_mode=None)
+            metadata = load_metadata(model_path)
+            n_passes = 1
+        else:
+            os.makedirs(model_dump_dir, exist_ok=True)
+            pipeline = self.create_pipeline()
+            metadata = {'n_reviews': 0, 'n_updates': 0}
+            n_passes = self.n_passes
+
+        start_time = time.perf_counter()
+        n_reviews, n_updates = self.update(pipeline, reviews_path, n_passes)
+        update_time = time.perf_counter() - start_time
+
+        dump_model(pipeline, model_path, metadata={
+            'model': type(self).__name__,
+            'n_reviews': metadata['n_reviews'] + n_reviews,
+            'n_updates': metadata['n_updates'] + n_updates,
+            'batch_size': self.batch_size
+        })
+        print(
+            f"Folded {n_reviews} reviews into {model_path} in {n_updates} "
+            f"updates of {1000 * update_time / max(n_updates, 1):.1f} ms, "
+            f"{metadata['n_reviews'] + n_reviews} reviews learned in total"
+        )
+
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+
+    reviews_path = opt["--train"]
+    assert os.path.isfile(reviews_path), "Please check the input filepath"
+    model = ChocolateOnlineModel()
+    model.batch_size = int(opt["--batch-size"])
+    model.n_passes = int(opt["--passes"])
+    model.update_and_dump(
+        reviews_path=reviews_path, model_dump_dir=opt["--output"])
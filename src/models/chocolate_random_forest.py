@@ -1,33 +1,49 @@
 # author: Manvir Kohli, Julie Song, Kelvin Wong
 # date: 2022-11-26
 
-"""This script creates a Random Forest model using the preprocessed input
+"""This module creates a Random Forest model using the preprocessed input
 features from the chocolate exploration dataset. It dumps a tuned random
 forest model.
 
-Usage: src/models/chocolate_random_forest.py --train=<training_ds> --output=<output_folder> --output-cv=<output_cv_folder>
+Every forest is grown once per fold with the most trees its candidates ask
+for, and the candidates with fewer trees are scored on its first trees. With
+`--oob`, the candidates are scored on the out-of-bag predictions of forests
+grown once on the whole training set, rather than with 5-fold CV, which
+requires scikit-learn 1.4 or later.
 
-Options:
---train=<training_ds>          Path to the training dataset, which is a .csv file
---output=<output_folder>       Path to the folder to save the modelling output to
---output-cv=<output_cv_folder> Path to the folder to save the CV score files to
+The model is tuned with `python -m src tune random_forest`.
 """
 
-from docopt import docopt
 from scipy.stats import randint
 from sklearn.pipeline import make_pipeline
 from sklearn.ensemble import RandomForestRegressor
-import os
 
-from ..preprocessor.chocolate import preprocessor
 from .base_chocolate_model_tuner import BaseChocolateModelTuner
 
 
 class ChocolateRandomForestTuner(BaseChocolateModelTuner):
+    """
+    Tunes a random forest, growing every forest once.
+
+    The forest has a fixed `random_state`, so that its first trees are the
+    trees of the same forest with fewer `n_estimators`. The search fits one
+    forest per fold and (`max_features`, `max_depth`) configuration, with the
+    largest `n_estimators` of its candidates, and scores every candidate on
+    the predictions of its first trees, see `nested_param`. With
+    `max_features` and `max_depth` drawn from their ranges, two candidates
+    rarely share a configuration, so that most forests are only grown for a
+    single candidate.
+    """
+
     def __init__(self):
         super().__init__()
         self.tuned_file_name = "tuned_random_forest.joblib"
         self.cv_file_name = "cv_results_random_forest.csv"
+        self.inner_n_jobs_param = "randomforestregressor__n_jobs"
+        # Successive halving grows more trees, rather than using more samples
+        self.halving_resource = "randomforestregressor__n_estimators"
+        self.halving_max_resources = 1000
+        self.nested_param = "randomforestregressor__n_estimators"
 
     def create_pipeline(self):
         """
@@ -38,7 +54,8 @@ class ChocolateRandomForestTuner(BaseChocolateModelTuner):
         sklearn.pipeline.Pipeline : the pipeline to run tuning on
         """
 
-        return make_pipeline(preprocessor, RandomForestRegressor())
+        return make_pipeline(
+            self.create_preprocessor(), RandomForestRegressor(random_state=522))
 
     def param_distribution(self):
         """
@@ -50,19 +67,10 @@ class ChocolateRandomForestTuner(BaseChocolateModelTuner):
             a dictionary pair to be passed to `RandomizedSearchCV` as
             `param_dist`
         """
-        # `columntransformer__countvectorizer__max_features` is inherited
+        # `columntransformer__countvectorizer__max_features` is inherited, or
+        # the `n_features` of the hashed text features
         return super().param_distribution() | {
             "randomforestregressor__n_estimators": randint(low=50, high=1000),
             "randomforestregressor__max_depth": randint(low=10, high=100)
         }
 
-
-opt = docopt(__doc__)
-
-if __name__ == "__main__":
-    train_df_path = opt["--train"]
-    assert os.path.isfile(train_df_path), "Please check the input filepath"
-    tuner = ChocolateRandomForestTuner()
-    tuner.tune_and_dump(
-        train_df_path=train_df_path, model_dump_dir=opt["--output"],
-        cv_score_output_dir=opt["--output-cv"])
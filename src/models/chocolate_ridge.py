@@ -1,32 +1,54 @@
 # author: Manvir Kohli, Julie Song, Kelvin Wong
 # date: 2022-11-26
 
-"""This script creates a Ridge using the preprocessed input features from the
+"""This module creates a Ridge using the preprocessed input features from the
 chocolate exploration dataset. It dumps a tuned Ridge model.
 
-Usage: ./src/models/chocolate_ridge.py --train=<training_ds> --output=<output_folder> --output-cv=<output_cv_folder>
+With `rotate_features`, the features of every fold and feature configuration
+are rotated onto their principal axes once, and the Ridge of every alpha is
+then solved in closed form on the rotated features.
 
-Options:
---train=<training_ds>          Path to the training dataset, which is a .csv file
---output=<output_folder>       Path to the folder to save the modelling output to
---output-cv=<output_cv_folder> Path to the folder to save the CV score files to
+The model is tuned with `python -m src tune ridge`.
 """
 
 import numpy as np
-from docopt import docopt
-from sklearn.pipeline import make_pipeline
+from sklearn.pipeline import Pipeline, make_pipeline
 from sklearn.linear_model import Ridge
-import os
 
-from ..preprocessor.chocolate import preprocessor
 from .base_chocolate_model_tuner import BaseChocolateModelTuner
+from .ridge_path import OrthogonalRidge, RidgeRotation
 
 
 class ChocolateRidgeTuner(BaseChocolateModelTuner):
+    """
+    Tunes a Ridge, optionally along its regularization path.
+
+    The candidates are scored with the same `search_cv` folds as the other
+    model families rather than with the efficient leave-one-out or
+    generalized CV of `RidgeCV`, so that their CV results stay comparable.
+
+    With `rotate_features`, `RidgeRotation` is fitted once per fold and
+    feature configuration by the search, with a single eigendecomposition,
+    and the candidates of every `alpha` with that configuration are solved in
+    closed form on the rotated features by `OrthogonalRidge`. This only pays
+    off when many candidates share a feature configuration: a `max_features`
+    drawn from its range rarely repeats, and on the current data even the 7
+    `n_features` of hashed text features are fitted faster as plain `Ridge`s
+    on the sparse features. The best candidate is refitted as a plain `Ridge`
+    with the same parameters.
+
+    Attributes
+    ----------
+    rotate_features : bool
+        Whether the search solves the candidates on the rotated features,
+        defaulted to `False`, i.e. fitting plain `Ridge`s
+    """
+
     def __init__(self):
         super().__init__()
         self.tuned_file_name = "tuned_ridge.joblib"
         self.cv_file_name = "cv_results_ridge.csv"
+        self.rotate_features = False
 
     def create_pipeline(self):
         """
@@ -36,7 +58,25 @@ class ChocolateRidgeTuner(BaseChocolateModelTuner):
         -------
         sklearn.pipeline.Pipeline : the pipeline to run tuning on
         """
-        return make_pipeline(preprocessor, Ridge())
+        if not self.rotate_features:
+            return self.create_refit_pipeline()
+        # The step is named as the `Ridge` of `create_refit_pipeline`, so that
+        # both pipelines have the same parameters
+        return Pipeline([
+            ('columntransformer', self.create_preprocessor()),
+            ('ridgerotation', RidgeRotation()),
+            ('ridge', OrthogonalRidge())
+        ])
+
+    def create_refit_pipeline(self):
+        """
+        Create the pipeline to refit with the best parameters
+
+        Returns
+        -------
+        sklearn.pipeline.Pipeline : the Ridge pipeline
+        """
+        return make_pipeline(self.create_preprocessor(), Ridge())
 
     def param_distribution(self):
         """
@@ -48,18 +88,9 @@ class ChocolateRidgeTuner(BaseChocolateModelTuner):
             a dictionary pair to be passed to `RandomizedSearchCV` as
             `param_dist`
         """
-        # `columntransformer__countvectorizer__max_features` is inherited
+        # `columntransformer__countvectorizer__max_features` is inherited, or
+        # the `n_features` of the hashed text features
         return super().param_distribution() | {
             "ridge__alpha": 10.0 ** np.arange(-3, 6, 1)
         }
 
-
-opt = docopt(__doc__)
-
-if __name__ == "__main__":
-    train_df_path = opt["--train"]
-    assert os.path.isfile(train_df_path), "Please check the input filepath"
-    tuner = ChocolateRidgeTuner()
-    tuner.tune_and_dump(
-        train_df_path=train_df_path, model_dump_dir=opt["--output"],
-        cv_score_output_dir=opt["--output-cv"])
@@ -1,33 +1,59 @@
 # author: Manvir Kohli, Julie Song, Kelvin Wong
 # date: 2022-11-26
 
-"""This script creates an SVM RBF (Support Vector Machine with Radial Basis
+"""This module creates an SVM RBF (Support Vector Machine with Radial Basis
 Function kernel) using the preprocessed input features from the chocolate
 exploration dataset. It dumps a tuned SVM RBF model.
 
-Usage: ./src/models/chocolate_svm_rbf.py --train=<training_ds> --output=<output_folder> --output-cv=<output_cv_folder>
+The squared distances between the rows, which depend on neither `gamma` nor
+`C`, are computed once per fold and feature configuration, and the RBF kernel
+of every candidate with that configuration is derived from them elementwise.
+With `--nystroem`, the kernel is instead approximated with a Nystroem feature
+map feeding a linear SVR, which scales to many more rows.
 
-Options:
---train=<training_ds>          Path to the training dataset, which is a .csv file
---output=<output_folder>       Path to the folder to save the modelling output to
---output-cv=<output_cv_folder> Path to the folder to save the CV score files to
+The model is tuned with `python -m src tune svm_rbf`.
 """
 
-from docopt import docopt
 from scipy.stats import loguniform
-from sklearn.pipeline import make_pipeline
-from sklearn.svm import SVR
-import os
+from sklearn.kernel_approximation import Nystroem
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.svm import SVR, LinearSVR
 
-from ..preprocessor.chocolate import preprocessor
 from .base_chocolate_model_tuner import BaseChocolateModelTuner
+from .rbf_kernel import RBFKernelSVR, SquaredDistances
 
 
 class ChocolateSvmRbfTuner(BaseChocolateModelTuner):
+    """
+    Tunes an SVR with an RBF kernel, exactly or approximately.
+
+    In the exact mode, `SquaredDistances` is fitted once per fold and feature
+    configuration by the search, and every candidate only computes its
+    kernel from the distances with an elementwise exponential, before
+    fitting an SVR on the precomputed kernel. The cache holds the squared
+    distances, which are shared across `gamma` and `C` by the candidates of
+    the same feature configuration, e.g. of the same `n_features` of hashed
+    text features. A continuous `max_features` rarely repeats, so that its
+    candidates mostly compute their own distances. The best candidate is
+    refitted as a plain `SVR` with the same parameters, which predicts
+    without the distances to all the training rows.
+
+    With `nystroem_components`, the kernel is approximated by a `Nystroem`
+    feature map of that many components, fed to a `LinearSVR`, so that the
+    fit is linear rather than quadratic to cubic in the number of rows.
+
+    Attributes
+    ----------
+    nystroem_components : int or None
+        Number of components of the Nystroem approximation of the kernel,
+        defaulted to `None`, i.e. the exact kernel
+    """
+
     def __init__(self):
         super().__init__()
         self.tuned_file_name = "tuned_svm_rbf.joblib"
         self.cv_file_name = "cv_results_svm_rbf.csv"
+        self.nystroem_components = None
 
     def create_pipeline(self):
         """
@@ -37,7 +63,35 @@ class ChocolateSvmRbfTuner(BaseChocolateModelTuner):
         -------
         sklearn.pipeline.Pipeline : the pipeline to run tuning on
         """
-        return make_pipeline(preprocessor, SVR())
+        if self.nystroem_components is not None:
+            return make_pipeline(
+                self.create_preprocessor(),
+                Nystroem(n_components=self.nystroem_components,
+                         random_state=522),
+                # The primal squared epsilon-insensitive loss converges fast
+                # at any `C`, unlike the dual of the absolute one
+                LinearSVR(epsilon=0.1, loss='squared_epsilon_insensitive',
+                          dual=False))
+        # The step is named as the `SVR` of `create_refit_pipeline`, so that
+        # both pipelines have the same parameters
+        return Pipeline([
+            ('columntransformer', self.create_preprocessor()),
+            ('squareddistances', SquaredDistances()),
+            ('svr', RBFKernelSVR())
+        ])
+
+    def create_refit_pipeline(self):
+        """
+        Create the pipeline to refit with the best parameters
+
+        Returns
+        -------
+        sklearn.pipeline.Pipeline or None :
+            The SVR pipeline of the exact mode, `None` in the Nystroem mode
+        """
+        if self.nystroem_components is not None:
+            return None
+        return make_pipeline(self.create_preprocessor(), SVR())
 
     def param_distribution(self):
         """
@@ -49,19 +103,15 @@ class ChocolateSvmRbfTuner(BaseChocolateModelTuner):
             a dictionary pair to be passed to `RandomizedSearchCV` as
             `param_dist`
         """
-        # `columntransformer__countvectorizer__max_features` is inherited
+        # `columntransformer__countvectorizer__max_features` is inherited, or
+        # the `n_features` of the hashed text features
+        if self.nystroem_components is not None:
+            return super().param_distribution() | {
+                "linearsvr__C": loguniform(1e-3, 1e4),
+                "nystroem__gamma": loguniform(1e-3, 1e4)
+            }
         return super().param_distribution() | {
             "svr__C": loguniform(1e-3, 1e4),
             "svr__gamma": loguniform(1e-3, 1e4)
         }
 
-
-opt = docopt(__doc__)
-
-if __name__ == "__main__":
-    train_df_path = opt["--train"]
-    assert os.path.isfile(train_df_path), "Please check the input filepath"
-    tuner = ChocolateSvmRbfTuner()
-    tuner.tune_and_dump(
-        train_df_path=train_df_path, model_dump_dir=opt["--output"],
-        cv_score_output_dir=opt["--output-cv"])
@@ -0,0 +1,436 @@
+# author: Manvir Kohli, Julie Song, Kelvin Wong
+# date: 2026-10-18
+
+"""This module compiles a tuned Ridge or decision tree pipeline into a
+standalone scorer, which predicts plain rows in pure Python and NumPy without
+pandas or scikit-learn.
+
+A model is compiled, into a scorer next to it by default, with
+`python -m src compile`.
+"""
+
+import math
+import pickle
+import re
+
+import numpy as np
+
+# The scorers only need the standard library and NumPy, so scikit-learn and
+# pandas are imported when compiling rather than when loading a scorer
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _parse_percentage(value):
+    # Same as `PercentageParser` on a single value
+    return math.nan if _is_missing(value) else float(value[:-1])
+
+
+def _count_ingredients(value):
+    # Same as `IngredientCounter` on a single value
+    return 0 if _is_missing(value) or not value else ord(value[0]) - 48
+
+
+def _ingredient_bitmask(value, bits):
+    # Same as `ingredient_bitmask` on a single value
+    if _is_missing(value):
+        return 0
+    bitmask = 0
+    for ingredient in value[3:].split(','):
+        bitmask |= bits.get(ingredient, 0)
+    return bitmask
+
+
+class CompiledFeatures():
+    """
+    The fitted column transformer of a pipeline, compiled into lookup tables.
+
+    Every block of the transformer is compiled into the output columns and
+    values each input value maps to:
+
+    - one-hot and ordinal encoded columns into category lookup tables,
+    - the ingredients into bit masks of the indicator columns,
+    - the percentage and ingredient count into their scaler constants,
+    - the text into a token lookup table of the vocabulary.
+
+    Attributes
+    ----------
+    columns : list of str
+        The input columns, in the order of array rows
+    categorical : list of tuple
+        The column, category lookup table and unknown category entries
+        (`None` when unknown categories are an error) of every categorical
+        block
+    binarizers : list of tuple
+        The column, ingredient bits and output column of every bit of every
+        ingredient block
+    numeric : list of tuple
+        The column, parser, output column, shift and scale of every numeric
+        block
+    texts : list of tuple
+        The column, token pattern, lowercasing and vocabulary of every text
+        block
+
+    Methods
+    -------
+    as_dict(row)
+        Get a row as a dictionary of input columns
+    transform(row)
+        Get the non-zero output columns of a row
+    """
+
+    def __init__(self, column_transformer):
+        """
+        Parameters
+        ----------
+        column_transformer : sklearn.compose.ColumnTransformer
+            The fitted column transformer of the chocolate features
+        """
+        import pandas as pd
+        from sklearn.feature_extraction.text import CountVectorizer
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import (
+            OneHotEncoder, OrdinalEncoder, StandardScaler
+        )
+        from ..preprocessor.chocolate_transformers import (
+            IngredientBinarizer, IngredientCounter, PercentageParser
+        )
+
+        self.columns = list(column_transformer.feature_names_in_)
+        self.categorical, self.binarizers = [], []
+        self.numeric, self.texts = [], []
+
+        for name, transformer, columns in column_transformer.transformers_:
+            if transformer == 'drop':
+                continue
+            offset = column_transformer.output_indices_[name].start
+            steps = (transformer.steps if isinstance(transformer, Pipeline)
+                     else [(name, transformer)])
+            first = steps[0][1]
+            column = columns if isinstance(columns, str) else columns[0]
+
+            if isinstance(first, (OneHotEncoder, OrdinalEncoder)):
+                # Encode every known category once, as the encoders handle
+                # infrequent categories on their own
+                lookup = {}
+                for category in first.categories_[0]:
+                    row = transformer.transform(
+                        pd.DataFrame({column: [category]}))
+                    row = np.asarray(
+                        row.toarray() if hasattr(row, 'toarray') else row
+                    ).ravel()
+                    lookup[category] = [
+                        (offset + j, float(row[j])) for j in np.flatnonzero(row)]
+                unknown = [] if first.handle_unknown == 'ignore' else None
+                self.categorical.append((column, lookup, unknown))
+            elif isinstance(first, IngredientBinarizer):
+                bits = {c: 1 << i for i, c in enumerate(first.classes)}
+                self.binarizers.append((
+                    column, bits, list(range(offset, offset + len(bits)))))
+            elif isinstance(first, (PercentageParser, IngredientCounter)):
+                parse = (_parse_percentage
+                         if isinstance(first, PercentageParser)
+                         else _count_ingredients)
+                shift, scale = 0.0, 1.0
+                for _, step in steps[1:]:
+                    if not isinstance(step, StandardScaler):
+                        raise ValueError(f"Cannot compile the {name} block")
+                    if step.with_mean:
+                        shift = float(step.mean_[0])
+                    if step.with_std:
+                        scale = float(step.scale_[0])
+                self.numeric.append((column, parse, offset, shift, scale))
+            elif isinstance(first, CountVectorizer):
+                if (first.analyzer != 'word' or first.ngram_range != (1, 1)
+                        or first.tokenizer is not None
+                        or first.preprocessor is not None
+                        or first.strip_accents is not None
+                        or first.binary):
+                    raise ValueError(f"Cannot compile the {name} block")
+                # Stop words are never in the vocabulary, so looking tokens
+                # up in the vocabulary drops them as well
+                vocabulary = {
+                    token: offset + int(j)
+                    for token, j in first.vocabulary_.items()}
+                self.texts.append((
+                    column, re.compile(first.token_pattern), first.lowercase,
+                    vocabulary))
+            else:
+                raise ValueError(f"Cannot compile the {name} block")
+
+    def as_dict(self, row):
+        """
+        Get a row as a dictionary of input columns
+
+        Parameters
+        ----------
+        row : dict or sequence
+            The row as a dictionary, or a sequence in the order of `columns`
+
+        Returns
+        -------
+        dict :
+            The row as a dictionary
+        """
+        return row if isinstance(row, dict) else dict(zip(self.columns, row))
+
+    def transform(self, row):
+        """
+        Get the non-zero output columns of a row
+
+        Parameters
+        ----------
+        row : dict
+            The row
+
+        Returns
+        -------
+        dict :
+            The values of the non-zero output columns, keyed by column index
+        """
+        features = {}
+        for column, lookup, unknown in self.categorical:
+            entries = lookup.get(row.get(column), unknown)
+            if entries is None:
+                raise ValueError(
+                    f"Found unknown category {row.get(column)!r} in {column}")
+            features.update(entries)
+        for column, bits, indices in self.binarizers:
+            bitmask = _ingredient_bitmask(row.get(column), bits)
+            for bit, index in enumerate(indices):
+                if bitmask >> bit & 1:
+                    features[index] = 1.0
+        for column, parse, index, shift, scale in self.numeric:
+            features[index] = (parse(row.get(column)) - shift) / scale
+        for column, pattern, lowercase, vocabulary in self.texts:
+            text = row.get(column)
+            text = '' if _is_missing(text) else text
+            for token in pattern.findall(text.lower() if lowercase else text):
+                index = vocabulary.get(token)
+                if index is not None:
+                    features[index] = features.get(index, 0.0) + 1.0
+        return features
+
+
+class CompiledScorer():
+    """
+    A base class of the scorers compiled from fitted pipelines
+
+    Methods
+    -------
+    predict_one(row)
+        Predict a single row
+    predict(rows)
+        Predict several rows
+    save(path)
+        Save the scorer
+    """
+
+    def predict_one(self, row):
+        """
+        Predict a single row
+
+        Parameters
+        ----------
+        row : dict or sequence
+            The row as a dictionary, or a sequence in the order of the input
+            columns of the pipeline
+
+        Returns
+        -------
+        float :
+            The predicted rating
+        """
+        raise NotImplementedError
+
+    def predict(self, rows):
+        """
+        Predict several rows
+
+        Parameters
+        ----------
+        rows : list of dict or 2D array-like
+            The rows as dictionaries, or sequences in the order of the input
+            columns of the pipeline
+
+        Returns
+        -------
+        numpy.ndarray :
+            The predicted ratings
+        """
+        return np.fromiter(
+            (self.predict_one(row) for row in rows), dtype=float,
+            count=len(rows))
+
+    def save(self, path):
+        """
+        Save the scorer, which is loaded back with `load_scorer`
+
+        Parameters
+        ----------
+        path : str
+            Path to save the scorer to
+        """
+        with open(path, 'wb') as file:
+            pickle.dump(self, file)
+
+
+class CompiledLinearScorer(CompiledScorer):
+    """
+    A linear model compiled with its features into weight lookup tables.
+
+    The coefficients are folded into every lookup table of the features,
+    e.g. a token-to-coefficient table of the vocabulary, the scaler constants
+    into the weights and intercept, and every combination of the ingredient
+    bits into a table indexed by bit mask, so that a row is predicted with a
+    few dictionary lookups and additions.
+    """
+
+    def __init__(self, features, coef, intercept):
+        """
+        Parameters
+        ----------
+        features : CompiledFeatures
+            The compiled column transformer of the pipeline
+        coef : numpy.ndarray
+            The coefficients of the linear model
+        intercept : float
+            The intercept of the linear model
+        """
+        coef = np.asarray(coef, dtype=float).ravel()
+        self.as_dict = features.as_dict
+        self.intercept = float(intercept)
+
+        self.categorical = [
+            (column,
+             {category: sum(coef[i] * value for i, value in entries)
+              for category, entries in lookup.items()},
+             None if unknown is None else 0.0)
+            for column, lookup, unknown in features.categorical]
+
+        self.binarizers = []
+        for column, bits, indices in features.binarizers:
+            bitmasks = np.arange(1 << len(indices))
+            indicators = (bitmasks[:, None] >> np.arange(len(indices))) & 1
+            self.binarizers.append(
+                (column, bits, (indicators @ coef[indices]).tolist()))
+
+        self.numeric = []
+        for column, parse, index, shift, scale in features.numeric:
+            self.intercept -= coef[index] * shift / scale
+            self.numeric.append((column, parse, coef[index] / scale))
+
+        self.texts = [
+            (column, pattern, lowercase,
+             {token: float(coef[index]) for token, index in vocabulary.items()})
+            for column, pattern, lowercase, vocabulary in features.texts]
+
+    def predict_one(self, row):
+        row = self.as_dict(row)
+        total = self.intercept
+        for column, weights, unknown in self.categorical:
+            weight = weights.get(row.get(column), unknown)
+            if weight is None:
+                raise ValueError(
+                    f"Found unknown category {row.get(column)!r} in {column}")
+            total += weight
+        for column, bits, weights in self.binarizers:
+            total += weights[_ingredient_bitmask(row.get(column), bits)]
+        for column, parse, weight in self.numeric:
+            total += weight * parse(row.get(column))
+        for column, pattern, lowercase, weights in self.texts:
+            text = row.get(column)
+            text = '' if _is_missing(text) else text
+            for token in pattern.findall(text.lower() if lowercase else text):
+                total += weights.get(token, 0.0)
+        return total
+
+
+class CompiledTreeScorer(CompiledScorer):
+    """
+    A regression tree compiled into flat node lists.
+
+    The features of a row are computed as a sparse dictionary and rounded to
+    `float32`, like `DecisionTreeRegressor` does, before walking down the
+    tree.
+    """
+
+    def __init__(self, features, tree):
+        """
+        Parameters
+        ----------
+        features : CompiledFeatures
+            The compiled column transformer of the pipeline
+        tree : sklearn.tree._tree.Tree
+            The fitted tree of the regressor
+        """
+        self.features = features
+        self.children_left = tree.children_left.tolist()
+        self.children_right = tree.children_right.tolist()
+        self.feature = tree.feature.tolist()
+        self.threshold = tree.threshold.tolist()
+        self.value = tree.value[:, 0, 0].tolist()
+
+    def predict_one(self, row):
+        features = self.features.transform(self.features.as_dict(row))
+        features = dict(zip(
+            features,
+            np.fromiter(features.values(), dtype=np.float32).tolist()))
+        node = 0
+        # Leaves have no left child, i.e. -1
+        while self.children_left[node] != -1:
+            if features.get(self.feature[node], 0.0) <= self.threshold[node]:
+                node = self.children_left[node]
+            else:
+                node = self.children_right[node]
+        return self.value[node]
+
+
+def compile_pipeline(pipeline):
+    """
+    Compile a fitted chocolate pipeline into a standalone scorer
+
+    Parameters
+    ----------
+    pipeline : sklearn.pipeline.Pipeline
+        The fitted pipeline of the chocolate column transformer and a linear
+        model or a regression tree
+
+    Returns
+    -------
+    CompiledScorer :
+        The scorer, which predicts the same as the pipeline up to float
+        rounding
+    """
+    from sklearn.linear_model._base import LinearModel
+    from sklearn.tree import DecisionTreeRegressor
+
+    features = CompiledFeatures(pipeline.steps[0][1])
+    estimator = pipeline.steps[-1][1]
+    if isinstance(estimator, LinearModel):
+        return CompiledLinearScorer(
+            features, estimator.coef_, estimator.intercept_)
+    if isinstance(estimator, DecisionTreeRegressor):
+        return CompiledTreeScorer(features, estimator.tree_)
+    raise ValueError(f"Cannot compile a {type(estimator).__name__}")
+
+
+def load_scorer(path):
+    """
+    Load a scorer saved with `CompiledScorer.save`
+
+    Parameters
+    ----------
+    path : str
+        Path to the scorer
+
+    Returns
+    -------
+    CompiledScorer :
+        The scorer
+    """
+    with open(path, 'rb') as file:
+        return pickle.load(file)
+
@@ -0,0 +1,506 @@
+import multiprocessing
+import os
+import pickle
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+import weakref
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+
+
+class _SharedObject():
+    # Stands in for an argument stored once in the object folder
+    def __init__(self, path):
+        self.path = path
+
+
+# The objects read by the current worker, keyed by path
+_shared_objects = {}
+
+
+def _load_shared(path):
+    # Every worker reads an object once, and keeps it as long as its file
+    # exists, i.e. as long as the executor that stored it may still need it,
+    # so that the whole working set of a search, e.g. every preprocessed
+    # fold, stays loaded
+    if path in _shared_objects:
+        return _shared_objects[path]
+    for stale_path in [
+            cached for cached in _shared_objects if not os.path.exists(cached)]:
+        del _shared_objects[stale_path]
+    with open(path, 'rb') as file:
+        value = _shared_objects[path] = pickle.load(file)
+    return value
+
+
+def _resolve(value):
+    return _load_shared(value.path) if isinstance(value, _SharedObject) \
+        else value
+
+
+def _run_task(fn, args, kwargs):
+    """
+    Run a task whose large arguments were stored by an `_ObjectStore`
+
+    Parameters
+    ----------
+    fn : callable
+        The function of the task
+    args : tuple
+        The positional arguments, possibly `_SharedObject`s
+    kwargs : dict
+        The keyword arguments, possibly `_SharedObject`s
+
+    Returns
+    -------
+    object :
+        The result of `fn`
+    """
+    return fn(*[_resolve(arg) for arg in args],
+              **{name: _resolve(arg) for name, arg in kwargs.items()})
+
+
+class _ObjectStore():
+    """
+    Stores the large arguments of tasks in a folder, once per object.
+
+    An argument whose pickle reaches `min_bytes`, e.g. a preprocessed fold or
+    the training data, is written to the folder the first time a task gets
+    it, and replaced by a reference to its file in that task and every later
+    one, so that workers read it once rather than receiving it with every
+    task. The file is removed when the object is garbage collected.
+    """
+
+    def __init__(self, directory, min_bytes):
+        self.directory = directory
+        self.min_bytes = min_bytes
+        self._paths = {}
+        # Reentrant, as the garbage collector may forget an object while
+        # another one is shared
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _forget(self, key):
+        with self._lock:
+            path = self._paths.pop(key, (None, None))[1]
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    def _share(self, value, kept):
+        with self._lock:
+            reference, path = self._paths.get(id(value), (None, None))
+            if reference is not None and reference() is value:
+                kept.append(value)
+                return _SharedObject(path)
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(data) < self.min_bytes:
+                return value
+            try:
+                reference = weakref.ref(
+                    value, lambda _, key=id(value): self._forget(key))
+            except TypeError:
+                # Not weakly referenceable, hence stored for this task only
+                return value
+            path = os.path.join(self.directory, f'{uuid.uuid4().hex}.pkl')
+            _write_atomically(path, data)
+            self._paths[id(value)] = (reference, path)
+            kept.append(value)
+            return _SharedObject(path)
+
+    def share(self, args, kwargs):
+        """
+        Replace the large arguments of a task with references
+
+        Returns
+        -------
+        tuple :
+            The arguments, the keyword arguments, and the stored objects,
+            which must be kept alive until the task is done
+        """
+        kept = []
+        return (tuple(self._share(arg, kept) for arg in args),
+                {name: self._share(arg, kept) for name, arg in kwargs.items()},
+                kept)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._paths):
+                self._forget(key)
+
+
+def _write_atomically(path, data):
+    # Readers never see a partially written file
+    directory, name = os.path.split(path)
+    temporary_path = os.path.join(directory, f'.{name}.{uuid.uuid4().hex}')
+    with open(temporary_path, 'wb') as file:
+        file.write(data)
+    os.replace(temporary_path, path)
+
+
+class LocalProcessExecutor(ProcessPoolExecutor):
+    """
+    A pool of spawned worker processes on this machine, which receives the
+    large arguments of the tasks once per worker.
+
+    The large arguments are stored once in a temporary folder by an
+    `_ObjectStore`, and read by every worker the first time one of its tasks
+    needs them, rather than pickled with every task.
+
+    Attributes
+    ----------
+    max_workers : int or None
+        Number of worker processes, defaulted to `None`, i.e. all the CPUs
+    min_shared_bytes : int
+        Size of the pickle from which an argument is shipped once rather than
+        with every task, defaulted to 64 KiB
+    """
+
+    def __init__(self, max_workers=None, min_shared_bytes=2**16):
+        # The workers are spawned rather than forked, as forking a
+        # multi-threaded process is unsafe
+        super().__init__(
+            max_workers, mp_context=multiprocessing.get_context('spawn'))
+        self._store = _ObjectStore(
+            tempfile.mkdtemp(prefix='chocolate-objects-'), min_shared_bytes)
+
+    def submit(self, fn, /, *args, **kwargs):
+        args, kwargs, kept = self._store.share(args, kwargs)
+        future = super().submit(_run_task, fn, args, kwargs)
+        # The stored objects live at least as long as the task
+        future.add_done_callback(lambda _, kept=kept: kept.clear())
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        super().shutdown(wait=wait, cancel_futures=cancel_futures)
+        if wait:
+            self._store.clear()
+            shutil.rmtree(self._store.directory, ignore_errors=True)
+
+
+class FileQueueExecutor(Executor):
+    """
+    Runs tasks on the workers serving a queue folder, e.g. on several
+    machines sharing a network file system.
+
+    Every submitted task is written to the `tasks` subfolder, named after
+    the order of submission, and claimed by the first worker that renames it
+    into the `claimed` subfolder, see `run_worker`. The worker writes the
+    result, or the exception raised, to the `results` subfolder, which a
+    thread of the executor polls to complete the futures. The large arguments
+    of the tasks are stored once in the `objects` subfolder, see
+    `_ObjectStore`, so that the training data and the preprocessed folds are
+    shipped to every worker once rather than with every task. The workers
+    are started separately, and may serve several executors.
+
+    A worker touches the tasks it runs every few seconds. A claimed task left
+    untouched for `lease_timeout` seconds of the clock of the executor, e.g.
+    as its worker was killed, is put back in the `tasks` subfolder for
+    another worker, and its future fails once it has been lost
+    `max_attempts` times. A result that cannot be read fails the future of
+    its task, and if the results cannot be polled for `lease_timeout`
+    seconds, every pending future fails, so that no future waits forever.
+
+    Attributes
+    ----------
+    queue_dir : str
+        The queue folder, shared with the workers
+    poll_interval : float
+        Seconds between two polls of the results, defaulted to 0.01
+    min_shared_bytes : int
+        Size of the pickle from which an argument is shipped once rather than
+        with every task, defaulted to 64 KiB
+    lease_timeout : float
+        Seconds after which a claimed task untouched by its worker is lost,
+        defaulted to 60, which must exceed the `heartbeat_interval` of the
+        workers
+    max_attempts : int
+        Number of times a task is claimed before its future fails if lost,
+        defaulted to 3
+    """
+
+    def __init__(self, queue_dir, poll_interval=0.01, min_shared_bytes=2**16,
+                 lease_timeout=60.0, max_attempts=3):
+        self.queue_dir = queue_dir
+        self.poll_interval = poll_interval
+        self.min_shared_bytes = min_shared_bytes
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        for folder in ('tasks', 'claimed', 'results'):
+            os.makedirs(os.path.join(queue_dir, folder), exist_ok=True)
+        self._store = _ObjectStore(
+            os.path.join(queue_dir, 'objects'), min_shared_bytes)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._n_submitted = 0
+        # The last modification time of every claimed task of this executor
+        # and when it was seen to change, and the attempts of the lost tasks
+        self._claims = {}
+        self._attempts = {}
+        self._broken = None
+        self._shutdown = threading.Event()
+        self._poller = threading.Thread(target=self._poll, daemon=True)
+        self._poller.start()
+
+    def submit(self, fn, /, *args, **kwargs):
+        if self._shutdown.is_set():
+            raise RuntimeError("Cannot submit tasks after shutdown")
+        if self._broken is not None:
+            raise RuntimeError(
+                "Cannot submit tasks to a broken queue") from self._broken
+        args, kwargs, kept = self._store.share(args, kwargs)
+        data = pickle.dumps(
+            (fn, args, kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+        future = Future()
+        with self._lock:
+            # The time prefix keeps the tasks of several executors in
+            # submission order, and the counter those of this one
+            task_name = (f'{time.time_ns():020d}-{self._n_submitted:09d}-'
+                         f'{uuid.uuid4().hex}')
+            self._n_submitted += 1
+            self._pending[task_name] = (future, kept)
+        _write_atomically(
+            os.path.join(self.queue_dir, 'tasks', f'{task_name}.pkl'), data)
+        return future
+
+    def _complete(self, task_name, succeeded, value):
+        with self._lock:
+            future, _ = self._pending.pop(task_name, (None, None))
+        if future is None:
+            return
+        if succeeded:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def _collect_results(self, pending):
+        for entry in os.scandir(os.path.join(self.queue_dir, 'results')):
+            task_name = entry.name[:-len('.pkl')]
+            if entry.name.startswith('.'):
+                continue
+            if task_name not in pending:
+                # The late result of a task run again after it was lost
+                if task_name in self._attempts:
+                    _remove(entry.path)
+                continue
+            try:
+                with open(entry.path, 'rb') as file:
+                    succeeded, value = pickle.load(file)
+            except Exception as error:
+                # e.g. a class of the result missing in this process
+                succeeded, value = False, error
+            _remove(entry.path)
+            self._complete(task_name, succeeded, value)
+
+    def _requeue_lost_tasks(self, pending):
+        now = time.time()
+        claims = {}
+        for entry in os.scandir(os.path.join(self.queue_dir, 'claimed')):
+            # Claimed tasks are named `<task name>.pkl.<worker name>`
+            task_name = entry.name.split('.pkl.', 1)[0]
+            if task_name not in pending:
+                continue
+            try:
+                modified = entry.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+            # The lease is timed with the clock of this process, as the
+            # clocks of the workers may differ
+            last_modified, seen_at = self._claims.get(entry.name, (None, now))
+            if modified != last_modified:
+                seen_at = now
+            if now - seen_at < self.lease_timeout:
+                claims[entry.name] = (modified, seen_at)
+                continue
+
+            attempts = self._attempts.get(task_name, 1)
+            if attempts >= self.max_attempts:
+                _remove(entry.path)
+                self._complete(task_name, False, RuntimeError(
+                    f"Task {task_name} was lost by its worker {attempts} "
+                    f"times"))
+                continue
+            try:
+                os.rename(entry.path, os.path.join(
+                    self.queue_dir, 'tasks', f'{task_name}.pkl'))
+            except FileNotFoundError:
+                # Finished in the meantime
+                continue
+            self._attempts[task_name] = attempts + 1
+        self._claims = claims
+
+    def _fail_pending(self, error):
+        with self._lock:
+            self._broken = error
+            pending, self._pending = self._pending, {}
+        for future, _ in pending.values():
+            future.set_exception(RuntimeError(
+                f"The queue {self.queue_dir} cannot be polled: {error!r}"))
+
+    def _poll(self):
+        failing_since = last_requeue = None
+        while not (self._shutdown.is_set() and not self._pending):
+            with self._lock:
+                pending = set(self._pending)
+            try:
+                self._collect_results(pending)
+                # The claimed tasks are checked a few times per lease
+                if last_requeue is None or time.time() - last_requeue \
+                        >= min(1.0, self.lease_timeout / 10):
+                    self._requeue_lost_tasks(pending)
+                    last_requeue = time.time()
+                failing_since = None
+            except OSError as error:
+                # Retried, as network file systems may fail for a while
+                failing_since = failing_since or time.time()
+                if time.time() - failing_since >= self.lease_timeout:
+                    self._fail_pending(error)
+            except Exception as error:
+                self._fail_pending(error)
+            time.sleep(self.poll_interval)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        if cancel_futures:
+            # The tasks not claimed yet are withdrawn from the queue
+            with self._lock:
+                for task_name, (future, _) in list(self._pending.items()):
+                    try:
+                        os.remove(os.path.join(
+                            self.queue_dir, 'tasks', f'{task_name}.pkl'))
+                    except FileNotFoundError:
+                        continue
+                    future.cancel()
+                    del self._pending[task_name]
+        self._shutdown.set()
+        if wait:
+            self._poller.join()
+            self._store.clear()
+
+
+def _remove(path):
+    # Removes a file that another process may have removed or moved
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _heartbeat(path, interval, done):
+    # Touches a claimed task until it is done, so that the executors see
+    # that its worker is alive
+    while not done.wait(interval):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return
+
+
+def run_worker(queue_dir, poll_interval=0.01, idle_timeout=None,
+               heartbeat_interval=5.0):
+    """
+    Run the tasks of a `FileQueueExecutor` queue folder until none is left
+    for `idle_timeout` seconds
+
+    A task that cannot be read, or whose function raises, gets the exception
+    as its result. The task run is touched every `heartbeat_interval`
+    seconds, so that the executor does not take it for lost.
+
+    Parameters
+    ----------
+    queue_dir : str
+        The queue folder
+    poll_interval : float
+        Seconds between two polls of the tasks when none is queued,
+        defaulted to 0.01
+    idle_timeout : float or None
+        Seconds without tasks after which the worker stops, defaulted to
+        `None`, i.e. never
+    heartbeat_interval : float
+        Seconds between two touches of the task run, defaulted to 5, which
+        must be less than the `lease_timeout` of the executors
+
+    Returns
+    -------
+    int :
+        The number of tasks run
+    """
+    tasks_dir = os.path.join(queue_dir, 'tasks')
+    claimed_dir = os.path.join(queue_dir, 'claimed')
+    results_dir = os.path.join(queue_dir, 'results')
+    for folder in (tasks_dir, claimed_dir, results_dir):
+        os.makedirs(folder, exist_ok=True)
+    worker_name = f'{socket.gethostname()}-{os.getpid()}'
+    n_tasks, idle_since = 0, time.time()
+    while idle_timeout is None or time.time() - idle_since < idle_timeout:
+        task_names = sorted(name for name in os.listdir(tasks_dir)
+                            if not name.startswith('.'))
+        claimed_path = None
+        for task_name in task_names:
+            claimed_path = os.path.join(
+                claimed_dir, f'{task_name}.{worker_name}')
+            try:
+                os.rename(os.path.join(tasks_dir, task_name), claimed_path)
+                break
+            except FileNotFoundError:
+                # Claimed by another worker
+                claimed_path = None
+        if claimed_path is None:
+            time.sleep(poll_interval)
+            continue
+
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=_heartbeat, args=(claimed_path, heartbeat_interval, done),
+            daemon=True)
+        heartbeat.start()
+        try:
+            with open(claimed_path, 'rb') as file:
+                fn, args, kwargs = pickle.load(file)
+            result = (True, _run_task(fn, args, kwargs))
+            data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as error:
+            try:
+                data = pickle.dumps((False, error))
+            except Exception:
+                data = pickle.dumps(
+                    (False, RuntimeError(traceback.format_exc())))
+        finally:
+            done.set()
+            heartbeat.join()
+        _write_atomically(os.path.join(results_dir, task_name), data)
+        # Gone if the executor put the task back in the queue meanwhile
+        _remove(claimed_path)
+        n_tasks, idle_since = n_tasks + 1, time.time()
+    return n_tasks
+
+
+def make_executor(backend, n_workers=None, queue_dir=None):
+    """
+    Create the executor of an execution backend
+
+    Parameters
+    ----------
+    backend : str
+        `"local"` for a `LocalProcessExecutor`, or `"queue"` for a
+        `FileQueueExecutor` served by workers started with `run_worker`
+    n_workers : int or None
+        Number of worker processes of the local backend, defaulted to `None`,
+        i.e. all the CPUs
+    queue_dir : str or None
+        The queue folder of the queue backend
+
+    Returns
+    -------
+    concurrent.futures.Executor :
+        The executor
+    """
+    if backend == 'local':
+        return LocalProcessExecutor(n_workers)
+    if backend == 'queue':
+        assert queue_dir is not None, \
+            "Please give the queue folder of the queue backend"
+        return FileQueueExecutor(queue_dir)
+    raise ValueError(f"Unknown execution backend: {backend}")
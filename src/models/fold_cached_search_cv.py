@@ -0,0 +1,1278 @@
+import time
+import traceback
+import warnings
+from collections import Counter, defaultdict, namedtuple
+from contextlib import nullcontext
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.stats import rankdata
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+from sklearn.exceptions import FitFailedWarning
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import ParameterGrid, ParameterSampler, check_cv
+from sklearn.utils import check_random_state
+from threadpoolctl import ThreadpoolController
+
+from ..preprocessor.fold_cache import (
+    FoldCache, TransformedFold, text_width_param)
+from .nested_models import check_out_of_bag_support, nested_predictions
+from .parzen_sampler import ParzenSampler, candidate_key
+from ..profiling import Tracer, peak_memory_mib, trace_transformers
+from .search_journal import SearchJournal, describe_distribution, task_key
+
+
+# The thread pools of the process, found once rather than per fit, as finding
+# them scans every loaded library
+_thread_pools = None
+
+
+def _limit_threads(n_threads):
+    # Cap the BLAS/OpenMP thread pools of the process, or nothing without a
+    # cap
+    global _thread_pools
+    if n_threads is None:
+        return nullcontext()
+    if _thread_pools is None:
+        _thread_pools = ThreadpoolController()
+    return _thread_pools.limit(limits=n_threads)
+
+
+def _span(tracer, name, **args):
+    # A span of the tracer, or nothing when not tracing
+    return nullcontext() if tracer is None else tracer.span(
+        name, 'candidate', **args)
+
+
+def _fit_and_score(estimator, fold, max_features, parameters, scorer,
+                   return_train_score, train_rows=None, n_threads=None,
+                   trace_args=None, error_score=np.nan):
+    """
+    Fit the final estimator on a cached fold and score it
+
+    Parameters
+    ----------
+    estimator : sklearn.base.BaseEstimator
+        The unfitted final estimator of the pipeline
+    fold : PreprocessedFold or TransformedFold
+        The preprocessed CV fold
+    max_features : int or None
+        The `max_features` to slice the fold vocabulary with
+    parameters : dict
+        The estimator parameters of the candidate, without the step prefix
+    scorer : callable
+        The scorer to evaluate the fitted estimator with
+    return_train_score : bool
+        Whether to score on the training slice as well
+    train_rows : numpy.ndarray or None
+        Positions of the training rows to fit on, `None` to fit on the whole
+        training slice
+    n_threads : int or None
+        The maximum number of BLAS/OpenMP threads of the worker, `None` for
+        no limit
+    trace_args : dict or None
+        The arguments of the spans of the fit and the scoring, e.g. the
+        candidate and fold, `None` not to record spans
+    error_score : 'raise' or float
+        The score of a failed fit, or `"raise"` to raise its error, defaulted
+        to `nan`
+
+    Returns
+    -------
+    dict :
+        The test score, train score (if requested), fit time, score time, CPU
+        time, the peak memory of the worker, the traceback of a failed fit
+        as `fit_error`, and the spans if `trace_args` is given
+    """
+    start_cpu_time = time.process_time()
+    result = {'fit_time': 0.0, 'score_time': 0.0}
+    tracer = None if trace_args is None else Tracer()
+    with _limit_threads(n_threads):
+        # A `TransformedFold` of a single candidate is fitted here
+        X_train, X_test = fold.transform(max_features)
+        y_train = fold.y_train
+        if train_rows is not None:
+            X_train, y_train = X_train[train_rows], y_train.iloc[train_rows]
+        estimator = clone(estimator).set_params(**parameters)
+
+        start_time = time.time()
+        try:
+            with _span(tracer, 'fit', **(trace_args or {})):
+                estimator.fit(X_train, y_train)
+            result['fit_time'] = time.time() - start_time
+            with _span(tracer, 'score', **(trace_args or {})):
+                result['test_score'] = scorer(estimator, X_test, fold.y_test)
+            result['score_time'] = \
+                time.time() - start_time - result['fit_time']
+            if return_train_score:
+                with _span(tracer, 'train score', **(trace_args or {})):
+                    result['train_score'] = scorer(
+                        estimator, X_train, y_train)
+        except Exception:
+            if error_score == 'raise':
+                raise
+            # The failure is warned about by the search, as the warnings of
+            # the workers are lost
+            result['test_score'] = result['train_score'] = error_score
+            result['fit_error'] = traceback.format_exc()
+    # The CPU time of the whole worker, including the estimator threads
+    result['cpu_time'] = time.process_time() - start_cpu_time
+    result['peak_memory'] = peak_memory_mib()
+    if tracer is not None:
+        result['trace'] = tracer.events
+    return result
+
+
+# The arguments of `_fit_and_score` of a (candidate, fold) task
+_Task = namedtuple('_Task', [
+    'estimator', 'fold', 'max_features', 'parameters', 'scorer',
+    'return_train_score', 'train_rows', 'n_threads', 'trace_args',
+    'error_score'])
+
+
+class _Predictions(RegressorMixin):
+    # Stands in for an estimator whose predictions are already known, so
+    # that they are scored by a scorer, or by the R^2 of `score` by default
+    def __init__(self, y_pred):
+        self.y_pred = y_pred
+
+    def predict(self, X):
+        return self.y_pred
+
+
+def _score_predictions(scorer, y_pred, y_true):
+    # Rows without a prediction, e.g. never out of bag, are left out
+    kept = ~np.isnan(y_pred)
+    return scorer(_Predictions(y_pred[kept]), None, np.asarray(y_true)[kept])
+
+
+def _fit_and_score_nested(estimator, fold, max_features, parameters, scorer,
+                          return_train_score, train_rows=None, n_threads=None,
+                          trace_args=None, error_score=np.nan, sizes=(),
+                          size_name='n_estimators', oob_score=False):
+    """
+    Fit an estimator on a cached fold once, with the largest of several
+    values of its nested parameter, and score the models nested in it for
+    every value, e.g. the forests of the first trees of a forest
+
+    Parameters
+    ----------
+    estimator : sklearn.base.BaseEstimator
+        The unfitted forest, with a fixed `random_state`, see
+        `nested_predictions`
+    fold : PreprocessedFold or TransformedFold
+        The preprocessed CV fold
+    max_features : int or None
+        The `max_features` to slice the fold vocabulary with
+    parameters : dict
+        The estimator parameters shared by the candidates, without the step
+        prefix and the nested parameter
+    scorer : callable
+        The scorer to evaluate the nested models with
+    return_train_score : bool
+        Whether to score on the training slice as well
+    train_rows : numpy.ndarray or None
+        Positions of the training rows to fit on, `None` to fit on the whole
+        training slice
+    n_threads : int or None
+        The maximum number of BLAS/OpenMP threads of the worker, `None` for
+        no limit
+    trace_args : dict or None
+        The arguments of the spans of the fit and the scoring, `None` not to
+        record spans
+    error_score : 'raise' or float
+        The score of every value when the fit fails, or `"raise"` to raise
+        its error, defaulted to `nan`
+    sizes : list of int
+        The values of the nested parameter of the candidates
+    size_name : str
+        The nested parameter, defaulted to `"n_estimators"`
+    oob_score : bool
+        Whether to score the out-of-bag predictions of the training slice of a
+        forest rather than the predictions of the validation slice, defaulted
+        to `False`
+
+    Returns
+    -------
+    list of dict :
+        The results of every value, as returned by `_fit_and_score`. The fit
+        time of a value is its share of the fit, proportional to the value,
+        and the spans are in the first result.
+    """
+    start_cpu_time = time.process_time()
+    results = [{'fit_time': 0.0, 'score_time': 0.0} for _ in sizes]
+    tracer = None if trace_args is None else Tracer()
+    n_trees = max(sizes)
+    with _limit_threads(n_threads):
+        X_train, X_test = fold.transform(max_features)
+        y_train = fold.y_train
+        if train_rows is not None:
+            X_train, y_train = X_train[train_rows], y_train.iloc[train_rows]
+        estimator = clone(estimator).set_params(
+            **parameters, **{size_name: n_trees})
+
+        start_time = time.time()
+        try:
+            with _span(tracer, 'fit', **(trace_args or {})):
+                estimator.fit(X_train, y_train)
+            fit_time = time.time() - start_time
+            with _span(tracer, 'score', **(trace_args or {})):
+                if oob_score:
+                    test_scores = {
+                        size: _score_predictions(scorer, y_pred, y_train)
+                        for size, y_pred in nested_predictions(
+                            estimator, X_train, sizes,
+                            out_of_bag=True).items()}
+                else:
+                    test_scores = {
+                        size: _score_predictions(scorer, y_pred, fold.y_test)
+                        for size, y_pred in nested_predictions(
+                            estimator, X_test, sizes).items()}
+            if return_train_score:
+                with _span(tracer, 'train score', **(trace_args or {})):
+                    train_scores = {
+                        size: _score_predictions(scorer, y_pred, y_train)
+                        for size, y_pred in nested_predictions(
+                            estimator, X_train, sizes).items()}
+            score_time = time.time() - start_time - fit_time
+            for result, size in zip(results, sizes):
+                result['fit_time'] = fit_time * size / n_trees
+                result['score_time'] = score_time / len(sizes)
+                result['test_score'] = test_scores[size]
+                if return_train_score:
+                    result['train_score'] = train_scores[size]
+        except Exception:
+            if error_score == 'raise':
+                raise
+            fit_error = traceback.format_exc()
+            for result in results:
+                result['test_score'] = result['train_score'] = error_score
+                result['fit_error'] = fit_error
+    # The CPU time of the whole worker, shared by the values
+    cpu_time = time.process_time() - start_cpu_time
+    peak_memory = peak_memory_mib()
+    for result, size in zip(results, sizes):
+        result['cpu_time'] = cpu_time * size / sum(sizes)
+        result['peak_memory'] = peak_memory
+    if tracer is not None:
+        results[0]['trace'] = tracer.events
+    return results
+
+
+def _warn_about_fit_failures(results, error_score):
+    """
+    Warn about the failed fits among the results of a round of fits, the way
+    `cross_validate` does
+
+    Parameters
+    ----------
+    results : list of dict
+        The results of `_fit_and_score`
+    error_score : float
+        The score the failed fits were given
+    """
+    errors = [o['fit_error'] for o in results if o.get('fit_error')]
+    if not errors:
+        return
+    details = '\n'.join(
+        f"{'-' * 80}\n{count} fits failed with the following error:\n{error}"
+        for error, count in Counter(errors).items())
+    warnings.warn(
+        f"\n{len(errors)} fits failed out of a total of {len(results)}.\n"
+        "The score on these train-test partitions for these parameters will "
+        f"be set to {error_score}.\nIf these failures are not expected, you "
+        "can try to debug them by setting error_score='raise'.\n\n"
+        f"Below are more details about the failures:\n{details}",
+        FitFailedWarning)
+
+
+def _transform_fold(steps, fold, max_features, train_rows=None,
+                    n_threads=None, trace_args=None):
+    """
+    Fit the intermediate steps of the pipeline on a cached fold
+
+    Parameters
+    ----------
+    steps : sklearn.pipeline.Pipeline
+        The unfitted steps between the preprocessor and the final estimator,
+        with the parameters of the candidates sharing them
+    fold : PreprocessedFold
+        The preprocessed fold
+    max_features : int or None
+        Number of vocabulary terms to keep
+    train_rows : numpy.ndarray or None
+        Rows of the training slice to fit on, `None` for all of them
+    n_threads : int or None
+        The maximum number of BLAS/OpenMP threads of the worker, `None` for
+        no limit
+    trace_args : dict or None
+        The arguments of the span of the fit, `None` not to record it
+
+    Returns
+    -------
+    dict :
+        The `TransformedFold`, the CPU time, the peak memory of the worker,
+        and the span if `trace_args` is given
+    """
+    start_cpu_time = time.process_time()
+    tracer = None if trace_args is None else Tracer()
+    with _limit_threads(n_threads), \
+            _span(tracer, 'intermediate steps', **(trace_args or {})):
+        transformed = TransformedFold(
+            steps, fold, max_features, train_rows).fit()
+    result = {'fold': transformed,
+              'cpu_time': time.process_time() - start_cpu_time,
+              'peak_memory': peak_memory_mib()}
+    if tracer is not None:
+        result['trace'] = tracer.events
+    return result
+
+
+def _journaled_fit_and_score(journal_path, key, *args):
+    """
+    Run `_fit_and_score` and record its result in a `SearchJournal`
+
+    Parameters
+    ----------
+    journal_path : str
+        Path to the journal file
+    key : str
+        The journal key of the task
+    *args
+        The arguments of `_fit_and_score`
+
+    Returns
+    -------
+    dict :
+        The result of `_fit_and_score`
+    """
+    result = _fit_and_score(*args)
+    # The spans are only of interest to the session that ran the fit
+    SearchJournal.record(journal_path, key, {
+        name: value for name, value in result.items() if name != 'trace'})
+    return result
+
+
+def _journaled_fit_and_score_nested(journal_path, keys, *args):
+    """
+    Run `_fit_and_score_nested` and record its results in a `SearchJournal`
+
+    Parameters
+    ----------
+    journal_path : str
+        Path to the journal file
+    keys : list of str
+        The journal keys of the candidates of every value
+    *args
+        The arguments of `_fit_and_score_nested`
+
+    Returns
+    -------
+    list of dict :
+        The results of `_fit_and_score_nested`
+    """
+    results = _fit_and_score_nested(*args)
+    for key, result in zip(keys, results):
+        SearchJournal.record(journal_path, key, {
+            name: value for name, value in result.items() if name != 'trace'})
+    return results
+
+
+class FoldCachedSearchCV(BaseEstimator):
+    """
+    A randomized search over a `preprocessor`-estimator pipeline that fits the
+    preprocessor only once per fold.
+
+    It samples the same candidates and uses the same folds as
+    `RandomizedSearchCV`, and exposes the same `cv_results_`, `best_*_`
+    attributes and `predict`. The difference is that the column transformer
+    is fitted and the fold transformed once per distinct preprocessing
+    configuration (possibly in a `FoldCache` shared with other searches), while
+    `columntransformer__countvectorizer__max_features` is applied by slicing
+    the cached frequency-ranked vocabulary, or the `n_features` of a
+    `HashingVectorizer` text transformer by folding the cached hashed
+    columns. Only the final estimator is refit
+    per candidate. Steps between the preprocessor and the final estimator,
+    e.g. a `KNeighborsTransformer` computing a neighbor graph, are fitted
+    once per fold and distinct (preprocessing, `max_features`, step
+    parameters) configuration, and shared by the candidates that only differ
+    in the final estimator parameters.
+
+    The fits run on a joblib pool of `n_jobs` workers, unless an `executor`
+    (e.g. a `concurrent.futures.ProcessPoolExecutor` shared by several
+    searches) is given. Each worker caps its BLAS/OpenMP thread pools to
+    `n_inner_threads`.
+
+    With a `checkpoint_dir`, every finished (candidate, fold) fit is appended
+    to a `SearchJournal` keyed by a hash of the data and the search
+    configuration, and a search started again with the same data and
+    configuration skips the fits found in the journal.
+
+    With a `nested_param`, i.e. the `n_estimators` of a forest with a fixed
+    `random_state`, the candidates that only differ in it are evaluated on
+    every fold from a single forest fitted with its largest value, whose
+    first trees make the forests of the smaller values, see
+    `nested_predictions`. With `oob_score`, forests are scored on the
+    out-of-bag predictions of their training slice, e.g. with
+    `cv=OutOfBagSplit()` to fit them once on the whole data rather than once
+    per fold.
+
+    When every parameter is drawn from a list, the candidates are sampled
+    without replacement from their grid, so that no candidate is evaluated
+    twice, and the search stops at the size of the grid.
+
+    With a `refit_estimator`, the best parameters are refitted on it rather
+    than on `estimator`, e.g. on an equivalent pipeline without the steps that
+    only speed up the search, such as a kernel computed from cached
+    distances.
+
+    With `profile`, the fits and transforms of every sub-transformer on every
+    fold, the fit and scoring of every (candidate, fold) and the refit are
+    recorded as spans in `trace_`, including those run in worker processes.
+
+    As in `RandomizedSearchCV`, a (candidate, fold) fit that fails is scored
+    `error_score` with a `FitFailedWarning`, or raises its error if
+    `error_score` is `"raise"`.
+
+    Attributes
+    ----------
+    cv_results_ : dict
+        The cross-validation results, in the `RandomizedSearchCV` format
+    best_index_ : int
+        Index of the best candidate in `cv_results_`
+    best_params_ : dict
+        Parameters of the best candidate
+    best_score_ : float
+        Mean cross-validated score of the best candidate
+    best_estimator_ : sklearn.pipeline.Pipeline
+        The pipeline refitted on the whole data with `best_params_`
+    worker_peak_memory_ : float or None
+        The highest peak memory in MiB among the processes that fitted the
+        candidates
+    search_time_ : float
+        Wall time in seconds of fitting and scoring all the candidates
+    cpu_time_ : float
+        Total CPU time in seconds of the workers while fitting and scoring
+        the candidates
+    trace_ : list of dict or None
+        The spans recorded with `profile`, see `Tracer`
+    n_resumed_fits_ : int
+        Number of (candidate, fold) fits read from the journal of
+        `checkpoint_dir` rather than run
+
+    Methods
+    -------
+    fit(X, y)
+        Run the search and refit the best pipeline on the whole data
+    predict(X)
+        Predict with the best pipeline
+    """
+
+    def __init__(self, estimator, param_distributions, n_iter=10,
+                 scoring=None, cv=5, n_jobs=None, random_state=None,
+                 return_train_score=False, text_transformer='countvectorizer',
+                 fold_cache=None, executor=None, n_inner_threads=None,
+                 checkpoint_dir=None, profile=False, refit_estimator=None,
+                 nested_param=None, oob_score=False, error_score=np.nan):
+        self.estimator = estimator
+        self.param_distributions = param_distributions
+        self.n_iter = n_iter
+        self.scoring = scoring
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.return_train_score = return_train_score
+        self.text_transformer = text_transformer
+        self.fold_cache = fold_cache
+        self.executor = executor
+        self.n_inner_threads = n_inner_threads
+        self.checkpoint_dir = checkpoint_dir
+        self.profile = profile
+        self.refit_estimator = refit_estimator
+        self.nested_param = nested_param
+        self.oob_score = oob_score
+        self.error_score = error_score
+
+    def _search_key(self, X, y, folds):
+        """
+        Hash the data and the search configuration, apart from how the search
+        is parallelized
+
+        Parameters
+        ----------
+        X : pandas.DataFrame
+            The training features
+        y : pandas.Series
+            The training target
+        folds : list of tuple
+            The training and validation indices of every fold
+
+        Returns
+        -------
+        str :
+            The hash
+        """
+        estimator = clone(self.estimator)
+        estimator.set_params(**{
+            name: None for name in estimator.get_params()
+            if name.endswith('n_jobs')})
+        search_parameters = {
+            name: value for name, value in self.get_params(deep=False).items()
+            if name not in ('estimator', 'param_distributions', 'n_jobs',
+                            'fold_cache', 'executor', 'n_inner_threads',
+                            'checkpoint_dir', 'profile', 'refit_estimator',
+                            'nested_param')}
+        distributions = {
+            name: describe_distribution(distribution)
+            for name, distribution in self.param_distributions.items()}
+        return joblib.hash((
+            type(self).__name__, X, y, [test for _, test in folds], estimator,
+            search_parameters, distributions))
+
+    def _group_nested(self, keys, tasks):
+        """
+        Group the (candidate, fold) tasks that only differ in the
+        `nested_param` into one task per fit
+
+        Parameters
+        ----------
+        keys : list of str
+            The journal keys of the tasks
+        tasks : list of _Task
+            The arguments of `_fit_and_score` of every task
+
+        Returns
+        -------
+        tuple :
+            The journal keys of the tasks of every group, and the arguments
+            of `_fit_and_score_nested` of every group
+        """
+        size_name = self.nested_param.partition('__')[2]
+        default_size = self.estimator.get_params()[self.nested_param]
+        groups = {}
+        for key, task in zip(keys, tasks):
+            parameters = dict(task.parameters)
+            size = parameters.pop(size_name, default_size)
+            # The tasks of a fold share the fold object, and their training
+            # rows within a round
+            group = (id(task.fold), task.max_features,
+                     tuple(sorted(parameters.items())))
+            groups.setdefault(group, (parameters, []))[1].append(
+                (key, size, task))
+
+        grouped_keys, grouped_tasks = [], []
+        for parameters, members in groups.values():
+            first = members[0][2]
+            sizes = [size for _, size, _ in members]
+            trace_args = first.trace_args and first.trace_args | {
+                'sizes': [int(size) for size in sizes]}
+            grouped_keys.append([key for key, _, _ in members])
+            grouped_tasks.append(
+                tuple(first._replace(parameters=parameters,
+                                     trace_args=trace_args))
+                + (sizes, size_name, self.oob_score))
+        return grouped_keys, grouped_tasks
+
+    def _split_parameters(self, parameters):
+        """
+        Split the parameters of a candidate into its preprocessing
+        configuration, its `max_features` (or the `n_features` of hashed text
+        features), the configuration of the intermediate steps and its
+        estimator parameters
+
+        Parameters
+        ----------
+        parameters : dict
+            The candidate parameters, prefixed with the pipeline step names
+
+        Returns
+        -------
+        tuple :
+            The hashable preprocessing configuration (other than
+            `max_features`), the `max_features`, the hashable configuration
+            of the intermediate steps, and the estimator parameters
+        """
+        preprocessor_name = self.estimator.steps[0][0]
+        estimator_name = self.estimator.steps[-1][0]
+        intermediate_names = [name for name, _ in self.estimator.steps[1:-1]]
+        width_param = text_width_param(
+            self.estimator.steps[0][1], self.text_transformer)
+        max_features_key = \
+            f'{preprocessor_name}__{self.text_transformer}__{width_param}'
+
+        preprocessing, intermediate, estimator_parameters = [], [], {}
+        max_features = self.estimator.get_params()[max_features_key]
+        for key, value in parameters.items():
+            step, _, name = key.partition('__')
+            if key == max_features_key:
+                max_features = value
+            elif step == preprocessor_name:
+                preprocessing.append((name, value))
+            elif step == estimator_name:
+                estimator_parameters[name] = value
+            elif step in intermediate_names:
+                intermediate.append((key, value))
+            else:
+                raise ValueError(
+                    f"Parameter {key} does not belong to a step of the "
+                    "pipeline")
+        return (tuple(sorted(preprocessing)), max_features,
+                tuple(sorted(intermediate)), estimator_parameters)
+
+    def fit(self, X, y):
+        """
+        Run the search and refit the best pipeline on the whole data
+
+        Parameters
+        ----------
+        X : pandas.DataFrame
+            The training features
+        y : pandas.Series
+            The training target
+
+        Returns
+        -------
+        FoldCachedSearchCV :
+            The fitted search
+        """
+        preprocessor = self.estimator.steps[0][1]
+        estimator = self.estimator.steps[-1][1]
+        intermediate_steps = (
+            self.estimator[1:-1] if len(self.estimator.steps) > 2 else None)
+        scorer = check_scoring(self.estimator, scoring=self.scoring)
+        if self.oob_score:
+            check_out_of_bag_support(estimator)
+        if self.fold_cache is None:
+            fold_cache = FoldCache(
+                X, y, list(check_cv(self.cv, y).split(X, y)),
+                text_transformer=self.text_transformer, trace=self.profile)
+        else:
+            fold_cache = self.fold_cache
+        folds = fold_cache.folds
+        n_iter = self.n_iter
+        if not any(hasattr(distribution, 'rvs')
+                   for distribution in self.param_distributions.values()):
+            # `ParameterSampler` samples a grid without replacement
+            n_iter = min(n_iter, len(ParameterGrid(self.param_distributions)))
+        candidates = list(ParameterSampler(
+            self.param_distributions, n_iter, random_state=self.random_state))
+        configurations = {
+            self._split_parameters(c)[0]: None for c in candidates}
+        preprocessors = {
+            configuration: clone(preprocessor).set_params(**dict(configuration))
+            for configuration in configurations}
+
+        tracer = Tracer() if self.profile else None
+        journal, journaled = None, {}
+        fitted, resumed = [], []
+        if self.checkpoint_dir is not None:
+            journal = SearchJournal(
+                self.checkpoint_dir, self._search_key(X, y, folds))
+            journaled = journal.load()
+
+        # Shuffled training rows of each fold, of which a prefix is taken when
+        # fitting on a fraction of the training slice
+        random_state = check_random_state(self.random_state)
+        permutations = [random_state.permutation(len(train))
+                        for train, _ in folds]
+
+        # With an executor, the joblib pool only preprocesses the folds that
+        # are missing from the cache
+        n_jobs = self.n_jobs if self.executor is None else None
+        with Parallel(n_jobs=n_jobs) as parallel:
+            # Fit the preprocessor once per fold and preprocessing
+            # configuration
+            fold_cache.prefetch(preprocessors.values(), parallel)
+            preprocessed_folds = {
+                (configuration, i): fold_cache.get(preprocessor, i)
+                for configuration, preprocessor in preprocessors.items()
+                for i in range(len(folds))}
+            if tracer is not None:
+                for fold in {id(f): f for f in preprocessed_folds.values()
+                             }.values():
+                    tracer.extend(fold.trace_events)
+
+            def preprocessed_fold(preprocessing, i):
+                # The configurations of candidates proposed during the search
+                # are preprocessed on first use
+                if (preprocessing, i) not in preprocessed_folds:
+                    fold = fold_cache.get(clone(preprocessor).set_params(
+                        **dict(preprocessing)), i)
+                    if tracer is not None:
+                        tracer.extend(fold.trace_events)
+                    preprocessed_folds[(preprocessing, i)] = fold
+                return preprocessed_folds[(preprocessing, i)]
+
+            # The transformed folds fitted beforehand, kept for the later
+            # calls of `evaluate_candidates` with the same training fraction,
+            # e.g. those of an adaptive search. When the preprocessing and
+            # the intermediate steps only take values from lists, their
+            # configurations are few, and all of them are worth keeping.
+            kept_folds, used_configurations = {}, Counter()
+            estimator_prefix = f'{self.estimator.steps[-1][0]}__'
+            finite_configurations = not any(
+                hasattr(distribution, 'rvs') for name, distribution
+                in self.param_distributions.items()
+                if not name.startswith(estimator_prefix))
+
+            def transform_folds(configurations):
+                # Fit the intermediate steps once per configuration and fold
+                configurations = list(configurations)
+                tasks = [
+                    (clone(intermediate_steps).set_params(**dict(intermediate)),
+                     preprocessed_fold(preprocessing, i), max_features,
+                     train_rows, self.n_inner_threads,
+                     None if tracer is None else {
+                         'steps': {name: np.asarray(value).tolist()
+                                   for name, value in intermediate},
+                         'max_features': max_features, 'fold': i})
+                    for preprocessing, max_features, intermediate, i,
+                    train_rows in configurations]
+                if self.executor is None:
+                    out = parallel(
+                        delayed(_transform_fold)(*task) for task in tasks)
+                else:
+                    futures = [self.executor.submit(_transform_fold, *task)
+                               for task in tasks]
+                    out = [future.result() for future in futures]
+                fitted.extend(out)
+                if tracer is not None:
+                    for o in out:
+                        tracer.extend(o['trace'])
+                # Only the resource usage is kept, so that the folds are freed
+                # once their candidates are fit
+                return {
+                    configuration[:4]: o.pop('fold')
+                    for configuration, o in zip(configurations, out)}
+
+            def evaluate_candidates(candidates, train_fraction=1.0,
+                                    fold_indices=None):
+                # Only the final estimator is fit per candidate and fold
+                if fold_indices is None:
+                    fold_indices = range(len(folds))
+                keys, tasks, configurations = [], [], {}
+                for candidate in candidates:
+                    preprocessing, max_features, intermediate, \
+                        estimator_parameters = self._split_parameters(
+                            candidate)
+                    for i in fold_indices:
+                        n_train = int(np.ceil(train_fraction * len(folds[i][0])))
+                        train_rows = (None if train_fraction >= 1
+                                      else permutations[i][:n_train])
+                        key = task_key(candidate, i, train_fraction)
+                        if key in journaled:
+                            resumed.append(key)
+                            continue
+                        keys.append(key)
+                        trace_args = None if tracer is None else {
+                            'candidate': {
+                                name: np.asarray(value).tolist()
+                                for name, value in candidate.items()},
+                            'fold': i,
+                            'train_fraction': train_fraction}
+                        task = _Task(
+                            estimator, preprocessed_fold(preprocessing, i),
+                            max_features, estimator_parameters, scorer,
+                            self.return_train_score, train_rows,
+                            self.n_inner_threads, trace_args, self.error_score)
+                        if intermediate_steps is not None:
+                            # The fold is looked up by its configuration
+                            # once the transformed folds are fitted
+                            configuration = (
+                                preprocessing, max_features, intermediate, i)
+                            configurations.setdefault(
+                                configuration, configuration + (train_rows,))
+                            task = task._replace(fold=configuration)
+                        tasks.append(task)
+
+                # The final estimators are fit on the transformed folds, whose
+                # training rows are already sampled. The folds shared by
+                # several candidates, within this call or with an earlier
+                # one, are fitted once beforehand and kept, while the others
+                # are fitted by the worker of their only candidate, e.g. a
+                # Nystroem map of a continuous `gamma`.
+                if configurations:
+                    for key in [key for key in kept_folds
+                                if key[-1] != train_fraction]:
+                        del kept_folds[key]
+                    n_tasks = Counter(task.fold for task in tasks)
+                    transformed_folds = {
+                        key: kept_folds[key + (train_fraction,)]
+                        for key in configurations
+                        if key + (train_fraction,) in kept_folds}
+                    fitted_folds = transform_folds(
+                        configuration for key, configuration
+                        in configurations.items()
+                        if key not in transformed_folds
+                        and (finite_configurations or n_tasks[key]
+                             + used_configurations[key + (train_fraction,)]
+                             > 1))
+                    transformed_folds.update(fitted_folds)
+                    for key, fold in fitted_folds.items():
+                        kept_folds[key + (train_fraction,)] = fold
+                    used_configurations.update(
+                        key + (train_fraction,) for key in configurations)
+                    for j, task in enumerate(tasks):
+                        if task.fold not in transformed_folds:
+                            preprocessing, max_features, intermediate, i, \
+                                train_rows = configurations[task.fold]
+                            transformed_folds[task.fold] = TransformedFold(
+                                clone(intermediate_steps).set_params(
+                                    **dict(intermediate)),
+                                preprocessed_fold(preprocessing, i),
+                                max_features, train_rows)
+                        tasks[j] = task._replace(
+                            fold=transformed_folds[task.fold],
+                            train_rows=None)
+
+                function, journaled_function = \
+                    _fit_and_score, _journaled_fit_and_score
+                if self.nested_param is not None:
+                    keys, tasks = self._group_nested(keys, tasks)
+                    function, journaled_function = \
+                        _fit_and_score_nested, _journaled_fit_and_score_nested
+
+                if journal is not None:
+                    function = journaled_function
+                    tasks = [(journal.path, key) + task
+                             for key, task in zip(keys, tasks)]
+                if self.executor is None:
+                    out = parallel(delayed(function)(*task) for task in tasks)
+                else:
+                    futures = [self.executor.submit(function, *task)
+                               for task in tasks]
+                    out = [future.result() for future in futures]
+                if self.nested_param is not None:
+                    # One result per candidate, rather than per fit
+                    keys = [key for group in keys for key in group]
+                    out = [o for group in out for o in group]
+                _warn_about_fit_failures(out, self.error_score)
+                journaled.update(zip(keys, out))
+                fitted.extend(out)
+                if tracer is not None:
+                    for o in out:
+                        tracer.extend(o.get('trace', []))
+
+                return [journaled[task_key(candidate, i, train_fraction)]
+                        for candidate in candidates for i in fold_indices]
+
+            self.n_splits_ = len(folds)
+            start_time = time.time()
+            candidates, out = self._run_search(evaluate_candidates, candidates)
+            self.search_time_ = time.time() - start_time
+
+        # Only the fits of this run, rather than the journaled ones, count
+        # towards its resource usage
+        self.n_resumed_fits_ = len(resumed)
+        peak_memories = [o['peak_memory'] for o in fitted
+                         if o['peak_memory'] is not None]
+        self.worker_peak_memory_ = max(peak_memories, default=None)
+        self.cpu_time_ = sum(o['cpu_time'] for o in fitted)
+        self.cv_results_ = self._format_results(candidates, out)
+        self.best_index_ = int(self.cv_results_['rank_test_score'].argmin())
+        self.best_params_ = candidates[self.best_index_]
+        self.best_score_ = self.cv_results_['mean_test_score'][self.best_index_]
+
+        start_time = time.time()
+        best_estimator = clone(
+            self.estimator if self.refit_estimator is None
+            else self.refit_estimator).set_params(**self.best_params_)
+        if self.executor is None:
+            with (nullcontext() if tracer is None else trace_transformers(
+                    tracer, best_estimator.steps[0][1])), \
+                    _span(tracer, 'refit', candidate=self.best_index_):
+                self.best_estimator_ = best_estimator.fit(X, y)
+        else:
+            with _span(tracer, 'refit', candidate=self.best_index_):
+                self.best_estimator_ = self.executor.submit(
+                    best_estimator.fit, X, y).result()
+        self.refit_time_ = time.time() - start_time
+        self.trace_ = None if tracer is None else tracer.events
+        return self
+
+    def _run_search(self, evaluate_candidates, candidates):
+        """
+        Evaluate the candidates
+
+        Subclasses may override this to evaluate the candidates differently,
+        e.g. in several rounds.
+
+        Parameters
+        ----------
+        evaluate_candidates : callable
+            Takes a list of candidates, and optionally the fraction of the
+            training slices to fit on and the indices of the folds to
+            evaluate, all of them by default, and returns the results of
+            `_fit_and_score`, candidate-major
+        candidates : list of dict
+            The sampled candidates
+
+        Returns
+        -------
+        tuple :
+            The candidates to report in `cv_results_`, and their results
+        """
+        return candidates, evaluate_candidates(candidates)
+
+    def _rank(self, means):
+        """
+        Rank the candidates by their mean test scores, the higher the better
+
+        The candidates without a mean, e.g. failed or pruned ones, rank
+        together after all the others.
+
+        Parameters
+        ----------
+        means : numpy.ndarray
+            The mean test score of every candidate
+
+        Returns
+        -------
+        numpy.ndarray :
+            The rank of every candidate, starting from 1
+        """
+        missing = np.isnan(means)
+        ranks = np.full(len(means), np.count_nonzero(~missing) + 1,
+                        dtype=np.int32)
+        ranks[~missing] = rankdata(-means[~missing], method='min')
+        return ranks
+
+    def _format_results(self, candidates, out):
+        """
+        Format the fold results the same way `RandomizedSearchCV` does
+
+        Parameters
+        ----------
+        candidates : list of dict
+            The sampled candidates
+        out : list of dict
+            The results of `_fit_and_score`, candidate-major
+
+        Returns
+        -------
+        dict :
+            The `cv_results_`
+        """
+        n_candidates, n_splits = len(candidates), len(out) // len(candidates)
+        results = {}
+
+        def store(key_name, values, splits=False, rank=False):
+            array = np.array(values, dtype=np.float64).reshape(
+                n_candidates, n_splits)
+            if splits:
+                for i in range(n_splits):
+                    results[f'split{i}_{key_name}'] = array[:, i]
+            means = array.mean(axis=1)
+            results[f'mean_{key_name}'] = means
+            results[f'std_{key_name}'] = array.std(axis=1)
+            if rank:
+                results[f'rank_{key_name}'] = self._rank(means)
+
+        store('fit_time', [o['fit_time'] for o in out])
+        store('score_time', [o['score_time'] for o in out])
+
+        param_results = defaultdict(lambda: np.ma.MaskedArray(
+            np.empty(n_candidates, dtype=object), mask=True))
+        for i, parameters in enumerate(candidates):
+            for name, value in parameters.items():
+                param_results[f'param_{name}'][i] = value
+        results.update(param_results)
+        results['params'] = candidates
+
+        store('test_score', [o['test_score'] for o in out],
+              splits=True, rank=True)
+        if self.return_train_score:
+            store('train_score', [o['train_score'] for o in out], splits=True)
+        return results
+
+    def predict(self, X):
+        """
+        Predict with the best pipeline
+
+        Parameters
+        ----------
+        X : pandas.DataFrame
+            The features to predict on
+
+        Returns
+        -------
+        numpy.ndarray :
+            The predictions
+        """
+        return self.best_estimator_.predict(X)
+
+    def score(self, X, y):
+        """
+        Score the best pipeline with the search metric
+
+        Parameters
+        ----------
+        X : pandas.DataFrame
+            The features to score on
+        y : pandas.Series
+            The target to score against
+
+        Returns
+        -------
+        float :
+            The score
+        """
+        scorer = check_scoring(self.estimator, scoring=self.scoring)
+        return scorer(self.best_estimator_, X, y)
+
+
+class FoldCachedHalvingSearchCV(FoldCachedSearchCV):
+    """
+    A successive-halving variant of `FoldCachedSearchCV`.
+
+    All the sampled candidates are first evaluated with a small amount of
+    resource, and only the best `1 / factor` of them are evaluated again with
+    `factor` times the resource, until the last round uses `max_resources`.
+    The resource is either `"n_samples"`, i.e. the number of training rows
+    (sub-sampled within each fold), or an integer parameter of the pipeline,
+    e.g. `"randomforestregressor__n_estimators"`, like `HalvingRandomSearchCV`.
+
+    `cv_results_` has the same columns as `FoldCachedSearchCV`, with one row
+    per candidate holding the scores of the last round it reached. Candidates
+    that reached a later round rank before those eliminated earlier.
+
+    Attributes
+    ----------
+    n_resources_ : list of int
+        The amount of resource used in each round
+    n_candidates_ : list of int
+        The number of candidates evaluated in each round
+    n_iterations_ : int
+        The number of rounds run
+    n_fits_ : int
+        The number of estimator fits done, against `n_iter * cv` in a full
+        randomized search
+    """
+
+    def __init__(self, estimator, param_distributions, n_iter=10,
+                 scoring=None, cv=5, n_jobs=None, random_state=None,
+                 return_train_score=False, text_transformer='countvectorizer',
+                 fold_cache=None, executor=None, n_inner_threads=None,
+                 checkpoint_dir=None, profile=False, refit_estimator=None,
+                 nested_param=None, oob_score=False, error_score=np.nan,
+                 resource='n_samples', factor=3, min_resources='exhaust',
+                 max_resources='auto'):
+        super().__init__(
+            estimator, param_distributions, n_iter=n_iter, scoring=scoring,
+            cv=cv, n_jobs=n_jobs, random_state=random_state,
+            return_train_score=return_train_score,
+            text_transformer=text_transformer, fold_cache=fold_cache,
+            executor=executor, n_inner_threads=n_inner_threads,
+            checkpoint_dir=checkpoint_dir, profile=profile,
+            refit_estimator=refit_estimator,
+            nested_param=nested_param, oob_score=oob_score,
+            error_score=error_score)
+        self.resource = resource
+        self.factor = factor
+        self.min_resources = min_resources
+        self.max_resources = max_resources
+
+    def fit(self, X, y):
+        if self.resource == 'n_samples':
+            self._max_resources = (
+                len(X) if self.max_resources == 'auto' else self.max_resources)
+        elif self.max_resources == 'auto':
+            raise ValueError(
+                "max_resources must be set when the resource is not n_samples")
+        else:
+            self._max_resources = self.max_resources
+        if self.resource in self.param_distributions:
+            raise ValueError(
+                f"Cannot both tune and use {self.resource} as the resource")
+        return super().fit(X, y)
+
+    def _run_search(self, evaluate_candidates, candidates):
+        n_iterations = 1 + int(np.floor(
+            np.log(len(candidates)) / np.log(self.factor)))
+        if self.min_resources == 'exhaust':
+            min_resources = \
+                self._max_resources // self.factor ** (n_iterations - 1)
+        else:
+            min_resources = self.min_resources
+        min_resources = max(min_resources, 1)
+
+        results = [None] * len(candidates)
+        rounds = np.zeros(len(candidates), dtype=int)
+        remaining = list(range(len(candidates)))
+        self.n_resources_, self.n_candidates_ = [], []
+        for iteration in range(n_iterations):
+            n_resources = min(
+                min_resources * self.factor ** iteration, self._max_resources)
+            self.n_resources_.append(int(n_resources))
+            self.n_candidates_.append(len(remaining))
+
+            if self.resource == 'n_samples':
+                round_candidates = [candidates[i] for i in remaining]
+                out = evaluate_candidates(
+                    round_candidates, n_resources / self._max_resources)
+            else:
+                for i in remaining:
+                    candidates[i] = candidates[i] | {
+                        self.resource: int(n_resources)}
+                out = evaluate_candidates([candidates[i] for i in remaining])
+
+            n_splits = len(out) // len(remaining)
+            means = []
+            for j, i in enumerate(remaining):
+                results[i] = out[j * n_splits:(j + 1) * n_splits]
+                rounds[i] = iteration
+                means.append(np.mean([o['test_score'] for o in results[i]]))
+
+            if iteration == n_iterations - 1:
+                break
+            # Keep the best `1 / factor` of the candidates for the next round
+            n_keep = max(int(np.ceil(len(remaining) / self.factor)), 1)
+            order = np.argsort(-np.nan_to_num(means, nan=-np.inf),
+                               kind='stable')
+            remaining = sorted(remaining[k] for k in order[:n_keep])
+
+        self.n_iterations_ = len(self.n_resources_)
+        self.n_fits_ = sum(self.n_candidates_) * n_splits
+        self._rounds = rounds
+        return candidates, [o for result in results for o in result]
+
+    def _rank(self, means):
+        # Rank by the round reached first, then by the mean test score
+        ranks = np.empty(len(means), dtype=np.int32)
+        keys = list(zip(-self._rounds, -np.nan_to_num(means, nan=-np.inf)))
+        order = sorted(range(len(means)), key=lambda i: keys[i])
+        for position, i in enumerate(order):
+            if position > 0 and keys[i] == keys[order[position - 1]]:
+                ranks[i] = ranks[order[position - 1]]
+            else:
+                ranks[i] = position + 1
+        return ranks
+
+
+class FoldCachedAdaptiveSearchCV(FoldCachedSearchCV):
+    """
+    A sequential, model-based variant of `FoldCachedSearchCV` that stops
+    evaluating the candidates that cannot beat the best one.
+
+    The first `n_startup` candidates are those of `FoldCachedSearchCV`, and
+    the following ones are proposed by a `ParzenSampler` from the scores of
+    the candidates evaluated so far, in batches of one candidate per worker,
+    until `n_iter` candidates are evaluated. Every batch is evaluated fold by
+    fold, and after each fold but the last, a candidate whose mean score on
+    the folds evaluated so far falls below that of the best candidate on the
+    same folds by more than `prune_tolerance` times its magnitude is pruned,
+    i.e. not evaluated on the remaining folds. The proposals only depend on
+    `random_state` and the scores, so that the search is reproducible.
+
+    `cv_results_` has the same columns as `FoldCachedSearchCV`, with one row
+    per candidate, in the order they were proposed. The folds a pruned
+    candidate was not evaluated on hold `nan`, so that its mean score is
+    `nan` and it ranks last.
+
+    Attributes
+    ----------
+    n_fits_ : int
+        The number of estimator fits done, against `n_iter * cv` in a full
+        randomized search
+    n_pruned_ : int
+        The number of candidates pruned before their last fold
+    n_fits_to_best_ : int or None
+        The number of estimator fits done when the best candidate was
+        evaluated, `None` if no candidate has a finite mean score
+    time_to_best_ : float or None
+        Wall time in seconds from the start of the search to the evaluation
+        of the best candidate, `None` if no candidate has a finite mean score
+    """
+
+    def __init__(self, estimator, param_distributions, n_iter=10,
+                 scoring=None, cv=5, n_jobs=None, random_state=None,
+                 return_train_score=False, text_transformer='countvectorizer',
+                 fold_cache=None, executor=None, n_inner_threads=None,
+                 checkpoint_dir=None, profile=False, refit_estimator=None,
+                 nested_param=None, oob_score=False, error_score=np.nan,
+                 prune_tolerance=0.1, n_startup=10):
+        super().__init__(
+            estimator, param_distributions, n_iter=n_iter, scoring=scoring,
+            cv=cv, n_jobs=n_jobs, random_state=random_state,
+            return_train_score=return_train_score,
+            text_transformer=text_transformer, fold_cache=fold_cache,
+            executor=executor, n_inner_threads=n_inner_threads,
+            checkpoint_dir=checkpoint_dir, profile=profile,
+            refit_estimator=refit_estimator,
+            nested_param=nested_param, oob_score=oob_score,
+            error_score=error_score)
+        self.prune_tolerance = prune_tolerance
+        self.n_startup = n_startup
+
+    def _run_search(self, evaluate_candidates, candidates):
+        start_time = time.time()
+        n_splits = self.n_splits_
+        batch_size = max(joblib.effective_n_jobs(self.n_jobs), 1)
+        sampler = ParzenSampler(
+            self.param_distributions, random_state=self.random_state,
+            n_startup=self.n_startup)
+        # The sampled candidates start the search, and stand in for the
+        # proposals once the sampler finds no new candidate, e.g. at the end
+        # of a small grid
+        startup, fallback = \
+            candidates[:self.n_startup], candidates[self.n_startup:]
+        tried, trials, evaluated, results = set(), [], [], []
+        incumbent = None
+        self.n_fits_ = self.n_pruned_ = 0
+        self.n_fits_to_best_ = self.time_to_best_ = None
+
+        while len(evaluated) < len(candidates):
+            batch = []
+            while len(batch) < batch_size \
+                    and len(evaluated) + len(batch) < len(candidates):
+                candidate = startup.pop(0) if startup \
+                    else sampler.propose(trials, exclude=tried)
+                while candidate is None and fallback:
+                    candidate = fallback.pop(0)
+                    if candidate_key(candidate) in tried:
+                        candidate = None
+                if candidate is None:
+                    break
+                tried.add(candidate_key(candidate))
+                batch.append(candidate)
+            if not batch:
+                break
+
+            scores = np.full((len(batch), n_splits), np.nan)
+            batch_results = [[None] * n_splits for _ in batch]
+            active = list(range(len(batch)))
+            for i in range(n_splits):
+                out = evaluate_candidates(
+                    [batch[j] for j in active], fold_indices=[i])
+                self.n_fits_ += len(active)
+                for j, o in zip(active, out):
+                    batch_results[j][i] = o
+                    scores[j, i] = o['test_score']
+                if incumbent is None or i == n_splits - 1:
+                    continue
+                # Failed candidates are pruned too, as their mean is `nan`
+                reference = incumbent[:i + 1].mean()
+                threshold = reference - self.prune_tolerance * abs(reference)
+                active = [j for j in active
+                          if scores[j, :i + 1].mean() >= threshold]
+
+            for j, candidate in enumerate(batch):
+                if batch_results[j][-1] is None:
+                    self.n_pruned_ += 1
+                    trials.append((candidate, -np.inf))
+                    missing = {'fit_time': np.nan, 'score_time': np.nan,
+                               'test_score': np.nan, 'train_score': np.nan}
+                    batch_results[j] = [o or missing for o in batch_results[j]]
+                    continue
+                mean = scores[j].mean()
+                trials.append((candidate, mean))
+                if not np.isnan(mean) and \
+                        (incumbent is None or mean > incumbent.mean()):
+                    incumbent = scores[j]
+                    self.n_fits_to_best_ = self.n_fits_
+                    self.time_to_best_ = time.time() - start_time
+            evaluated.extend(batch)
+            results.extend(o for result in batch_results for o in result)
+
+        return evaluated, results
@@ -0,0 +1,116 @@
+import json
+import os
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+
+
+def _to_json(value):
+    # NumPy scalars and arrays in the best parameters are not JSON types
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def metadata_path(model_path):
+    """
+    Get the path to the metadata file of a model artifact
+
+    Parameters
+    ----------
+    model_path : str
+        Path to the model artifact, e.g. `"results/models/tuned_ridge.joblib"`
+
+    Returns
+    -------
+    str :
+        Path to the metadata file, e.g. `"results/models/tuned_ridge.json"`
+    """
+    return f'{os.path.splitext(model_path)[0]}.json'
+
+
+def dump_model(pipeline, model_path, metadata=None):
+    """
+    Dump a fitted pipeline as a lean model artifact
+
+    The artifact only holds the pipeline, uncompressed so that its NumPy
+    arrays (e.g. the KNN training matrix, the SVR support vectors or the tree
+    node arrays) can be memory-mapped by `load_model`. A small JSON metadata
+    file is written next to it. Both are written under temporary names first,
+    so that a model dumped over an older version of itself, e.g. an online
+    model checkpoint, is never left truncated by an interrupted write.
+
+    Parameters
+    ----------
+    pipeline : sklearn.pipeline.Pipeline
+        The fitted pipeline
+    model_path : str
+        Path to dump the pipeline to
+    metadata : dict or None
+        Extra metadata to write, e.g. the best parameters of the search
+    """
+    # Only dumping needs the version of scikit-learn, as loading a model
+    # imports the modules of its own classes
+    import sklearn
+
+    temporary_path = f'{model_path}.{os.getpid()}.tmp'
+    joblib.dump(pipeline, temporary_path)
+
+    header = {
+        'estimator': type(pipeline.steps[-1][1]).__name__,
+        'features': list(getattr(pipeline, 'feature_names_in_', [])),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'versions': {
+            'scikit-learn': sklearn.__version__,
+            'numpy': np.__version__,
+            'joblib': joblib.__version__
+        }
+    } | (metadata or {})
+    temporary_metadata_path = f'{metadata_path(model_path)}.{os.getpid()}.tmp'
+    with open(temporary_metadata_path, 'w') as file:
+        json.dump(header, file, indent=2, default=_to_json)
+    os.replace(temporary_path, model_path)
+    os.replace(temporary_metadata_path, metadata_path(model_path))
+
+
+def load_model(model_path, mmap_mode='r'):
+    """
+    Load a model artifact written by `dump_model`
+
+    With the default `mmap_mode`, the arrays of the pipeline are mapped
+    read-only from the file rather than read, so that loading is near-instant
+    and the processes loading the same model share its pages.
+
+    Parameters
+    ----------
+    model_path : str
+        Path to the model artifact
+    mmap_mode : str or None
+        The `numpy.memmap` mode of the arrays, defaulted to `"r"`, `None` to
+        read them into memory
+
+    Returns
+    -------
+    sklearn.pipeline.Pipeline :
+        The fitted pipeline
+    """
+    return joblib.load(model_path, mmap_mode=mmap_mode)
+
+
+def load_metadata(model_path):
+    """
+    Load the metadata of a model artifact written by `dump_model`
+
+    Parameters
+    ----------
+    model_path : str
+        Path to the model artifact
+
+    Returns
+    -------
+    dict :
+        The metadata
+    """
+    with open(metadata_path(model_path)) as file:
+        return json.load(file)
@@ -0,0 +1,135 @@
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.utils.validation import check_array
+
+
+class OutOfBagSplit():
+    """
+    A single CV split whose training and validation slices are both the
+    whole data, for searches scoring the candidates on the out-of-bag
+    predictions of their training slice rather than on a validation slice.
+
+    Methods
+    -------
+    split(X, y = None, groups = None)
+        Get the split
+    get_n_splits(X = None, y = None, groups = None)
+        Get the number of splits, i.e. 1
+    """
+
+    def split(self, X, y=None, groups=None):
+        rows = np.arange(len(X))
+        yield rows, rows
+
+    def get_n_splits(self, X=None, y=None, groups=None):
+        return 1
+
+    def __repr__(self):
+        return f'{type(self).__name__}()'
+
+
+def check_out_of_bag_support(forest):
+    """
+    Check that the bootstrap samples of the trees of a forest are exposed,
+    so that its training rows can be predicted out of bag
+
+    Parameters
+    ----------
+    forest : sklearn.ensemble.RandomForestRegressor
+        The forest, fitted or not
+
+    Raises
+    ------
+    ValueError
+        If the forest has no `estimators_samples_`, i.e. with scikit-learn
+        older than 1.4
+    """
+    if not hasattr(type(forest), 'estimators_samples_'):
+        raise ValueError(
+            "Out-of-bag scores read the bootstrap samples of the trees from "
+            "`estimators_samples_`, please install scikit-learn 1.4 or later")
+
+
+def prefix_predictions(forest, X, sizes, out_of_bag=False):
+    """
+    Get the predictions of the forests made of the first trees of a fitted
+    forest, for several numbers of trees at once
+
+    With a fixed `random_state`, the first `n` trees of a forest are the
+    trees of the same forest grown with `n_estimators=n`, so that the
+    predictions are those of every smaller forest, from the predictions of
+    each tree computed once.
+
+    Parameters
+    ----------
+    forest : sklearn.ensemble.RandomForestRegressor
+        The fitted forest, with at least `max(sizes)` trees
+    X : numpy.ndarray or scipy.sparse.spmatrix
+        The rows to predict, the training rows of the forest if `out_of_bag`
+    sizes : list of int
+        Numbers of first trees
+    out_of_bag : bool
+        Whether to predict every training row with the trees it is
+        out-of-bag for, read from the `estimators_samples_` of the forest
+        (scikit-learn 1.4 or later), defaulted to `False`
+
+    Returns
+    -------
+    dict :
+        The predictions keyed by number of trees. Out of bag, the rows that
+        are in the bag of all the trees are predicted as `nan`.
+    """
+    # The trees predict in single precision, converted once for all of them
+    X = check_array(X, accept_sparse='csr', dtype=np.float32)
+    n_samples = X.shape[0]
+    if out_of_bag:
+        check_out_of_bag_support(forest)
+        # The in-bag rows of every tree
+        samples = forest.estimators_samples_
+
+    total = np.zeros(n_samples)
+    counts = np.zeros(n_samples)
+    wanted, predictions = set(sizes), {}
+    for n_trees, tree in enumerate(forest.estimators_[:max(sizes)], 1):
+        if out_of_bag:
+            rows = np.ones(n_samples, dtype=bool)
+            rows[samples[n_trees - 1]] = False
+            total[rows] += tree.predict(X[rows])
+            counts[rows] += 1
+        else:
+            total += tree.predict(X)
+        if n_trees in wanted:
+            if out_of_bag:
+                with np.errstate(invalid='ignore'):
+                    predictions[n_trees] = total / counts
+            else:
+                predictions[n_trees] = total / n_trees
+    return predictions
+
+
+def nested_predictions(estimator, X, values, out_of_bag=False):
+    """
+    Get the predictions of the models nested in a fitted estimator, for
+    several values of its nested parameter at once
+
+    Parameters
+    ----------
+    estimator : sklearn.ensemble.RandomForestRegressor
+        The fitted forest, whose nested parameter is `n_estimators`
+    X : numpy.ndarray or scipy.sparse.spmatrix
+        The rows to predict
+    values : list of int
+        The values of the nested parameter
+    out_of_bag : bool
+        Whether to predict the training rows of a forest out of bag,
+        defaulted to `False`
+
+    Returns
+    -------
+    dict :
+        The predictions keyed by value, see `prefix_predictions`
+    """
+    if isinstance(estimator, RandomForestRegressor):
+        return prefix_predictions(estimator, X, values, out_of_bag)
+    raise TypeError(
+        f"{type(estimator).__name__} has no nested models to predict with")
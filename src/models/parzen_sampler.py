@@ -0,0 +1,245 @@
+import numpy as np
+from scipy.stats import rv_discrete
+from sklearn.utils import check_random_state
+
+
+class _Categorical():
+    # A list of values, sampled by index
+    def __init__(self, values):
+        self.values = list(values)
+
+    def prior(self, random_state):
+        return random_state.randint(len(self.values))
+
+    def encode(self, value):
+        for index, candidate in enumerate(self.values):
+            if np.array_equal(candidate, value):
+                return index
+        return None
+
+    def decode(self, index):
+        return self.values[index]
+
+    def parzen(self, observations):
+        # Frequencies smoothed with one prior observation per value
+        counts = np.bincount(np.asarray(observations, dtype=np.int64),
+                             minlength=len(self.values)) + 1.0
+        return counts / counts.sum()
+
+    def sample(self, weights, random_state):
+        return random_state.choice(len(self.values), p=weights)
+
+    def log_density(self, weights, index):
+        return np.log(weights[index])
+
+
+class _Numeric():
+    # A bounded scipy distribution, modelled in log space if log-uniform
+    def __init__(self, distribution):
+        self.distribution = distribution
+        self.log = distribution.dist.name in ('loguniform', 'reciprocal')
+        self.integer = isinstance(distribution.dist, rv_discrete)
+        low, high = distribution.support()
+        if self.integer:
+            low, high = low - 0.5, high + 0.5
+        self.low, self.high = (np.log(low), np.log(high)) if self.log \
+            else (low, high)
+
+    def prior(self, random_state):
+        return self.encode(self.distribution.rvs(random_state=random_state))
+
+    def encode(self, value):
+        return np.log(value) if self.log else float(value)
+
+    def decode(self, x):
+        value = np.exp(x) if self.log else x
+        return int(np.clip(np.round(value), self.low + 0.5, self.high - 0.5)) \
+            if self.integer else float(value)
+
+    def parzen(self, observations):
+        # A Gaussian around every observation, mixed with the uniform prior,
+        # with a bandwidth narrowing as observations accumulate
+        observations = np.asarray(observations, dtype=np.float64)
+        width = self.high - self.low
+        bandwidth = width / (len(observations) + 1) ** 0.5
+        return observations, bandwidth
+
+    def sample(self, parzen, random_state):
+        observations, bandwidth = parzen
+        component = random_state.randint(len(observations) + 1)
+        if component == len(observations):
+            return random_state.uniform(self.low, self.high)
+        return float(np.clip(
+            random_state.normal(observations[component], bandwidth),
+            self.low, self.high))
+
+    def log_density(self, parzen, x):
+        observations, bandwidth = parzen
+        gaussians = np.exp(-0.5 * ((x - observations) / bandwidth) ** 2) \
+            / (bandwidth * np.sqrt(2 * np.pi))
+        uniform = 1 / (self.high - self.low)
+        return np.log((gaussians.sum() + uniform) / (len(observations) + 1))
+
+
+class _Prior():
+    # Any other distribution, always sampled from itself
+    def __init__(self, distribution):
+        self.distribution = distribution
+
+    def prior(self, random_state):
+        return self.distribution.rvs(random_state=random_state)
+
+    def encode(self, value):
+        return value
+
+    def decode(self, value):
+        return value
+
+
+def candidate_key(candidate):
+    """
+    Get a key identifying a candidate, whatever the types of its values
+
+    Parameters
+    ----------
+    candidate : dict
+        The candidate parameters
+
+    Returns
+    -------
+    str :
+        The key
+    """
+    return repr(sorted(
+        (name, np.asarray(value).tolist()) for name, value in candidate.items()))
+
+
+def _dimension(distribution):
+    if not hasattr(distribution, 'rvs'):
+        return _Categorical(distribution)
+    if hasattr(distribution, 'dist') and \
+            np.isfinite(distribution.support()).all():
+        return _Numeric(distribution)
+    return _Prior(distribution)
+
+
+class ParzenSampler():
+    """
+    Proposes the candidates of a search from the results of the previous ones,
+    with a tree-structured Parzen estimator.
+
+    The first `n_startup` candidates are drawn from `param_distributions`
+    like `ParameterSampler`. Then, the evaluated candidates are split into the
+    best `gamma` of them and the others, every parameter gets a Parzen density
+    over each group, and the candidate with the highest ratio of the density
+    of the best group to that of the others among `n_samples` draws from the
+    best group is proposed. Lists of values are modelled as categories, and
+    bounded `scipy.stats` distributions as numbers, in log space for
+    log-uniform ones; other distributions are always drawn from themselves.
+    It runs in the search process, and its proposals only depend on
+    `random_state` and the results.
+
+    Attributes
+    ----------
+    param_distributions : dict
+        The parameter distributions, as in `RandomizedSearchCV`
+    random_state : int or None
+        The seed of the proposals
+    n_startup : int
+        Number of candidates drawn from the distributions before modelling
+        the results, defaulted to 10
+    gamma : float
+        The fraction of the evaluated candidates in the best group,
+        defaulted to 0.25
+    n_samples : int
+        Number of draws from the best group to propose the best of,
+        defaulted to 24
+
+    Methods
+    -------
+    propose(trials, exclude = ())
+        Propose the next candidate
+    """
+
+    def __init__(self, param_distributions, random_state=None, n_startup=10,
+                 gamma=0.25, n_samples=24):
+        self.param_distributions = param_distributions
+        self.random_state = check_random_state(random_state)
+        self.n_startup = n_startup
+        self.gamma = gamma
+        self.n_samples = n_samples
+        self._dimensions = {
+            name: _dimension(distribution)
+            for name, distribution in sorted(param_distributions.items())}
+
+    def _decode(self, point):
+        return {name: self._dimensions[name].decode(x)
+                for name, x in point.items()}
+
+    def _draw_prior(self):
+        return {name: dimension.prior(self.random_state)
+                for name, dimension in self._dimensions.items()}
+
+    def propose(self, trials, exclude=()):
+        """
+        Propose the next candidate
+
+        Parameters
+        ----------
+        trials : list of tuple
+            The evaluated candidates and their scores, the higher the better,
+            where the candidates known to be worse than the best one without
+            a score, e.g. pruned ones, score `-inf`, and the failed ones
+            `nan`
+        exclude : collection of str
+            The `candidate_key` of the candidates not to propose again, e.g.
+            those of a grid already evaluated
+
+        Returns
+        -------
+        dict or None :
+            The candidate, `None` if no new candidate was found
+        """
+        if len(trials) < self.n_startup:
+            points = [self._draw_prior() for _ in range(self.n_samples)]
+            scores = np.zeros(len(points))
+        else:
+            # Failed candidates go with the worst ones
+            scores = np.nan_to_num(
+                np.array([score for _, score in trials], dtype=np.float64),
+                nan=-np.inf)
+            order = np.argsort(-scores, kind='stable')
+            n_best = max(int(np.ceil(self.gamma * len(trials))), 1)
+            groups = [order[:n_best], order[n_best:]]
+
+            points, scores = [], np.zeros(self.n_samples)
+            parzens = {}
+            for name, dimension in self._dimensions.items():
+                if isinstance(dimension, _Prior):
+                    continue
+                encoded = [dimension.encode(trials[i][0][name])
+                           for i in range(len(trials))]
+                parzens[name] = [
+                    dimension.parzen([encoded[i] for i in group
+                                      if encoded[i] is not None])
+                    for group in groups]
+            for _ in range(self.n_samples):
+                point = {}
+                for name, dimension in self._dimensions.items():
+                    if name in parzens:
+                        point[name] = dimension.sample(
+                            parzens[name][0], self.random_state)
+                    else:
+                        point[name] = dimension.prior(self.random_state)
+                points.append(point)
+            for j, point in enumerate(points):
+                scores[j] = sum(
+                    self._dimensions[name].log_density(best, point[name])
+                    - self._dimensions[name].log_density(other, point[name])
+                    for name, (best, other) in parzens.items())
+
+        for j in np.argsort(-scores, kind='stable'):
+            candidate = self._decode(points[j])
+            if candidate_key(candidate) not in exclude:
+                return candidate
+        return None
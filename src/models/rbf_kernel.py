@@ -0,0 +1,102 @@
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin, TransformerMixin
+from sklearn.metrics.pairwise import euclidean_distances
+from sklearn.svm import SVR
+from sklearn.utils.extmath import row_norms
+from sklearn.utils.validation import check_array, check_is_fitted
+
+
+class SquaredDistances(BaseEstimator, TransformerMixin):
+    """
+    Transforms rows into their squared Euclidean distances to the training
+    rows.
+
+    Followed by `RBFKernelSVR`, it splits the RBF kernel of an SVR into the
+    distances, which do not depend on any hyperparameter and can be computed
+    once per fold, and an elementwise exponential per `gamma`.
+
+    Attributes
+    ----------
+    X_fit_ : numpy.ndarray or scipy.sparse.csr_matrix
+        The training rows
+    X_fit_squared_norms_ : numpy.ndarray
+        The squared norms of the training rows
+
+    Methods
+    -------
+    fit(X, y = None)
+        Store the training rows
+    transform(X)
+        Get the squared distances of `X` to the training rows
+    """
+
+    def fit(self, X, y=None):
+        self.X_fit_ = check_array(X, accept_sparse='csr')
+        self.X_fit_squared_norms_ = row_norms(self.X_fit_, squared=True)
+        return self
+
+    def transform(self, X):
+        check_is_fitted(self)
+        return euclidean_distances(
+            check_array(X, accept_sparse='csr'), self.X_fit_,
+            Y_norm_squared=self.X_fit_squared_norms_, squared=True)
+
+
+class RBFKernelSVR(RegressorMixin, BaseEstimator):
+    """
+    An `SVR` with an RBF kernel, fit on the squared distances of
+    `SquaredDistances` rather than on the features.
+
+    The kernel `exp(-gamma * distance)` is computed elementwise from the
+    distances and passed to an `SVR` with a precomputed kernel, which gives
+    the same model as `SVR(kernel='rbf', gamma=gamma)` on the features.
+
+    Attributes
+    ----------
+    C : float
+        Regularization parameter, defaulted to 1.0
+    gamma : float
+        Coefficient of the RBF kernel, defaulted to 1.0
+    epsilon : float
+        Width of the epsilon-tube, defaulted to 0.1
+    tol : float
+        Tolerance of the stopping criterion, defaulted to 1e-3
+    cache_size : float
+        Size of the kernel cache in MiB, defaulted to 200
+    max_iter : int
+        Limit on the solver iterations, defaulted to -1, i.e. no limit
+    svr_ : sklearn.svm.SVR
+        The fitted SVR over the precomputed kernel
+
+    Methods
+    -------
+    fit(X, y)
+        Fit the SVR on the kernel of the squared distances
+    predict(X)
+        Predict from the squared distances to the training rows
+    """
+
+    def __init__(self, C=1.0, gamma=1.0, epsilon=0.1, tol=1e-3,
+                 cache_size=200, max_iter=-1):
+        self.C = C
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.tol = tol
+        self.cache_size = cache_size
+        self.max_iter = max_iter
+
+    def _kernel(self, X):
+        # One allocation for the whole kernel, rather than one per operation
+        kernel = np.multiply(X, -self.gamma)
+        return np.exp(kernel, out=kernel)
+
+    def fit(self, X, y):
+        self.svr_ = SVR(
+            kernel='precomputed', C=self.C, epsilon=self.epsilon, tol=self.tol,
+            cache_size=self.cache_size, max_iter=self.max_iter
+        ).fit(self._kernel(X), y)
+        return self
+
+    def predict(self, X):
+        check_is_fitted(self)
+        return self.svr_.predict(self._kernel(X))
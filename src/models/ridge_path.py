@@ -0,0 +1,121 @@
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator, RegressorMixin, TransformerMixin
+from sklearn.utils.validation import check_array, check_is_fitted
+
+
+class RidgeRotation(BaseEstimator, TransformerMixin):
+    """
+    Rotates rows onto the principal axes of the centered training rows.
+
+    The rotated training columns are centered and orthogonal, with the
+    squared singular values of the centered training rows as their squared
+    norms, so that followed by `OrthogonalRidge`, the ridge solution of every
+    `alpha` costs a product rather than a solve. The axes come from a single
+    eigendecomposition of the smaller of the Gram matrix of the features and
+    the kernel matrix of the rows, so that the training rows, possibly
+    sparse, are never densified. The axes of zero variance are dropped, as
+    the ridge solution has no component along them.
+
+    Attributes
+    ----------
+    mean_ : numpy.ndarray
+        The mean of every training column
+    components_ : numpy.ndarray
+        The principal axes, one per row, of the centered training rows
+    singular_values_ : numpy.ndarray
+        The singular values of the centered training rows along every axis
+
+    Methods
+    -------
+    fit(X, y = None)
+        Find the principal axes of the training rows
+    transform(X)
+        Get the coordinates of `X` along the principal axes
+    """
+
+    def fit(self, X, y=None):
+        X = check_array(X, accept_sparse='csr', dtype=np.float64)
+        n_samples, n_features = X.shape
+        self.mean_ = np.asarray(X.mean(axis=0)).ravel()
+
+        if n_features <= n_samples:
+            # Gram matrix of the centered features, from the uncentered one
+            gram = X.T @ X
+            gram = gram.toarray() if sparse.issparse(gram) else gram
+            gram -= n_samples * np.outer(self.mean_, self.mean_)
+            eigenvalues, eigenvectors = np.linalg.eigh(gram)
+            kept = eigenvalues > eigenvalues[-1] * n_features * \
+                np.finfo(np.float64).eps
+            eigenvalues, eigenvectors = eigenvalues[kept], eigenvectors[:, kept]
+            components = eigenvectors.T
+        else:
+            # Kernel matrix of the centered rows, whose eigenvectors map back
+            # to the principal axes through the rows
+            X_mean = X @ self.mean_
+            kernel = X @ X.T
+            kernel = kernel.toarray() if sparse.issparse(kernel) else kernel
+            kernel += self.mean_ @ self.mean_ \
+                - X_mean[:, np.newaxis] - X_mean[np.newaxis, :]
+            eigenvalues, eigenvectors = np.linalg.eigh(kernel)
+            kept = eigenvalues > eigenvalues[-1] * n_samples * \
+                np.finfo(np.float64).eps
+            eigenvalues, eigenvectors = eigenvalues[kept], eigenvectors[:, kept]
+            left = eigenvectors / np.sqrt(eigenvalues)
+            components = np.asarray(
+                X.T @ left - np.outer(self.mean_, left.sum(axis=0))).T
+
+        self.components_ = components
+        self.singular_values_ = np.sqrt(eigenvalues)
+        return self
+
+    def transform(self, X):
+        check_is_fitted(self)
+        X = check_array(X, accept_sparse='csr', dtype=np.float64)
+        return np.asarray(X @ self.components_.T) \
+            - self.mean_ @ self.components_.T
+
+
+class OrthogonalRidge(RegressorMixin, BaseEstimator):
+    """
+    A `Ridge` for features whose centered training columns are orthogonal,
+    e.g. those of `RidgeRotation`.
+
+    With orthogonal columns, the ridge solution is solved column by column in
+    closed form, `coef = column . y / (squared column norm + alpha)`, which
+    gives the same model as `Ridge(alpha=alpha)` on the unrotated features,
+    in a single pass over the features.
+
+    Attributes
+    ----------
+    alpha : float
+        Regularization strength, defaulted to 1.0
+    coef_ : numpy.ndarray
+        The coefficients of the rotated features
+    intercept_ : float
+        The intercept
+
+    Methods
+    -------
+    fit(X, y)
+        Solve the ridge problem on the orthogonal features
+    predict(X)
+        Predict from the orthogonal features
+    """
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+
+    def fit(self, X, y):
+        X = check_array(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        X_mean, y_mean = X.mean(axis=0), y.mean()
+        X_centered = X - X_mean
+        squared_norms = np.einsum('ij,ij->j', X_centered, X_centered)
+        self.coef_ = X_centered.T @ (y - y_mean) / (squared_norms + self.alpha)
+        self.intercept_ = y_mean - X_mean @ self.coef_
+        return self
+
+    def predict(self, X):
+        check_is_fitted(self)
+        return check_array(X, dtype=np.float64) @ self.coef_ + self.intercept_
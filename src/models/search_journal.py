@@ -0,0 +1,138 @@
+import json
+import os
+
+import joblib
+import numpy as np
+
+
+def describe_distribution(distribution):
+    """
+    Describe a parameter distribution in a stable, hashable way
+
+    Frozen `scipy.stats` distributions are described by their name and
+    arguments rather than pickled, as their pickles hold random states.
+
+    Parameters
+    ----------
+    distribution : scipy.stats distribution or list
+        A distribution, or a list of values, of a `param_distributions`
+
+    Returns
+    -------
+    tuple or list :
+        The description of the distribution
+    """
+    if hasattr(distribution, 'dist') and hasattr(distribution, 'args'):
+        return (distribution.dist.name, distribution.args,
+                sorted(distribution.kwds.items()))
+    return [np.asarray(value).tolist() for value in distribution]
+
+
+class SearchJournal():
+    """
+    An append-only, on-disk journal of the finished (candidate, fold) fits of
+    a search.
+
+    Every line is a JSON object with the key of a task and its result. The
+    workers append their own lines as soon as they finish, with a single
+    `write` on a file opened for appending, so that lines from concurrent
+    workers do not interleave. A resumed search loads the journal and only
+    runs the tasks missing from it.
+
+    Attributes
+    ----------
+    path : str
+        Path to the journal file
+
+    Methods
+    -------
+    load()
+        Get the results recorded so far
+    record(path, key, result)
+        Append the result of a task to the journal at `path`
+    """
+
+    def __init__(self, checkpoint_dir, search_key):
+        """
+        Parameters
+        ----------
+        checkpoint_dir : str
+            Path to the folder of the journals
+        search_key : str
+            Hash of the training data and search configuration
+        """
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.path = os.path.join(checkpoint_dir, f'{search_key}.jsonl')
+
+    def load(self):
+        """
+        Get the results recorded so far
+
+        Returns
+        -------
+        dict :
+            The results of the recorded tasks, keyed by task key
+        """
+        results = {}
+        if not os.path.isfile(self.path):
+            return results
+        n_complete = 0
+        with open(self.path, 'rb') as file:
+            for line in file:
+                # The last line of an interrupted run may be truncated
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                results[entry['key']] = entry['result']
+                n_complete += len(line)
+        # Drop the truncated line, so that new lines are appended after the
+        # last complete one
+        if n_complete < os.path.getsize(self.path):
+            os.truncate(self.path, n_complete)
+        return results
+
+    @staticmethod
+    def record(path, key, result):
+        """
+        Append the result of a task to the journal at `path`
+
+        Parameters
+        ----------
+        path : str
+            Path to the journal file
+        key : str
+            The key of the task
+        result : dict
+            The result of the task
+        """
+        line = json.dumps({'key': key, 'result': result}) + '\n'
+        with open(path, 'a') as file:
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def task_key(candidate, fold, train_fraction):
+    """
+    Get the journal key of a (candidate, fold) fit
+
+    Parameters
+    ----------
+    candidate : dict
+        The candidate parameters
+    fold : int
+        Index of the fold
+    train_fraction : float
+        Fraction of the training slice the candidate is fitted on
+
+    Returns
+    -------
+    str :
+        The key of the task
+    """
+    parameters = sorted(
+        (name, np.asarray(value).tolist()) for name, value in candidate.items())
+    return f'{joblib.hash(parameters)}/{fold}/{train_fraction!r}'
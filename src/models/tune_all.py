@@ -0,0 +1,117 @@
+# author: Manvir Kohli, Julie Song, Kelvin Wong
+# date: 2026-10-18
+
+"""This module tunes all the model families in a single process. The training
+data is loaded once, the CV folds are split and preprocessed once, and the
+candidates of every family are fitted on one shared pool of worker processes.
+It dumps a tuned model and the CV scores of every family.
+
+All the families are tuned with `python -m src tune all`.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+from joblib import Parallel
+from sklearn.model_selection import check_cv
+
+from ..preprocessor.chocolate import make_text_transformer
+from ..preprocessor.fold_cache import FoldCache
+from .base_chocolate_model_tuner import BaseChocolateModelTuner
+from .chocolate_decision_tree import ChocolateDecisionTreeTuner
+from .chocolate_knn import ChocolateKNNTuner
+from .chocolate_random_forest import ChocolateRandomForestTuner
+from .chocolate_ridge import ChocolateRidgeTuner
+from .chocolate_svm_rbf import ChocolateSvmRbfTuner
+from .execution import make_executor
+
+# The most expensive families come first, so that their candidates are queued
+# first and the cheap ones fill the idle workers towards the end
+TUNERS = [
+    ChocolateRandomForestTuner,
+    ChocolateSvmRbfTuner,
+    ChocolateKNNTuner,
+    ChocolateDecisionTreeTuner,
+    ChocolateRidgeTuner
+]
+
+
+def tune_all(tuners, train_df_path, model_dump_dir, cv_score_output_dir):
+    """
+    Tune several model families on a shared pool and dump them
+
+    The local pool has as many workers as the candidates fitted at once
+    according to the core budget of the tuners, which must all have the same
+    budget and execution backend. With the `"queue"` backend, the candidates
+    are fitted by the workers serving the queue folder instead.
+
+    Parameters
+    ----------
+    tuners : list of BaseChocolateModelTuner
+        The tuners of the model families
+    train_df_path : str
+        Path to the training dataframe CSV file
+    model_dump_dir : str
+        Path to dump the models to
+    cv_score_output_dir : str
+        Path to save the CV scores to
+    """
+    X_train, y_train = BaseChocolateModelTuner.load_data(train_df_path)
+
+    # The folds only depend on the data, so every family shares them
+    assert len({tuner.search_cv for tuner in tuners}) == 1, \
+        "Please make sure all the tuners use the same CV"
+    folds = list(check_cv(tuners[0].search_cv, y_train).split(X_train, y_train))
+    assert len({tuner.text_features for tuner in tuners}) == 1, \
+        "Please make sure all the tuners use the same text features"
+    text_features = tuners[0].text_features
+    fold_cache = FoldCache(
+        X_train, y_train, folds,
+        text_transformer=make_text_transformer(text_features)[0],
+        trace=any(tuner.profile for tuner in tuners))
+    assert len({tuner.core_split() for tuner in tuners}) == 1, \
+        "Please make sure all the tuners have the same core budget"
+    n_outer_jobs, n_inner_threads = tuners[0].core_split()
+    assert len({(tuner.execution_backend, tuner.queue_dir)
+                for tuner in tuners}) == 1, \
+        "Please make sure all the tuners use the same execution backend"
+
+    # Fit every distinct preprocessor once per fold, and once on the whole
+    # data for the vocabulary, which hashed text features do not have
+    preprocessors = {}
+    for tuner in tuners:
+        preprocessor = tuner.create_preprocessor()
+        preprocessors.setdefault(joblib.hash(preprocessor), preprocessor)
+    fold_cache.prefetch(preprocessors.values(), Parallel(n_jobs=n_outer_jobs))
+    if text_features == 'count':
+        for preprocessor in preprocessors.values():
+            preprocessor.fit(X_train, y_train)
+
+    # Every search submits its candidates to the same pool of processes, or
+    # the same queue, from its own thread
+    start_time = time.time()
+    with make_executor(
+            tuners[0].execution_backend, n_outer_jobs, tuners[0].queue_dir
+    ) as executor, ThreadPoolExecutor(len(tuners)) as threads:
+        searches = threads.map(
+            lambda tuner: tuner.tune(
+                X_train, y_train,
+                fitted_preprocessor=preprocessors[
+                    joblib.hash(tuner.create_preprocessor())],
+                fold_cache=fold_cache,
+                executor=executor),
+            tuners)
+
+        cpu_time = 0
+        for tuner, search in zip(tuners, searches):
+            tuner.dump(search, model_dump_dir, cv_score_output_dir)
+            cpu_time += search.cpu_time_
+
+    wall_time = time.time() - start_time
+    utilization = cpu_time / (wall_time * n_outer_jobs * n_inner_threads)
+    print(
+        f"All models: {n_outer_jobs} candidates x {n_inner_threads} threads, "
+        f"{utilization:.0%} utilization over {wall_time:.1f}s"
+    )
+
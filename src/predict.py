@@ -0,0 +1,255 @@
+# author: Manvir Kohli, Julie Song, Kelvin Wong
+# date: 2026-10-18
+
+"""This module predicts the ratings of the chocolate bars in a CSV file with
+the schema of `chocolate.csv`, using one or more tuned models, see
+`python -m src predict`. The file is streamed in chunks of fixed size, so
+that files of any size are scored in bounded memory, and the predictions are
+written as the chunks are scored. Compiled scorers read the file row by row
+without pandas or scikit-learn, which are only imported to load tuned
+pipelines, so that short predictions with scorers start fast.
+"""
+
+import csv
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .chocolate_data import TARGET, read_chocolate_rows
+
+# The models of the current process, see `_load_models`
+_models = None
+
+
+def model_names(model_paths):
+    """
+    Name the prediction columns of the models after their files
+
+    Parameters
+    ----------
+    model_paths : list of str
+        Paths to the tuned models or compiled scorers
+
+    Returns
+    -------
+    list of str :
+        The file name of every model, without its extension
+
+    Raises
+    ------
+    ValueError
+        If several models have the same file name, as their predictions
+        would be written to the same column
+    """
+    names = [os.path.splitext(os.path.basename(path))[0]
+             for path in model_paths]
+    duplicates = sorted(
+        name for name, count in Counter(names).items() if count > 1)
+    if duplicates:
+        raise ValueError(
+            f"Several models are named {', '.join(duplicates)}, please "
+            "rename them so that every model has its own prediction column")
+    return names
+
+
+def _load_models(model_paths):
+    """
+    Load the models, and group the tuned pipelines by fitted preprocessor
+
+    Parameters
+    ----------
+    model_paths : list of str
+        Paths to the tuned models, and to compiled scorers (`.scorer` files)
+
+    Returns
+    -------
+    tuple :
+        The names of the models, in the order of `model_paths`, a list of
+        the preprocessor and the names and final estimators of the pipelines
+        sharing it for every distinct fitted preprocessor, and a list of the
+        names and compiled scorers
+    """
+    import joblib
+
+    from .models.compiled_scorer import load_scorer
+    from .models.model_artifact import load_model
+
+    names = model_names(model_paths)
+    groups, scorers = {}, []
+    for name, model_path in zip(names, model_paths):
+        if model_path.endswith('.scorer'):
+            scorers.append((name, load_scorer(model_path)))
+            continue
+        model = load_model(model_path)
+        preprocessor, estimator = model[:-1], model.steps[-1][1]
+        group = groups.setdefault(joblib.hash(preprocessor), (preprocessor, []))
+        group[1].append((name, estimator))
+    return names, list(groups.values()), scorers
+
+
+def _init_worker(model_paths):
+    global _models
+    _models = _load_models(model_paths)
+
+
+def predict_chunk(chunk):
+    """
+    Predict a chunk of rows with every model of the current process
+
+    Each distinct preprocessor transforms the chunk once, and the
+    transformed chunk is shared by all the models fitted with it. Compiled
+    scorers predict the rows of the chunk as dictionaries.
+
+    Parameters
+    ----------
+    chunk : pandas.DataFrame
+        The rows to score
+
+    Returns
+    -------
+    pandas.DataFrame :
+        One column of predictions per model, in the order of the model
+        paths, with the index of `chunk`
+    """
+    import pandas as pd
+
+    names, groups, scorers = _models
+    X = chunk.drop(columns=[TARGET], errors='ignore')
+    predictions = {}
+    for preprocessor, estimators in groups:
+        X_transformed = preprocessor.transform(X)
+        for name, estimator in estimators:
+            predictions[name] = estimator.predict(X_transformed)
+    if scorers:
+        # Missing values are `None`, as in the rows of `read_chocolate_rows`
+        rows = X.astype(object).where(X.notna(), None).to_dict('records')
+        for name, scorer in scorers:
+            predictions[name] = scorer.predict(rows)
+    return pd.DataFrame(predictions, index=chunk.index, columns=names)
+
+
+def predict_file(input_path, output_path, model_paths, chunk_size=10000,
+                 n_jobs=1):
+    """
+    Predict the rows of a CSV file chunk by chunk and write the predictions
+
+    At most `2 * n_jobs` chunks are read ahead of the one being written, so
+    that memory use is bounded whatever the size of the file. The output has
+    the row number in the input file and one column per model, named after
+    its file. Tuned pipelines and compiled scorers (`.scorer` files, see
+    `compile_pipeline`) can be mixed. When all the models are compiled
+    scorers, they predict the rows in the current process, see
+    `predict_file_compiled`.
+
+    Parameters
+    ----------
+    input_path : str
+        Path to the CSV file to score
+    output_path : str
+        Path to the CSV file to write the predictions to
+    model_paths : list of str
+        Paths to the tuned models or compiled scorers
+    chunk_size : int
+        Number of rows scored at once, defaulted to 10000
+    n_jobs : int
+        Number of worker processes scoring the chunks, defaulted to 1, i.e.
+        scoring in the current process
+
+    Returns
+    -------
+    int :
+        Number of rows scored
+
+    Raises
+    ------
+    ValueError
+        If several models have the same file name, see `model_names`
+    """
+    model_names(model_paths)
+    if all(path.endswith('.scorer') for path in model_paths):
+        return predict_file_compiled(
+            input_path, output_path, model_paths, chunk_size)
+
+    from .chocolate_data import read_chocolate_csv
+
+    chunks = read_chocolate_csv(input_path, chunksize=chunk_size)
+    n_rows = 0
+    with open(output_path, 'w', newline='') as output:
+        def write(predictions):
+            nonlocal n_rows
+            predictions.to_csv(
+                output, header=n_rows == 0, index_label='row')
+            n_rows += len(predictions)
+
+        if n_jobs == 1:
+            _init_worker(model_paths)
+            for chunk in chunks:
+                write(predict_chunk(chunk))
+            return n_rows
+
+        # Every worker loads the models once, and the memory-mapped arrays
+        # of the models are shared between the workers
+        with ProcessPoolExecutor(
+                n_jobs, initializer=_init_worker, initargs=(model_paths,)
+        ) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(predict_chunk, chunk))
+                if len(pending) >= 2 * n_jobs:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    return n_rows
+
+
+def predict_file_compiled(input_path, output_path, scorer_paths,
+                          chunk_size=10000):
+    """
+    Predict the rows of a CSV file with compiled scorers and write the
+    predictions, in the format of `predict_file`
+
+    The rows are read with `read_chocolate_rows` and predicted by the scorers
+    a chunk at a time, so that neither pandas nor scikit-learn is imported.
+
+    Parameters
+    ----------
+    input_path : str
+        Path to the CSV file to score
+    output_path : str
+        Path to the CSV file to write the predictions to
+    scorer_paths : list of str
+        Paths to the compiled scorers
+    chunk_size : int
+        Number of rows scored at once, defaulted to 10000
+
+    Returns
+    -------
+    int :
+        Number of rows scored
+    """
+    from .models.compiled_scorer import load_scorer
+
+    scorers = {name: load_scorer(path)
+               for name, path in zip(model_names(scorer_paths), scorer_paths)}
+    n_rows = 0
+    with open(output_path, 'w', newline='') as output:
+        writer = csv.writer(output)
+        writer.writerow(['row'] + list(scorers))
+
+        def write(rows):
+            nonlocal n_rows
+            predictions = [scorer.predict(rows) for scorer in scorers.values()]
+            for i, row_predictions in enumerate(zip(*predictions)):
+                writer.writerow(
+                    [n_rows + i] + [float(p) for p in row_predictions])
+            n_rows += len(rows)
+
+        rows = []
+        for row in read_chocolate_rows(input_path):
+            rows.append(row)
+            if len(rows) == chunk_size:
+                write(rows)
+                rows = []
+        if rows:
+            write(rows)
+    return n_rows
@@ -1 +1 @@
-__all__ = ["chocolate"]
+__all__ = ["chocolate", "chocolate_transformers", "fold_cache", "streaming"]
@@ -1,13 +1,14 @@
-from sklearn.compose import make_column_transformer
-from sklearn.feature_extraction.text import CountVectorizer
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
 from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import (
-    FunctionTransformer, MultiLabelBinarizer, OneHotEncoder, OrdinalEncoder,
-    StandardScaler
+    FunctionTransformer, OneHotEncoder, OrdinalEncoder, StandardScaler
 )
-import pandas as pd
-import numpy as np
-from .my_multi_label_binarizer import MyMultiLabelBinarizer
+from .chocolate_transformers import (
+    CategoryHasher, IngredientBinarizer, IngredientCounter, PercentageParser
+)
+from .streaming import StreamingColumnTransformer
 
 # Ingredient list
 INGREDIENTS = [
@@ -20,76 +21,242 @@ INGREDIENTS = [
     'Sa',  # Salt
 ]
 
-preprocessor = make_column_transformer(
-    (
-        OneHotEncoder(handle_unknown='ignore', min_frequency=20),
-        [
-            'company_location'
-        ]
-    ),
-    (
-        OneHotEncoder(handle_unknown='ignore', min_frequency=10),
-        [
-            'country_of_bean_origin'
-        ]
-    ),
-    (
-        OrdinalEncoder(),
-        [
-            'review_date'
-        ]
-    ),
-    (
-        # pipeline-1
-        make_pipeline(
-            # convert ingredients to set
-            FunctionTransformer(lambda df:
-                                [set(x[3:].split(',')) if isinstance(x, str)
-                                 else set({})
-                                 for x in df['ingredients']]),
-            MyMultiLabelBinarizer(classes=INGREDIENTS)
-        ),
-        [
-            'ingredients'
-        ]
-    ),
-    (
-        # pipeline-2
-        make_pipeline(
-            # drop the '%' from the strings
-            FunctionTransformer(lambda df: df.apply(
-                lambda x: x.str[:-1], axis=1)),
-            StandardScaler()
-        ),
-        [
-            'cocoa_percent'
-        ]
-    ),
-    (
-        # pipeline-3
-        make_pipeline(
-            # extract number of ingredients in the chocolate
-            FunctionTransformer(lambda df: 
-                                df.apply(
-                                    axis=1, 
-                                    func = lambda x: x.str[0])
-                                .replace(np.nan,'0')
-                                .applymap(ord)-48),
-            StandardScaler()
-        ),
+
+def make_text_transformer(text_features='count', ngram_range=(1, 1)):
+    """
+    Create the transformer of the tasting notes
+
+    Parameters
+    ----------
+    text_features : str
+        `"count"` for a `CountVectorizer`, whose vocabulary is fitted, or
+        `"hashing"` for a `HashingVectorizer`, which has no fitted state and
+        a fixed width whatever the vocabulary, defaulted to `"count"`
+    ngram_range : tuple
+        The shortest and longest n-grams of words, defaulted to `(1, 1)`
+
+    Returns
+    -------
+    tuple :
+        The name and the unfitted transformer, which counts the n-grams of
+        every row
+    """
+    if text_features == 'count':
+        return 'countvectorizer', CountVectorizer(
+            stop_words='english', ngram_range=ngram_range)
+    if text_features == 'hashing':
+        # Counts like those of `CountVectorizer`, rather than signed and
+        # normalized hashes
+        return 'hashingvectorizer', HashingVectorizer(
+            stop_words='english', ngram_range=ngram_range,
+            alternate_sign=False, norm=None)
+    raise ValueError(f"Unknown text features: {text_features}")
+
+
+def make_preprocessor(sparse_output=False, text_features='count',
+                      ngram_range=(1, 1)):
+    """
+    Create the column transformer for the chocolate features
+
+    Parameters
+    ----------
+    sparse_output : bool
+        Whether to keep every block as a CSR matrix, defaulted to `False`.
+        The scalers then skip centering, like `StandardScaler(with_mean=False)`,
+        and the transformer always stacks a CSR matrix.
+    text_features : str
+        The transformer of the tasting notes, `"count"` or `"hashing"`,
+        defaulted to `"count"`, see `make_text_transformer`
+    ngram_range : tuple
+        The shortest and longest n-grams of the tasting notes, defaulted to
+        `(1, 1)`
+
+    Returns
+    -------
+    sklearn.compose.ColumnTransformer :
+        The unfitted column transformer
+    """
+    if sparse_output:
+        # `OrdinalEncoder` has no sparse output, so convert after encoding
+        ordinal_encoder = make_pipeline(
+            OrdinalEncoder(),
+            FunctionTransformer(sparse.csr_matrix, accept_sparse=True)
+        )
+    else:
+        ordinal_encoder = OrdinalEncoder()
+
+    # The names are those `make_column_transformer` gives in the dense mode, so
+    # that the parameter names are the same in both modes
+    return ColumnTransformer(
         [
-            'ingredients'
-        ]
-    ),
-    (
-        CountVectorizer(stop_words='english'),
-        'most_memorable_characteristics'
-    ),
-    (
-        'drop',
+            (
+                'onehotencoder-1',
+                OneHotEncoder(handle_unknown='ignore', min_frequency=20),
+                [
+                    'company_location'
+                ]
+            ),
+            (
+                'onehotencoder-2',
+                OneHotEncoder(handle_unknown='ignore', min_frequency=10),
+                [
+                    'country_of_bean_origin'
+                ]
+            ),
+            (
+                'ordinalencoder',
+                ordinal_encoder,
+                [
+                    'review_date'
+                ]
+            ),
+            (
+                'pipeline-1',
+                make_pipeline(
+                    # set the indicator bit of each ingredient
+                    IngredientBinarizer(classes=INGREDIENTS,
+                                        sparse_output=sparse_output)
+                ),
+                [
+                    'ingredients'
+                ]
+            ),
+            (
+                'pipeline-2',
+                make_pipeline(
+                    # drop the '%' from the strings
+                    PercentageParser(sparse_output=sparse_output),
+                    StandardScaler(with_mean=not sparse_output)
+                ),
+                [
+                    'cocoa_percent'
+                ]
+            ),
+            (
+                'pipeline-3',
+                make_pipeline(
+                    # extract number of ingredients in the chocolate
+                    IngredientCounter(sparse_output=sparse_output),
+                    StandardScaler(with_mean=not sparse_output)
+                ),
+                [
+                    'ingredients'
+                ]
+            ),
+            (
+                *make_text_transformer(text_features, ngram_range),
+                'most_memorable_characteristics'
+            ),
+            (
+                'drop',
+                'drop',
+                [
+                    'ref',
+                    'specific_bean_origin_or_bar_name'
+                ]
+            )
+        ],
+        # With every block sparse and one-hot encoded blocks present, the
+        # density is always below 1, hence the output is always CSR
+        sparse_threshold=1.0 if sparse_output else 0.3
+    )
+
+
+def make_streaming_preprocessor(n_text_features=2 ** 12,
+                                n_category_features=2 ** 8):
+    """
+    Create the column transformer for the chocolate features of an online
+    model, which is updated with batches of reviews
+
+    Every block is stateless or keeps running statistics, so that a batch
+    updates the transformer without changing its output columns: the
+    categories and the tasting notes are hashed rather than encoded with a
+    learned vocabulary, and the numbers are standardized with running means
+    and variances, including the review year, which is not ordinal-encoded
+    as later batches bring new years.
+
+    Parameters
+    ----------
+    n_text_features : int
+        Number of hashed columns of the tasting notes, defaulted to 4096
+    n_category_features : int
+        Number of hashed columns of the locations, defaulted to 256
+
+    Returns
+    -------
+    StreamingColumnTransformer :
+        The unfitted column transformer, whose output is always CSR
+    """
+    return StreamingColumnTransformer(
         [
-            'ref',
-            'specific_bean_origin_or_bar_name'
-        ]
+            (
+                'categoryhasher',
+                CategoryHasher(n_features=n_category_features),
+                [
+                    'company_location',
+                    'country_of_bean_origin'
+                ]
+            ),
+            (
+                'standardscaler',
+                StandardScaler(),
+                [
+                    'review_date'
+                ]
+            ),
+            (
+                'pipeline-1',
+                make_pipeline(
+                    # set the indicator bit of each ingredient
+                    IngredientBinarizer(classes=INGREDIENTS)
+                ),
+                [
+                    'ingredients'
+                ]
+            ),
+            (
+                'pipeline-2',
+                make_pipeline(
+                    # drop the '%' from the strings
+                    PercentageParser(),
+                    StandardScaler()
+                ),
+                [
+                    'cocoa_percent'
+                ]
+            ),
+            (
+                'pipeline-3',
+                make_pipeline(
+                    # extract number of ingredients in the chocolate
+                    IngredientCounter(),
+                    StandardScaler()
+                ),
+                [
+                    'ingredients'
+                ]
+            ),
+            (
+                'hashingvectorizer',
+                HashingVectorizer(
+                    n_features=n_text_features, stop_words='english',
+                    alternate_sign=False, norm=None),
+                'most_memorable_characteristics'
+            ),
+            (
+                'drop',
+                'drop',
+                [
+                    'ref',
+                    'specific_bean_origin_or_bar_name'
+                ]
+            )
+        ],
+        # With the hashed blocks present, the density is always below 1,
+        # hence the output is always CSR
+        sparse_threshold=1.0
     )
-)
+
+
+preprocessor = make_preprocessor()
+sparse_preprocessor = make_preprocessor(sparse_output=True)
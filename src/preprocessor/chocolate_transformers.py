@@ -0,0 +1,284 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.utils import murmurhash3_32
+
+
+def _first_column(X):
+    """
+    Get the first column of `X` as a `pandas.Series` with a positional index
+
+    Parameters
+    ----------
+    X : pandas.DataFrame, pandas.Series or array-like
+        The input passed in by the `ColumnTransformer`
+
+    Returns
+    -------
+    pandas.Series :
+        The first column of `X`, categorical if it is in `X`
+    """
+    if isinstance(X, pd.DataFrame):
+        X = X.iloc[:, 0]
+    if isinstance(X, pd.Series) and isinstance(X.dtype, pd.CategoricalDtype):
+        return X.reset_index(drop=True)
+    if not isinstance(X, pd.Series):
+        X = np.asarray(X, dtype=object)
+        X = X[:, 0] if X.ndim == 2 else X
+    return pd.Series(np.asarray(X, dtype=object))
+
+
+def _per_category(column, function):
+    """
+    Apply a row-wise function to a column, once per category if it is
+    categorical
+
+    Parameters
+    ----------
+    column : pandas.Series
+        The column
+    function : callable
+        Maps a `pandas.Series` of strings, possibly missing, to an array with
+        one row per string
+
+    Returns
+    -------
+    numpy.ndarray :
+        The result of `function` on every row of `column`
+    """
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return function(column)
+    # The missing values have the code -1, i.e. the last, missing category
+    categories = pd.Series(
+        list(column.cat.categories) + [np.nan], dtype=object)
+    return function(categories)[column.cat.codes.to_numpy()]
+
+
+def _as_output(X, sparse_output):
+    """
+    Convert a transformed array to the requested output format
+
+    Parameters
+    ----------
+    X : numpy.ndarray
+        The transformed array
+    sparse_output : bool
+        Whether to return a CSR matrix
+
+    Returns
+    -------
+    numpy.ndarray or scipy.sparse.csr_matrix :
+        `X` in the requested format
+    """
+    return sparse.csr_matrix(X) if sparse_output else X
+
+
+def ingredient_bitmask(ingredients, classes):
+    """
+    Encode ingredient strings, e.g. `"3- B,S,C"`, as integer bitmasks
+
+    Bit `i` is set when `classes[i]` is in the ingredient list. Missing values
+    and unknown ingredients leave the bits unset.
+
+    Parameters
+    ----------
+    ingredients : pandas.Series
+        The ingredient strings
+    classes : list of str
+        The known ingredients, in bit order
+
+    Returns
+    -------
+    numpy.ndarray :
+        One `int64` bitmask per row
+    """
+    ingredients = ingredients.reset_index(drop=True)
+    tokens = ingredients.str[3:].str.split(',').explode()
+    bits = (
+        tokens.map({c: 1 << i for i, c in enumerate(classes)})
+        .fillna(0)
+        .to_numpy(dtype=np.int64)
+    )
+    bitmask = np.zeros(len(ingredients), dtype=np.int64)
+    np.bitwise_or.at(bitmask, tokens.index.to_numpy(), bits)
+    return bitmask
+
+
+class IngredientBinarizer(BaseEstimator, TransformerMixin):
+    """
+    Binarize the `ingredients` column into one indicator column per class
+
+    It is a vectorized equivalent of splitting every ingredient string into a
+    Python `set` and passing the sets to `MultiLabelBinarizer(classes=...)`.
+
+    Attributes
+    ----------
+    classes : list of str
+        The ingredients to create indicator columns for
+    sparse_output : bool
+        Whether to output a CSR matrix, defaulted to `False`
+
+    Methods
+    -------
+    fit(X, y = None)
+        Do nothing, as the classes are fixed.
+    transform(X, y = None)
+        Get the ingredient indicators of `X`
+    """
+
+    def __init__(self, classes, sparse_output=False):
+        self.classes = classes
+        self.sparse_output = sparse_output
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X, y=None):
+        bitmask = _per_category(
+            _first_column(X),
+            lambda column: ingredient_bitmask(column, self.classes))
+        indicators = (bitmask[:, None] >> np.arange(len(self.classes))) & 1
+        return _as_output(indicators, self.sparse_output)
+
+    def _more_tags(self):
+        return {'stateless': True}
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(self.classes, dtype=object)
+
+
+def _count_ingredients(ingredients):
+    # The leading digit of every ingredient string, zero if missing
+    first_characters = ingredients.str[0].fillna('0').to_numpy(dtype='U1')
+    # Equivalent to `ord(c) - 48` on every character
+    return (first_characters.view(np.int32) - 48).astype(np.int64)
+
+
+class IngredientCounter(BaseEstimator, TransformerMixin):
+    """
+    Extract the number of ingredients, i.e. the leading digit of the
+    `ingredients` column, where missing values count as zero ingredients
+
+    Attributes
+    ----------
+    sparse_output : bool
+        Whether to output a CSR matrix, defaulted to `False`
+
+    Methods
+    -------
+    fit(X, y = None)
+        Do nothing, as there is nothing to learn.
+    transform(X, y = None)
+        Get the number of ingredients of `X` as a column vector
+    """
+
+    def __init__(self, sparse_output=False):
+        self.sparse_output = sparse_output
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X, y=None):
+        n_ingredients = _per_category(_first_column(X), _count_ingredients)
+        return _as_output(n_ingredients[:, None], self.sparse_output)
+
+    def _more_tags(self):
+        return {'stateless': True}
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(['n_ingredients'], dtype=object)
+
+
+class PercentageParser(BaseEstimator, TransformerMixin):
+    """
+    Parse percentage strings, e.g. `"70%"`, into numbers
+
+    Attributes
+    ----------
+    sparse_output : bool
+        Whether to output a CSR matrix, defaulted to `False`
+
+    Methods
+    -------
+    fit(X, y = None)
+        Do nothing, as there is nothing to learn.
+    transform(X, y = None)
+        Drop the trailing `%` of every column of `X` and parse as `float`
+    """
+
+    def __init__(self, sparse_output=False):
+        self.sparse_output = sparse_output
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X, y=None):
+        X = pd.DataFrame(X)
+        percentages = np.column_stack([
+            _per_category(
+                column,
+                lambda c: c.str[:-1].to_numpy(dtype=float, na_value=np.nan))
+            for _, column in X.items()])
+        return _as_output(percentages, self.sparse_output)
+
+    def _more_tags(self):
+        return {'stateless': True}
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(input_features, dtype=object)
+
+
+def _hash_categories(categories, name, n_features):
+    # The column of every category, -1 for missing values
+    return np.array([
+        -1 if pd.isna(category)
+        else murmurhash3_32(f'{name}={category}', positive=True) % n_features
+        for category in categories], dtype=np.int64)
+
+
+class CategoryHasher(BaseEstimator, TransformerMixin):
+    """
+    Encode the categories of every column as indicators hashed into a fixed
+    number of columns
+
+    Unlike `OneHotEncoder`, it learns no categories, so that the categories
+    first seen after fitting get their own indicator, up to hash collisions,
+    without changing the number of columns. Missing values set no indicator.
+
+    Attributes
+    ----------
+    n_features : int
+        Number of output columns, shared by all the input columns, defaulted
+        to 256
+
+    Methods
+    -------
+    fit(X, y = None)
+        Do nothing, as there is nothing to learn.
+    transform(X, y = None)
+        Get the hashed indicators of `X` as a CSR matrix
+    """
+
+    def __init__(self, n_features=2 ** 8):
+        self.n_features = n_features
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X, y=None):
+        X = pd.DataFrame(X)
+        columns = np.column_stack([
+            _per_category(
+                column,
+                lambda c, name=name: _hash_categories(c, name, self.n_features))
+            for name, column in X.items()])
+        rows = np.repeat(np.arange(len(X)), columns.shape[1])
+        columns = columns.ravel()
+        observed = columns >= 0
+        return sparse.csr_matrix(
+            (np.ones(observed.sum()), (rows[observed], columns[observed])),
+            shape=(len(X), self.n_features))
+
+    def _more_tags(self):
+        return {'stateless': True}
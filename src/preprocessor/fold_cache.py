@@ -0,0 +1,447 @@
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.kernel_approximation import Nystroem
+from sklearn.neighbors import KNeighborsTransformer
+from sklearn.preprocessing import normalize
+
+from ..profiling import Tracer, trace_transformers
+
+# The width hashed text features are fitted with once per fold, that of
+# `HashingVectorizer` by default, from which every narrower power of two is
+# derived
+HASH_WIDTH = 2 ** 20
+
+
+def text_width_param(preprocessor, text_transformer='countvectorizer'):
+    """
+    Get the parameter of the number of text columns of a column transformer
+
+    Parameters
+    ----------
+    preprocessor : sklearn.compose.ColumnTransformer
+        The column transformer
+    text_transformer : str
+        Name of the text transformer within `preprocessor`, defaulted to
+        `"countvectorizer"`
+
+    Returns
+    -------
+    str :
+        `"n_features"` for a `HashingVectorizer`, and `"max_features"` for a
+        `CountVectorizer`
+    """
+    transformer = {
+        name: transformer
+        for name, transformer, _ in preprocessor.transformers}[text_transformer]
+    if isinstance(transformer, HashingVectorizer):
+        return 'n_features'
+    return 'max_features'
+
+
+class PreprocessedFold():
+    """
+    A column transformer fitted once on the training slice of a CV fold.
+
+    The transformer is fitted with an unlimited `CountVectorizer` vocabulary,
+    and both the training and validation slices are transformed once. The
+    matrix for any `max_features` is then derived by keeping the most frequent
+    vocabulary columns, the same way `CountVectorizer` prunes its vocabulary,
+    so that the output is identical to refitting the transformer with that
+    `max_features`.
+
+    With a `HashingVectorizer` rather than a `CountVectorizer`, the slices are
+    hashed once into `HASH_WIDTH` columns, and the matrix for any power of
+    two `n_features` is derived by summing the columns of the same index
+    modulo `n_features`, as the hashed column of a token is its hash modulo
+    the width. The rows are normalized after summing, so that the output is
+    identical to transforming with that `n_features`.
+
+    Attributes
+    ----------
+    X_train : scipy.sparse.csr_matrix
+        The transformed training slice, with the full vocabulary
+    X_test : scipy.sparse.csr_matrix
+        The transformed validation slice, with the full vocabulary
+    y_train : pandas.Series
+        Target of the training slice
+    y_test : pandas.Series
+        Target of the validation slice
+    n_vocab : int
+        Size of the full vocabulary of the fold, or `HASH_WIDTH` for hashed
+        text features
+    trace_events : list of dict
+        The spans of the sub-transformer fits and transforms, recorded when
+        `trace` is set
+
+    Methods
+    -------
+    transform(max_features = None)
+        Get the training and validation matrices for a `max_features`, or an
+        `n_features` for hashed text features
+    """
+
+    def __init__(self, preprocessor, X, y, train, test,
+                 text_transformer='countvectorizer', trace=False):
+        """
+        Parameters
+        ----------
+        preprocessor : sklearn.compose.ColumnTransformer
+            The unfitted column transformer, which is cloned before fitting
+        X : pandas.DataFrame
+            The features of the whole training set
+        y : pandas.Series
+            The target of the whole training set
+        train : numpy.ndarray
+            Indices of the training slice
+        test : numpy.ndarray
+            Indices of the validation slice
+        text_transformer : str
+            Name of the `CountVectorizer` or `HashingVectorizer` within
+            `preprocessor`, defaulted to `"countvectorizer"`
+        trace : bool
+            Whether to record the spans of the sub-transformers in
+            `trace_events`, defaulted to `False`
+        """
+        X_train, X_test = X.iloc[train], X.iloc[test]
+        self.y_train, self.y_test = y.iloc[train], y.iloc[test]
+
+        self._hashed = \
+            text_width_param(preprocessor, text_transformer) == 'n_features'
+        if self._hashed:
+            hashing_vectorizer = preprocessor.get_params()[text_transformer]
+            assert not hashing_vectorizer.binary, \
+                "Please use a HashingVectorizer with binary=False"
+            self._text_norm = hashing_vectorizer.norm
+            parameters = {f'{text_transformer}__n_features': HASH_WIDTH,
+                          f'{text_transformer}__norm': None}
+        else:
+            parameters = {f'{text_transformer}__max_features': None}
+        column_transformer = clone(preprocessor).set_params(**parameters)
+        if trace:
+            tracer = Tracer()
+            with trace_transformers(tracer, column_transformer):
+                X_train_t = column_transformer.fit_transform(X_train)
+                X_test_t = column_transformer.transform(X_test)
+            self.trace_events = tracer.events
+        else:
+            X_train_t = column_transformer.fit_transform(X_train)
+            X_test_t = column_transformer.transform(X_test)
+            self.trace_events = []
+        self.X_train = sparse.csr_matrix(X_train_t)
+        self.X_test = sparse.csr_matrix(X_test_t)
+        self.sparse_threshold = column_transformer.sparse_threshold
+
+        # The text block is a contiguous range of columns in the output
+        text_slice = column_transformer.output_indices_[text_transformer]
+        self.n_vocab = text_slice.stop - text_slice.start
+        self._other_columns = np.r_[
+            0:text_slice.start, text_slice.stop:self.X_train.shape[1]]
+        self._text_offset = text_slice.start
+
+        text_block = self.X_train[:, text_slice]
+        if self._hashed:
+            self._other_stored_nnz = self.X_train.nnz - text_block.nnz
+        else:
+            # `CountVectorizer` keeps the `max_features` terms with the
+            # highest frequencies, ranked by `argsort` over the alphabetically
+            # sorted vocabulary
+            term_frequencies = np.asarray(text_block.sum(axis=0)).ravel()
+            self._frequency_rank = (-term_frequencies).argsort()
+            self._text_nnz = np.diff(text_block.tocsc().indptr)
+
+        # `ColumnTransformer` decides whether its output is sparse from the
+        # density of the training output, where dense blocks count as fully
+        # populated
+        self._other_nnz = 0
+        for name, transformer, columns in column_transformer.transformers_:
+            if name in (text_transformer, 'remainder') or transformer == 'drop':
+                continue
+            block_slice = column_transformer.output_indices_[name]
+            n_block = block_slice.stop - block_slice.start
+            if sparse.issparse(transformer.transform(X_train.iloc[:1][columns])):
+                self._other_nnz += self.X_train[:, block_slice].nnz
+            else:
+                self._other_nnz += n_block * self.X_train.shape[0]
+
+    def _fold(self, X, n_features):
+        # Sum the hashed columns of the same index modulo `n_features`
+        start, stop = self._text_offset, self._text_offset + self.n_vocab
+        indices = X.indices
+        folded_indices = np.where(
+            indices >= stop, indices - self.n_vocab + n_features, indices)
+        text = (indices >= start) & (indices < stop)
+        folded_indices[text] = start + (indices[text] - start) % n_features
+        # Copied, as summing the duplicates sorts the arrays in place
+        X = sparse.csr_matrix(
+            (X.data, folded_indices, X.indptr),
+            shape=(X.shape[0], X.shape[1] - self.n_vocab + n_features),
+            copy=True)
+        X.sum_duplicates()
+        if self._text_norm is not None:
+            X = sparse.hstack([
+                X[:, :start],
+                normalize(X[:, start:start + n_features], norm=self._text_norm),
+                X[:, start + n_features:]], format='csr')
+        return X
+
+    def _transform_hashed(self, n_features):
+        assert HASH_WIDTH % n_features == 0, \
+            "Please make the number of hashed text columns a power of two"
+        X_train = self._fold(self.X_train, n_features)
+        X_test = self._fold(self.X_test, n_features)
+
+        n_text_stored = X_train.nnz - self._other_stored_nnz
+        density = (self._other_nnz + n_text_stored) / (
+            X_train.shape[0] * X_train.shape[1])
+        if density >= self.sparse_threshold:
+            return X_train.toarray(), X_test.toarray()
+        return X_train, X_test
+
+    def transform(self, max_features=None):
+        """
+        Get the training and validation matrices for a `max_features`, or an
+        `n_features` for hashed text features
+
+        Parameters
+        ----------
+        max_features : int or None
+            Number of vocabulary terms to keep, or of hashed text columns, a
+            power of two, `None` to keep all of them
+
+        Returns
+        -------
+        tuple :
+            The transformed training and validation slices, as sparse or dense
+            matrices the same way the `ColumnTransformer` would output them
+        """
+        if self._hashed:
+            return self._transform_hashed(max_features or self.n_vocab)
+        if max_features is None or max_features >= self.n_vocab:
+            kept = np.arange(self.n_vocab)
+        else:
+            kept = np.sort(self._frequency_rank[:max_features])
+
+        columns = np.concatenate([
+            self._other_columns[self._other_columns < self._text_offset],
+            kept + self._text_offset,
+            self._other_columns[self._other_columns >= self._text_offset]
+        ])
+        X_train = self.X_train[:, columns]
+        X_test = self.X_test[:, columns]
+
+        nnz = self._other_nnz + self._text_nnz[kept].sum()
+        density = nnz / (X_train.shape[0] * X_train.shape[1])
+        if density >= self.sparse_threshold:
+            return X_train.toarray(), X_test.toarray()
+        return X_train, X_test
+
+
+class TransformedFold():
+    """
+    The training and validation slices of a `PreprocessedFold` after further
+    pipeline steps, e.g. a neighbor graph, fitted once on the training slice
+    for a `max_features` and a fraction of the training rows.
+
+    It has the same interface as `PreprocessedFold`, so that the final
+    estimator of every candidate sharing these steps is fit on it directly.
+    The steps are only fitted by `fit`, or by `transform` without keeping
+    the result, so that a fold used by a single candidate is fitted in the
+    worker of that candidate, rather than fitted and shipped back by another
+    worker or kept in memory.
+    A neighbor graph keeps at most as many neighbors as there are other
+    training rows, and a Nystroem map at most as many components as there
+    are training rows, so that on a small fraction of the training slice the
+    candidates with fewer neighbors are still evaluated, like estimators
+    fitted on the fraction directly.
+
+    Attributes
+    ----------
+    X_train : numpy.ndarray or scipy.sparse.spmatrix
+        The transformed training slice
+    X_test : numpy.ndarray or scipy.sparse.spmatrix
+        The transformed validation slice
+    y_train : pandas.Series
+        Target of the training slice
+    y_test : pandas.Series
+        Target of the validation slice
+
+    Methods
+    -------
+    fit()
+        Fit the steps and transform both slices
+    transform(max_features = None)
+        Get the training and validation matrices
+    """
+
+    def __init__(self, steps, fold, max_features=None, train_rows=None):
+        """
+        Parameters
+        ----------
+        steps : sklearn.pipeline.Pipeline
+            The unfitted steps, which are cloned before fitting
+        fold : PreprocessedFold
+            The preprocessed fold
+        max_features : int or None
+            Number of vocabulary terms to keep, `None` to keep all of them
+        train_rows : numpy.ndarray or None
+            Rows of the training slice to fit on, `None` for all of them
+        """
+        self.y_train, self.y_test = fold.y_train, fold.y_test
+        if train_rows is not None:
+            self.y_train = self.y_train.iloc[train_rows]
+        self._pending = (steps, fold, max_features, train_rows)
+
+    def _fit_transform(self):
+        steps, fold, max_features, train_rows = self._pending
+        X_train, X_test = fold.transform(max_features)
+        if train_rows is not None:
+            X_train = X_train[train_rows]
+        steps = clone(steps)
+        for _, step in steps.steps:
+            if isinstance(step, KNeighborsTransformer):
+                step.set_params(n_neighbors=min(
+                    step.n_neighbors, X_train.shape[0] - 1))
+            elif isinstance(step, Nystroem):
+                step.set_params(n_components=min(
+                    step.n_components, X_train.shape[0]))
+        X_train = steps.fit_transform(X_train, self.y_train)
+        return X_train, steps.transform(X_test)
+
+    def fit(self):
+        """
+        Fit the steps and transform both slices, unless already done
+
+        Returns
+        -------
+        TransformedFold :
+            The fitted fold
+        """
+        if self._pending is not None:
+            self.X_train, self.X_test = self._fit_transform()
+            # The preprocessed fold is no longer needed, nor shipped with
+            # this one
+            self._pending = None
+        return self
+
+    def transform(self, max_features=None):
+        """
+        Get the training and validation matrices
+
+        Parameters
+        ----------
+        max_features : int or None
+            Ignored, as the vocabulary was already pruned
+
+        Returns
+        -------
+        tuple :
+            The transformed training and validation slices
+        """
+        if self._pending is not None:
+            return self._fit_transform()
+        return self.X_train, self.X_test
+
+
+class FoldCache():
+    """
+    The `PreprocessedFold`s of a dataset, keyed by the preprocessor
+    configuration and the fold index.
+
+    A single cache can be shared by several searches over the same data and
+    folds, e.g. by the tuners of different model families, so that each
+    preprocessor configuration is fitted only once per fold.
+
+    Attributes
+    ----------
+    X : pandas.DataFrame
+        The features of the whole training set
+    y : pandas.Series
+        The target of the whole training set
+    folds : list of tuple
+        The training and validation indices of every fold
+    trace : bool
+        Whether to record the spans of the sub-transformers of every fold,
+        see `PreprocessedFold`
+
+    Methods
+    -------
+    prefetch(preprocessors, parallel = None)
+        Preprocess every fold for each of the preprocessors
+    get(preprocessor, i)
+        Get the preprocessed fold `i` for a preprocessor
+    """
+
+    def __init__(self, X, y, folds, text_transformer='countvectorizer',
+                 trace=False):
+        self.X = X
+        self.y = y
+        self.folds = folds
+        self.text_transformer = text_transformer
+        self.trace = trace
+        self._folds = {}
+
+    @staticmethod
+    def _tag(fold, i):
+        # Label the spans of a fold with its index
+        for event in fold.trace_events:
+            event['args']['fold'] = i
+        return fold
+
+    def _key(self, preprocessor, i):
+        # Unfitted estimators with the same parameters hash the same
+        return joblib.hash(clone(preprocessor)), i
+
+    def prefetch(self, preprocessors, parallel=None):
+        """
+        Preprocess every fold for each of the preprocessors
+
+        Parameters
+        ----------
+        preprocessors : list of sklearn.compose.ColumnTransformer
+            The unfitted preprocessors
+        parallel : joblib.Parallel or None
+            The parallel pool to preprocess with, `None` to run sequentially
+        """
+        missing = {}
+        for preprocessor in preprocessors:
+            for i in range(len(self.folds)):
+                key = self._key(preprocessor, i)
+                if key not in self._folds:
+                    missing[key] = (preprocessor, i)
+        if parallel is None:
+            parallel = Parallel(n_jobs=None)
+        preprocessed = parallel(
+            delayed(PreprocessedFold)(
+                preprocessor, self.X, self.y, *self.folds[i],
+                text_transformer=self.text_transformer, trace=self.trace)
+            for preprocessor, i in missing.values())
+        for (_, i), fold in zip(missing, preprocessed):
+            self._tag(fold, i)
+        self._folds.update(zip(missing, preprocessed))
+
+    def get(self, preprocessor, i):
+        """
+        Get the preprocessed fold `i` for a preprocessor
+
+        Parameters
+        ----------
+        preprocessor : sklearn.compose.ColumnTransformer
+            The unfitted preprocessor
+        i : int
+            Index of the fold
+
+        Returns
+        -------
+        PreprocessedFold :
+            The preprocessed fold, fitted on first access
+        """
+        key = self._key(preprocessor, i)
+        if key not in self._folds:
+            self._folds[key] = self._tag(PreprocessedFold(
+                preprocessor, self.X, self.y, *self.folds[i],
+                text_transformer=self.text_transformer, trace=self.trace), i)
+        return self._folds[key]
@@ -0,0 +1,82 @@
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.utils import _safe_indexing
+
+
+def partial_fit_transformer(transformer, X, y=None):
+    """
+    Update a fitted transformer, or a pipeline, with a batch of rows
+
+    The steps of a pipeline are updated in order, each on the batch
+    transformed by the previous steps. A step is updated with its
+    `partial_fit` if it has one, and left as is if it is stateless, e.g. a
+    `HashingVectorizer` or a parser.
+
+    Parameters
+    ----------
+    transformer : sklearn.base.BaseEstimator
+        The fitted transformer, pipeline or estimator
+    X : pandas.DataFrame or array-like
+        The batch
+    y : pandas.Series or None
+        The target of the batch
+
+    Returns
+    -------
+    sklearn.base.BaseEstimator :
+        The updated transformer
+    """
+    if isinstance(transformer, str):
+        # 'drop' or 'passthrough'
+        return transformer
+    if isinstance(transformer, Pipeline):
+        for _, step in transformer.steps[:-1]:
+            X = partial_fit_transformer(step, X, y).transform(X)
+        partial_fit_transformer(transformer.steps[-1][1], X, y)
+    elif hasattr(transformer, 'partial_fit'):
+        transformer.partial_fit(X, y)
+    elif not transformer._get_tags()['stateless']:
+        raise TypeError(
+            f"{type(transformer).__name__} has no partial_fit and is not "
+            "stateless, hence cannot be updated with a batch")
+    return transformer
+
+
+class StreamingColumnTransformer(ColumnTransformer):
+    """
+    A `ColumnTransformer` that can be updated with batches of rows.
+
+    The first batch fits it, and every later batch updates the fitted
+    transformers with `partial_fit_transformer`, so that its transformers
+    must either have a `partial_fit`, e.g. a `StandardScaler` keeping running
+    statistics, or be stateless, e.g. a `HashingVectorizer`. The number of
+    output columns then never changes.
+
+    Methods
+    -------
+    partial_fit(X, y = None)
+        Fit on the first batch, and update with the later ones
+    """
+
+    def partial_fit(self, X, y=None):
+        if not hasattr(self, 'transformers_'):
+            return self.fit(X, y)
+        for _, transformer, columns in self.transformers_:
+            partial_fit_transformer(
+                transformer, _safe_indexing(X, columns, axis=1), y)
+        return self
+
+
+class IncrementalPipeline(Pipeline):
+    """
+    A `Pipeline` that can be updated with batches of rows, for a final
+    estimator with a `partial_fit`, e.g. an `SGDRegressor`.
+
+    Methods
+    -------
+    partial_fit(X, y)
+        Update every step with a batch, see `partial_fit_transformer`
+    """
+
+    def partial_fit(self, X, y):
+        return partial_fit_transformer(self, X, y)
@@ -0,0 +1,271 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+def peak_memory_mib():
+    """
+    Get the peak resident set size of the current process
+
+    Returns
+    -------
+    float or None :
+        The peak memory in MiB, or `None` where `resource` is unavailable
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # `ru_maxrss` is in bytes on macOS and in KiB elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class Tracer():
+    """
+    Records timed spans of work, e.g. transformer fits or candidate fits.
+
+    Every span is a dictionary with its name, category, start time and
+    duration in microseconds since the epoch, so that spans recorded in
+    different processes line up, the process and thread ids, the peak
+    resident set size of the process at the end of the span and how much the
+    span raised it, and extra arguments. Spans recorded elsewhere, e.g. in
+    worker processes, are merged with `extend`.
+
+    Attributes
+    ----------
+    events : list of dict
+        The recorded spans
+
+    Methods
+    -------
+    span(name, category, **args)
+        Record the span of the enclosed code
+    extend(events)
+        Add spans recorded by another tracer
+    write_jsonl(path)
+        Write the spans as JSON lines
+    write_chrome_trace(path)
+        Write the spans in the Chrome trace event format
+    summary()
+        Get the total time and memory growth of the spans of every name
+    """
+
+    def __init__(self):
+        self.events = []
+        self._local = threading.local()
+
+    def current(self):
+        """
+        Get the name of the innermost open span of the current thread
+
+        Returns
+        -------
+        str or None :
+            The name of the span, `None` outside of any span
+        """
+        stack = getattr(self._local, 'stack', [])
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, category, **args):
+        """
+        Record the span of the enclosed code
+
+        Parameters
+        ----------
+        name : str
+            Name of the span
+        category : str
+            Category of the span, e.g. `"preprocessor"`
+        **args
+            Extra JSON-serializable arguments of the span
+        """
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(name)
+        start_peak = peak_memory_mib()
+        start = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            stack.pop()
+            peak = peak_memory_mib()
+            self.events.append({
+                'name': name,
+                'category': category,
+                'start_us': int(start * 1e6),
+                'duration_us': int(duration * 1e6),
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'peak_rss_mib': peak,
+                'peak_rss_growth_mib': (
+                    None if peak is None else peak - start_peak),
+                'args': args
+            })
+
+    def extend(self, events):
+        """
+        Add spans recorded by another tracer
+
+        Parameters
+        ----------
+        events : list of dict
+            The spans
+        """
+        self.events.extend(events)
+
+    def write_jsonl(self, path):
+        """
+        Write the spans as JSON lines, in the order they started
+
+        Parameters
+        ----------
+        path : str
+            Path to the file
+        """
+        with open(path, 'w') as file:
+            for event in sorted(self.events, key=lambda e: e['start_us']):
+                file.write(json.dumps(event, default=str) + '\n')
+
+    def write_chrome_trace(self, path):
+        """
+        Write the spans in the Chrome trace event format, which can be opened
+        in `chrome://tracing` or Perfetto
+
+        Parameters
+        ----------
+        path : str
+            Path to the file
+        """
+        trace_events = [
+            {
+                'name': event['name'],
+                'cat': event['category'],
+                'ph': 'X',
+                'ts': event['start_us'],
+                'dur': event['duration_us'],
+                'pid': event['pid'],
+                'tid': event['tid'],
+                'args': event['args'] | {
+                    'peak_rss_mib': event['peak_rss_mib'],
+                    'peak_rss_growth_mib': event['peak_rss_growth_mib']
+                }
+            }
+            for event in self.events]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace_events,
+                       'displayTimeUnit': 'ms'}, file, default=str)
+
+    def summary(self):
+        """
+        Get the total time and memory growth of the spans of every name
+
+        Returns
+        -------
+        pandas.DataFrame :
+            The number of spans, their total and longest duration in seconds
+            and their largest peak memory growth in MiB, for every span name,
+            from the longest total duration
+        """
+        events = pd.DataFrame(
+            self.events,
+            columns=['name', 'duration_us', 'peak_rss_growth_mib'])
+        events['seconds'] = events['duration_us'] / 1e6
+        return events.groupby('name').agg(
+            count=('seconds', 'size'),
+            total_seconds=('seconds', 'sum'),
+            max_seconds=('seconds', 'max'),
+            max_peak_rss_growth_mib=('peak_rss_growth_mib', 'max')
+        ).sort_values('total_seconds', ascending=False)
+
+
+def _input_columns(X):
+    if isinstance(X, pd.DataFrame):
+        return tuple(X.columns)
+    if isinstance(X, pd.Series):
+        return X.name
+    return None
+
+
+def _blocks(column_transformer):
+    # The classes of every transformer within the column transformer, and the
+    # block names keyed by class and input columns
+    classes, names = {type(column_transformer)}, {}
+    for name, transformer, columns in column_transformer.transformers:
+        if isinstance(transformer, str):
+            continue
+        key = tuple(columns) if isinstance(columns, list) else columns
+        names[(type(transformer), key)] = name
+        classes.add(type(transformer))
+        for _, step in getattr(transformer, 'steps', []):
+            classes.add(type(step))
+    return classes, names
+
+
+@contextmanager
+def trace_transformers(tracer, column_transformer):
+    """
+    Record a span for every `fit`, `transform` and `fit_transform` of the
+    column transformer and its sub-transformers in the enclosed code
+
+    The methods are wrapped on the classes of the transformers, so that the
+    clones the column transformer fits are traced as well, in every thread of
+    the process, until the end of the block. A block is named as in the
+    column transformer, e.g. `"countvectorizer"`, and a step of a pipeline
+    after its block, e.g. `"pipeline-2/StandardScaler"`.
+
+    Parameters
+    ----------
+    tracer : Tracer
+        The tracer to record the spans with
+    column_transformer : sklearn.compose.ColumnTransformer
+        The column transformer whose transformers to trace, fitted or not
+    """
+    classes, names = _blocks(column_transformer)
+    patched = []
+
+    def wrap(cls, method_name, method):
+        def traced(self, X, *args, **kwargs):
+            if type(self) is not cls:
+                return method(self, X, *args, **kwargs)
+            name = names.get((cls, _input_columns(X)))
+            if name is None:
+                # Named after the enclosing span, unless it is the same
+                # transformer calling another of its methods
+                parent = tracer.current()
+                parent = None if parent is None else parent.rsplit('.', 1)[0]
+                if parent is None:
+                    name = cls.__name__
+                elif parent.rsplit('/', 1)[-1] == cls.__name__:
+                    name = parent
+                else:
+                    name = f'{parent}/{cls.__name__}'
+            # Sparse matrices have no length
+            n_rows = X.shape[0] if hasattr(X, 'shape') else len(X)
+            with tracer.span(f'{name}.{method_name}', 'preprocessor',
+                             n_rows=n_rows):
+                return method(self, X, *args, **kwargs)
+        return traced
+
+    for cls in classes:
+        for method_name in ('fit', 'transform', 'fit_transform'):
+            if not hasattr(cls, method_name):
+                continue
+            patched.append(
+                (cls, method_name, cls.__dict__.get(method_name)))
+            setattr(cls, method_name,
+                    wrap(cls, method_name, getattr(cls, method_name)))
+    try:
+        yield tracer
+    finally:
+        for cls, method_name, original in patched:
+            if original is None:
+                delattr(cls, method_name)
+            else:
+                setattr(cls, method_name, original)
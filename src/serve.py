@@ -0,0 +1,397 @@
+# author: Manvir Kohli, Julie Song, Kelvin Wong
+# date: 2026-10-18
+
+"""This script serves the rating predictions of tuned models over HTTP on a
+local port. The models are loaded once, and the rows of concurrent requests
+are coalesced into micro-batches, so that the per-call overhead of the
+pipelines is paid once per batch rather than once per request.
+
+Endpoints:
+POST /predict/<model>  Predict a JSON row, or a JSON list of rows, with the
+                       schema of `chocolate.csv`, e.g. `tuned_ridge`
+GET  /metrics          Latency percentiles and batch sizes of every model
+GET  /health           Names of the models served
+
+Usage: src/serve.py [--model=<model_path>...] [--host=<host>] [--port=<port>] [--max-batch-size=<n_rows>] [--max-latency-ms=<ms>]
+
+Options:
+--model=<model_path>       Path to a tuned model, all the tuned models (results/models/tuned_*.joblib) if omitted
+--host=<host>              Host to listen on [default: 127.0.0.1]
+--port=<port>              Port to listen on [default: 8000]
+--max-batch-size=<n_rows>  Largest number of rows predicted at once [default: 64]
+--max-latency-ms=<ms>      Longest time a row waits for a batch to fill up [default: 2]
+"""
+
+import asyncio
+import glob
+import json
+import time
+from collections import deque
+from http import HTTPStatus
+
+import numpy as np
+import pandas as pd
+from docopt import docopt
+
+from .models.model_artifact import load_model
+from .predict import model_names
+
+
+class LatencyMetrics():
+    """
+    Latencies and batch sizes of the most recent predictions of a model
+
+    Attributes
+    ----------
+    latencies : collections.deque
+        Latencies in seconds of the most recent rows
+    batch_sizes : collections.deque
+        Sizes of the most recent batches
+    n_rows : int
+        Number of rows predicted since the start
+    n_batches : int
+        Number of batches predicted since the start
+
+    Methods
+    -------
+    record(latencies)
+        Record the latencies of the rows of a batch
+    summary()
+        Get the latency percentiles and batch sizes
+    """
+
+    def __init__(self, window=10000):
+        """
+        Parameters
+        ----------
+        window : int
+            Number of most recent rows and batches to keep, defaulted to 10000
+        """
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.n_rows = 0
+        self.n_batches = 0
+
+    def record(self, latencies):
+        """
+        Record the latencies of the rows of a batch
+
+        Parameters
+        ----------
+        latencies : list of float
+            Latency in seconds of every row of the batch
+        """
+        self.latencies.extend(latencies)
+        self.batch_sizes.append(len(latencies))
+        self.n_rows += len(latencies)
+        self.n_batches += 1
+
+    def summary(self):
+        """
+        Get the latency percentiles and batch sizes
+
+        Returns
+        -------
+        dict :
+            The number of rows and batches, the p50 and p99 latencies in
+            milliseconds and the mean and largest batch sizes
+        """
+        summary = {'rows': self.n_rows, 'batches': self.n_batches}
+        if self.latencies:
+            p50, p99 = np.percentile(self.latencies, [50, 99]) * 1000
+            summary |= {
+                'p50_ms': round(float(p50), 3),
+                'p99_ms': round(float(p99), 3),
+                'mean_batch_size': round(float(np.mean(self.batch_sizes)), 2),
+                'max_batch_size': int(max(self.batch_sizes))
+            }
+        return summary
+
+
+class MicroBatcher():
+    """
+    Coalesces the rows of concurrent requests into batches for a model.
+
+    A batch is predicted as soon as it has `max_batch_size` rows, or
+    `max_latency` seconds after its first row arrived, whichever comes
+    first. The batches are predicted in a thread, so that the event loop
+    keeps accepting requests meanwhile. A batch that fails fails the requests
+    of its rows, and the batches that follow are predicted as usual.
+
+    Attributes
+    ----------
+    model : sklearn.pipeline.Pipeline
+        The fitted pipeline
+    max_batch_size : int
+        Largest number of rows predicted at once
+    max_latency : float
+        Longest time in seconds a row waits for its batch to fill up
+    metrics : LatencyMetrics
+        The latencies and batch sizes of the model
+
+    Methods
+    -------
+    start()
+        Start predicting the batches in the background
+    predict(row)
+        Predict a row, as part of a batch
+    """
+
+    def __init__(self, model, max_batch_size=64, max_latency=0.002):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.metrics = LatencyMetrics()
+        self._columns = list(model.feature_names_in_)
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        """
+        Start predicting the batches in the background
+        """
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def predict(self, row):
+        """
+        Predict a row, as part of a batch
+
+        Parameters
+        ----------
+        row : dict
+            The features of the row, missing ones being treated as missing
+            values
+
+        Returns
+        -------
+        float :
+            The predicted rating
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, time.perf_counter(), future))
+        return await future
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(
+                    await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _predict_batch(self, rows):
+        # A row that fails to predict, e.g. with an unexpected value, only
+        # fails its own request rather than the whole batch
+        try:
+            X = pd.DataFrame.from_records(rows, columns=self._columns)
+            return list(self.model.predict(X))
+        except Exception:
+            if len(rows) == 1:
+                raise
+        predictions = []
+        for row in rows:
+            try:
+                predictions.append(self._predict_batch([row])[0])
+            except Exception as error:
+                predictions.append(error)
+        return predictions
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            rows, arrivals, futures = zip(*batch)
+            try:
+                predictions = await loop.run_in_executor(
+                    None, self._predict_batch, rows)
+                done = time.perf_counter()
+                for future, prediction in zip(futures, predictions):
+                    if future.done():
+                        continue
+                    if isinstance(prediction, Exception):
+                        future.set_exception(prediction)
+                    else:
+                        future.set_result(float(prediction))
+                self.metrics.record([done - arrival for arrival in arrivals])
+            except Exception as error:
+                # The requests of the batch fail rather than wait forever,
+                # and the loop goes on with the next batch
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(error)
+
+
+class PredictionServer():
+    """
+    A minimal asyncio HTTP/1.1 server of the predictions of tuned models.
+
+    Attributes
+    ----------
+    batchers : dict
+        The `MicroBatcher` of every model, keyed by model name
+
+    Methods
+    -------
+    start(host, port)
+        Start the batchers and listen for requests
+    serve(host, port)
+        Serve the predictions until cancelled
+    """
+
+    def __init__(self, models, max_batch_size=64, max_latency=0.002):
+        """
+        Parameters
+        ----------
+        models : dict
+            The fitted pipelines, keyed by model name
+        max_batch_size : int
+            Largest number of rows predicted at once, defaulted to 64
+        max_latency : float
+            Longest time in seconds a row waits for its batch to fill up,
+            defaulted to 0.002
+        """
+        self.batchers = {
+            name: MicroBatcher(model, max_batch_size, max_latency)
+            for name, model in models.items()}
+
+    async def _route(self, method, path, body):
+        if method == 'GET' and path == '/health':
+            return HTTPStatus.OK, {'models': list(self.batchers)}
+        if method == 'GET' and path == '/metrics':
+            return HTTPStatus.OK, {
+                name: batcher.metrics.summary()
+                for name, batcher in self.batchers.items()}
+        if method == 'POST' and path.startswith('/predict/'):
+            batcher = self.batchers.get(path[len('/predict/'):])
+            if batcher is None:
+                return HTTPStatus.NOT_FOUND, {'error': 'Unknown model'}
+            try:
+                rows = json.loads(body)
+            except ValueError:
+                return HTTPStatus.BAD_REQUEST, {'error': 'Invalid JSON'}
+            if not isinstance(rows, (dict, list)) or isinstance(rows, list) \
+                    and not all(isinstance(row, dict) for row in rows):
+                return HTTPStatus.BAD_REQUEST, {
+                    'error': 'Expected a JSON object or a list of objects'}
+            if isinstance(rows, dict):
+                return HTTPStatus.OK, {'rating': await batcher.predict(rows)}
+            ratings = await asyncio.gather(
+                *(batcher.predict(row) for row in rows), return_exceptions=True)
+            if any(isinstance(rating, Exception) for rating in ratings):
+                return HTTPStatus.BAD_REQUEST, {'ratings': [
+                    None if isinstance(rating, Exception) else rating
+                    for rating in ratings]}
+            return HTTPStatus.OK, {'ratings': ratings}
+        return HTTPStatus.NOT_FOUND, {'error': 'Unknown endpoint'}
+
+    async def _handle(self, reader, writer):
+        # Serve the requests of a connection one after the other, as long as
+        # the client keeps it alive
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, path, version = request_line.decode().split()
+                    headers = {}
+                    while (line := await reader.readline()) not in (
+                            b'\r\n', b'\n', b''):
+                        name, _, value = line.decode().partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                    body = await reader.readexactly(
+                        int(headers.get('content-length', 0)))
+                except ValueError:
+                    # Where the next request starts is unknown after a
+                    # malformed one, so that the connection is closed
+                    self._respond(writer, HTTPStatus.BAD_REQUEST,
+                                  {'error': 'Malformed request'}, False)
+                    await writer.drain()
+                    break
+
+                try:
+                    status, response = await self._route(method, path, body)
+                except Exception as error:
+                    # The features of the request could not be predicted
+                    status = HTTPStatus.BAD_REQUEST
+                    response = {'error': str(error)}
+
+                keep_alive = (
+                    headers.get('connection', '').lower() != 'close'
+                    and version == 'HTTP/1.1')
+                self._respond(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _respond(writer, status, response, keep_alive):
+        content = json.dumps(response).encode()
+        writer.write(
+            f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(content)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}'
+            '\r\n\r\n'.encode() + content)
+
+    async def start(self, host='127.0.0.1', port=8000):
+        """
+        Start the batchers and listen for requests
+
+        Parameters
+        ----------
+        host : str
+            Host to listen on, defaulted to `"127.0.0.1"`
+        port : int
+            Port to listen on, 0 for any free port, defaulted to 8000
+
+        Returns
+        -------
+        asyncio.Server :
+            The server, whose `sockets` give the port listened on
+        """
+        for batcher in self.batchers.values():
+            batcher.start()
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        """
+        Serve the predictions until cancelled
+
+        Parameters
+        ----------
+        host : str
+            Host to listen on, defaulted to `"127.0.0.1"`
+        port : int
+            Port to listen on, defaulted to 8000
+        """
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+
+    # Only the tuned models, rather than e.g. the online model checkpoint
+    model_paths = opt["--model"] or sorted(
+        glob.glob('results/models/tuned_*.joblib'))
+    assert model_paths, "Please check the model filepaths"
+    models = {
+        name: load_model(model_path)
+        for name, model_path in zip(model_names(model_paths), model_paths)}
+    server = PredictionServer(
+        models, max_batch_size=int(opt["--max-batch-size"]),
+        max_latency=float(opt["--max-latency-ms"]) / 1000)
+    print(f"Serving {', '.join(models)} on {opt['--host']}:{opt['--port']}")
+    asyncio.run(server.serve(opt["--host"], int(opt["--port"])))
@@ -1,116 +1,283 @@
 # author: Manvir Kohli, Julie Song, Kelvin Wong
 # date: 2022-11-25
 
-"""This script takes multiple models as inputs and calculates their performance
-on test data based on R^2 score and Mean Absolute Percentage Error
-
-Usage: ./src/test_data_performance.py
+"""This module takes every tuned model and every CV result file as inputs and
+calculates their performance on test data based on R^2 score and Mean
+Absolute Percentage Error, see `python -m src evaluate`.
 
+The models are loaded and the test data read once, and the models are
+scored in parallel worker processes, one per distinct fitted preprocessor,
+which transforms the test data once, in chunks, so that the transformed
+data need not fit in memory at once.
 """
+import glob
+import logging
+import os
+import re
+
+import joblib
 import numpy as np
 import pandas as pd
-from docopt import docopt
-from scipy.stats import uniform
-from sklearn.pipeline import make_pipeline
-from sklearn.neighbors import KNeighborsRegressor
-from sklearn.svm import SVR
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.linear_model import Ridge
-from joblib import dump, load
-import pickle
-import os
-from sklearn.metrics import mean_absolute_percentage_error,r2_score
-    
-def main():
+from joblib import Parallel, delayed
+
+from .chocolate_data import TARGET, read_chocolate_csv
+from .models.model_artifact import load_model
+
+logger = logging.getLogger(__name__)
+
+# Display names of the model families, in the order of the summaries. Other
+# families found in the folders are named after their files.
+MODEL_NAMES = {
+    'decision_tree': 'Decision Tree',
+    'knn': 'KNN',
+    'ridge': 'Ridge',
+    'svm_rbf': 'SVM RBF',
+    'random_forest': 'Random Forest',
+}
+
+
+def discover(directory, pattern):
+    """
+    Find the files of every model family in a folder
+
+    Parameters
+    ----------
+    directory : str
+        Path to the folder
+    pattern : str
+        The file name pattern, with a `{}` for the model family, e.g.
+        `"tuned_{}.joblib"`
+
+    Returns
+    -------
+    dict :
+        The paths to the files, keyed by display name, in the order of
+        `MODEL_NAMES` followed by the other families in alphabetical order
+    """
+    prefix, suffix = pattern.split('{}')
+    families = {}
+    for path in glob.glob(os.path.join(directory, pattern.format('*'))):
+        family = re.fullmatch(
+            re.escape(prefix) + '(.+)' + re.escape(suffix),
+            os.path.basename(path)).group(1)
+        families[family] = path
+
+    order = list(MODEL_NAMES) + sorted(set(families) - set(MODEL_NAMES))
+    return {
+        MODEL_NAMES.get(family, family): families[family]
+        for family in order if family in families}
+
+
+class StreamingRegressionMetrics():
+    """
+    MAPE and R^2 score accumulated over chunks of predictions.
+
+    The target mean and variance are merged across chunks with the parallel
+    algorithm of Chan et al., so that R^2 is as accurate as if computed over
+    the whole test data at once.
+
+    Attributes
+    ----------
+    n : int
+        Number of rows so far
+
+    Methods
+    -------
+    update(y_true, y_pred)
+        Add a chunk of predictions
+    mape()
+        Get the mean absolute percentage error
+    r2()
+        Get the R^2 score
+    """
+
+    def __init__(self):
+        self.n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._absolute_percentage_error = 0.0
+        self._squared_error = 0.0
+
+    def update(self, y_true, y_pred):
+        """
+        Add a chunk of predictions
+
+        Parameters
+        ----------
+        y_true : numpy.ndarray
+            The target of the chunk
+        y_pred : numpy.ndarray
+            The predictions of the chunk
+        """
+        y_true = np.asarray(y_true, dtype=float)
+        y_pred = np.asarray(y_pred, dtype=float)
+        # Same as `mean_absolute_percentage_error` of scikit-learn
+        epsilon = np.finfo(np.float64).eps
+        self._absolute_percentage_error += np.sum(
+            np.abs(y_pred - y_true) / np.maximum(np.abs(y_true), epsilon))
+        self._squared_error += np.sum((y_true - y_pred) ** 2)
+
+        n_chunk = len(y_true)
+        mean_chunk = y_true.mean()
+        m2_chunk = np.sum((y_true - mean_chunk) ** 2)
+        n = self.n + n_chunk
+        delta = mean_chunk - self._mean
+        self._mean += delta * n_chunk / n
+        self._m2 += m2_chunk + delta ** 2 * self.n * n_chunk / n
+        self.n = n
+
+    def mape(self):
+        """
+        Get the mean absolute percentage error
+
+        Returns
+        -------
+        float :
+            The MAPE, as a fraction
+        """
+        return self._absolute_percentage_error / self.n
+
+    def r2(self):
+        """
+        Get the R^2 score
+
+        Returns
+        -------
+        float :
+            The R^2 score
+        """
+        return 1 - self._squared_error / self._m2
+
+
+def score_models(models, test_df, chunk_size):
     """
-    Checks model performance on test data for 
-    Decision Tree, KNN, SVM RBF and Ridge Regression. 
-    The function takes no inputs and stores the output to /results
+    Score models sharing the same fitted preprocessor on the test data
+
+    The test data is transformed one chunk at a time, and every transformed
+    chunk is predicted by all the models.
 
     Parameters
     ----------
-    None
+    models : dict
+        The fitted pipelines, keyed by display name
+    test_df : pandas.DataFrame
+        The test dataset
+    chunk_size : int
+        Number of test rows scored at once
+
     Returns
     -------
-    A summary of cross validation scores under 'results/'cv_scores_summary.csv'
-    A summary of model performanceon test data  under 'test_data_results.csv'
+    dict :
+        The `StreamingRegressionMetrics` of every model, keyed by display name
+    """
+    preprocessor = next(iter(models.values()))[:-1]
+    metrics = {name: StreamingRegressionMetrics() for name in models}
+    for start in range(0, len(test_df), chunk_size):
+        chunk = test_df.iloc[start:start + chunk_size]
+        X_test = preprocessor.transform(chunk.drop(columns=[TARGET]))
+        for name, model in models.items():
+            metrics[name].update(
+                chunk[TARGET], model.steps[-1][1].predict(X_test))
+    return metrics
+
+
+def summarize_cv_scores(cv_paths):
+    """
+    Average the mean columns of the CV results of every model
+
+    Parameters
+    ----------
+    cv_paths : dict
+        The paths to the CV results, keyed by display name
+
+    Returns
+    -------
+    pandas.DataFrame :
+        The average of every mean column, as absolute percentages, with one
+        column per model
+    """
+    summaries = []
+    for name, cv_path in cv_paths.items():
+        cv_results = pd.read_csv(cv_path)
+        summaries.append(pd.DataFrame(
+            cv_results[[i for i in cv_results.columns if "mean" in i]].mean(),
+            columns=[name]))
+    return (abs(pd.concat(summaries, axis=1) * 100)).round(3)
+
+
+def main(test_path, model_dir, cv_dir, output_dir, chunk_size=100000,
+         n_jobs=-1):
+    """
+    Checks the performance on test data of every tuned model, and
+    summarizes their cross validation scores
+
+    A summary is skipped, with a warning, when its folder has no file.
+
+    Parameters
+    ----------
+    test_path : str
+        Path to the test dataset
+    model_dir : str
+        Path to the folder of the tuned models
+    cv_dir : str
+        Path to the folder of the CV results
+    output_dir : str
+        Path to the folder to save the summaries to
+    chunk_size : int
+        Number of test rows scored at once, defaulted to 100000
+    n_jobs : int
+        Number of worker processes, defaulted to -1, i.e. all CPUs
+
+    Returns
+    -------
+    A summary of cross validation scores under `output_dir/cv_scores_summary.csv`
+    A summary of model performance on test data under `output_dir/test_data_results.csv`
 
     Examples
     --------
-    >>> main()
+    >>> main('data/raw/test_df.csv', 'results/models', 'results/cv_scores', 'results')
     """
-    
-    ## Loading,aggregating and exporting CV Scores
-    
-    dt_cv = pd.read_csv('results/cv_scores/cv_results_decision_tree.csv')
-    knn_cv = pd.read_csv('results/cv_scores/cv_results_knn.csv')
-    ridge_cv = pd.read_csv('results/cv_scores/cv_results_ridge.csv')
-    svm_cv = pd.read_csv('results/cv_scores/cv_results_svm_rbf.csv')
-    rf_cv = pd.read_csv('results/cv_scores/cv_results_random_forest.csv')
-    
-    
-    dt_cv = pd.DataFrame(dt_cv[[i for i in dt_cv.columns if "mean" in i]].mean(),columns=["Decision Tree"])
-    knn_cv = pd.DataFrame(knn_cv[[i for i in knn_cv.columns if "mean" in i]].mean(),columns=["KNN"])
-    ridge_cv = pd.DataFrame(ridge_cv[[i for i in ridge_cv.columns if "mean" in i]].mean(),columns=["Ridge"])
-    svm_cv = pd.DataFrame(svm_cv[[i for i in svm_cv.columns if "mean" in i]].mean(),columns=["SVM RBF"])
-    rf_cv = pd.DataFrame(rf_cv[[i for i in rf_cv.columns if "mean" in i]].mean(),columns=["Random Forest"])
-    
-    
-    cv_results_summary = pd.concat([dt_cv,knn_cv,ridge_cv,svm_cv],axis=1)
-    cv_results_summary = (abs(cv_results_summary*100)).round(3)
-    cv_results_summary.to_csv('results/cv_scores_summary.csv')
-
-    ## loading test data and models
-    test_df = pd.read_csv('data/raw/test_df.csv')
-    X_test,y_test = test_df.drop(columns=['rating']),test_df['rating']
-
-    dt_model = load('results/models/tuned_decision_tree.joblib') 
-    knn_model = load('results/models/tuned_knn.joblib')
-    ridge_model = load('results/models/tuned_ridge.joblib')
-    svr_model = load('results/models/tuned_svm_rbf.joblib')
-    rf_model = load('results/models/tuned_random_forest.joblib')
-    
-
-    ## checking test R^2 scores
-#     test_r2_scores = {}
-#     dt_r2 =  r2_score(y_test,dt_model.predict(X_test))
-#     knn_r2 = r2_score(y_test,knn_model.predict(X_test))
-#     ridge_r2 = r2_score(y_test,ridge_model.predict(X_test))
-#     svr_r2 = r2_score(y_test,svr_model.predict(X_test))
-
-#     r2_score
-
-#     test_r2_scores['Decision_Tree'] = dt_r2
-#     test_r2_scores['KNN'] = knn_r2
-#     test_r2_scores['Ridge'] = ridge_r2
-#     test_r2_scores['SVM RBF'] = svr_r2
-
-    ## checking MAPE
-    test_mapes = {}
-
-    dt_mape =  mean_absolute_percentage_error(y_test,dt_model.predict(X_test))
-    knn_mape = mean_absolute_percentage_error(y_test,knn_model.predict(X_test))
-    ridge_mape = mean_absolute_percentage_error(y_test,ridge_model.predict(X_test))
-    svr_mape = mean_absolute_percentage_error(y_test,svr_model.predict(X_test))
-    rf_mape = mean_absolute_percentage_error(y_test,rf_model.predict(X_test))
-
-    test_mapes['Decision_Tree'] = dt_mape
-    test_mapes['KNN'] = knn_mape
-    test_mapes['Ridge'] = ridge_mape
-    test_mapes['SVM RBF'] = svr_mape
-    test_mapes['Random Forest'] = rf_mape                    
-
-    # scores_df = pd.DataFrame(test_r2_scores,index=['R^2 (%)'])
-    mape_df = pd.DataFrame(test_mapes,index=['MAPE (%)']).T
-
-    # test_data_results = pd.concat([scores_df,mape_df],axis = 0)
-    test_data_results = (mape_df*100).round(3)
-
-    test_data_results.to_csv('results/test_data_results.csv')
-
-    test_data_results
-
-    opt = docopt(__doc__)
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+    os.makedirs(output_dir, exist_ok=True)
+
+    ## Loading, aggregating and exporting CV Scores
+    cv_paths = discover(cv_dir, 'cv_results_{}.csv')
+    if cv_paths:
+        summarize_cv_scores(cv_paths).to_csv(
+            os.path.join(output_dir, 'cv_scores_summary.csv'))
+    else:
+        logger.warning(
+            "No CV results (cv_results_*.csv) in %s, skipping the CV score "
+            "summary", cv_dir)
+
+    model_paths = discover(model_dir, 'tuned_{}.joblib')
+    if not model_paths:
+        logger.warning(
+            "No tuned models (tuned_*.joblib) in %s, skipping the test data "
+            "results", model_dir)
+        return
+
+    ## Grouping the models by fitted preprocessor, so that the test data is
+    ## transformed once per group. The arrays of the models are memory-mapped,
+    ## and shared with the workers rather than copied.
+    groups = {}
+    for name, model_path in model_paths.items():
+        model = load_model(model_path)
+        groups.setdefault(joblib.hash(model[:-1]), {})[name] = model
+    test_df = read_chocolate_csv(test_path)
+
+    ## Scoring every group of models in parallel
+    scores = Parallel(n_jobs=min(n_jobs, len(groups)) if n_jobs > 0
+                      else n_jobs)(
+        delayed(score_models)(group, test_df, chunk_size)
+        for group in groups.values())
+    metrics = {name: m for score in scores for name, m in score.items()}
+
+    test_data_results = pd.DataFrame(
+        {
+            'MAPE (%)': [metrics[name].mape() * 100 for name in model_paths],
+            'R^2': [metrics[name].r2() for name in model_paths]
+        },
+        index=list(model_paths)
+    ).round(3)
+    test_data_results.to_csv(os.path.join(output_dir, 'test_data_results.csv'))
+
@@ -0,0 +1,19 @@
+import pandas as pd
+import pytest
+
+from src.chocolate_data import TARGET, load_chocolate
+
+TRAIN_PATH = 'data/raw/train_df.csv'
+
+
+def test_cached_frame_is_validated_with_target(tmp_path):
+    csv_path = tmp_path / 'reviews.csv'
+    df = pd.read_csv(TRAIN_PATH, nrows=20)
+    df.loc[0, TARGET] = 7.0
+    df.to_csv(csv_path, index=False)
+
+    # A load without the target caches the frame without checking it
+    assert len(load_chocolate(str(csv_path), target=False)) == 20
+    assert list((tmp_path / '.cache').iterdir())
+    with pytest.raises(AssertionError, match='between'):
+        load_chocolate(str(csv_path))
@@ -0,0 +1,139 @@
+import os
+import pickle
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+from scipy.stats import loguniform, randint
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+
+from src.chocolate_data import load_chocolate, split_target
+from src.models import execution
+from src.models.execution import FileQueueExecutor, make_executor
+from src.models.fold_cached_search_cv import FoldCachedSearchCV
+from src.preprocessor.chocolate import make_preprocessor
+
+TRAIN_PATH = 'data/raw/train_df.csv'
+MAX_FEATURES = 'columntransformer__countvectorizer__max_features'
+
+
+def start_worker(queue_dir):
+    # A worker of the command line, in its own process
+    return subprocess.Popen(
+        [sys.executable, '-m', 'src', 'worker', f'--queue-dir={queue_dir}'],
+        stdout=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def workers():
+    started = []
+
+    def start(queue_dir):
+        started.append(start_worker(queue_dir))
+        return started[-1]
+
+    yield start
+    for process in started:
+        process.kill()
+        process.wait()
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "Timed out"
+        time.sleep(0.05)
+
+
+def stall_once(marker_path):
+    # Hangs the first time, as in a worker killed while running the task,
+    # and returns at once afterwards
+    if not os.path.exists(marker_path):
+        open(marker_path, 'w').close()
+        time.sleep(600)
+    return 'done'
+
+
+def fail_unpickling():
+    raise ValueError("Cannot unpickle")
+
+
+class Unpicklable():
+    # Pickles fine, but fails to load in the worker
+    def __reduce__(self):
+        return fail_unpickling, ()
+
+
+def test_cv_results_match_the_local_backend(tmp_path, workers):
+    X, y = split_target(load_chocolate(TRAIN_PATH))
+    pipeline = make_pipeline(make_preprocessor(), Ridge())
+    distributions = {MAX_FEATURES: randint(100, 1000),
+                     'ridge__alpha': loguniform(1e-2, 1e3)}
+
+    def search(executor):
+        with executor:
+            return FoldCachedSearchCV(
+                pipeline, distributions, n_iter=4, random_state=522,
+                return_train_score=True, executor=executor).fit(X, y)
+
+    expected = search(make_executor('local', n_workers=1))
+    workers(tmp_path)
+    actual = search(FileQueueExecutor(str(tmp_path)))
+
+    assert actual.cv_results_['params'] == expected.cv_results_['params']
+    for key in ['mean_test_score', 'std_test_score', 'mean_train_score',
+                'rank_test_score']:
+        np.testing.assert_allclose(
+            actual.cv_results_[key], expected.cv_results_[key], rtol=1e-12,
+            err_msg=key)
+    np.testing.assert_allclose(
+        actual.predict(X), expected.predict(X), rtol=1e-12)
+
+
+def test_task_of_a_killed_worker_is_requeued(tmp_path, workers):
+    queue_dir = str(tmp_path / 'queue')
+    executor = FileQueueExecutor(queue_dir, lease_timeout=10.0)
+    first = workers(queue_dir)
+    future = executor.submit(stall_once, str(tmp_path / 'marker'))
+    wait_for(lambda: os.path.exists(tmp_path / 'marker'))
+    first.kill()
+    first.wait()
+
+    workers(queue_dir)
+    assert future.result(timeout=120) == 'done'
+    executor.shutdown()
+
+
+def test_task_that_cannot_be_unpickled_fails(tmp_path, workers):
+    executor = FileQueueExecutor(str(tmp_path))
+    workers(tmp_path)
+    future = executor.submit(str, Unpicklable())
+    with pytest.raises(ValueError, match="Cannot unpickle"):
+        future.result(timeout=60)
+    # The worker keeps serving the queue
+    assert executor.submit(sum, [1, 2]).result(timeout=60) == 3
+    executor.shutdown()
+
+
+def test_shared_objects_stay_loaded_while_their_files_exist(tmp_path):
+    paths = [str(tmp_path / f'{i}.pkl') for i in range(40)]
+    for i, path in enumerate(paths):
+        with open(path, 'wb') as file:
+            pickle.dump([i], file)
+    loaded = [execution._load_shared(path) for path in paths]
+    # Read once each, however many objects a search uses
+    assert all(execution._load_shared(path) is value
+               for path, value in zip(paths, loaded))
+
+    os.remove(paths[0])
+    execution._load_shared(paths[1])
+    assert paths[0] in execution._shared_objects
+    # Forgotten as soon as another object is read
+    with open(str(tmp_path / 'new.pkl'), 'wb') as file:
+        pickle.dump([], file)
+    execution._load_shared(str(tmp_path / 'new.pkl'))
+    assert paths[0] not in execution._shared_objects
+    assert paths[1] in execution._shared_objects
@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+from scipy.stats import loguniform, randint
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.exceptions import FitFailedWarning
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import RandomizedSearchCV
+from sklearn.neighbors import KNeighborsRegressor, KNeighborsTransformer
+from sklearn.pipeline import make_pipeline
+from sklearn.tree import DecisionTreeRegressor
+
+from src.chocolate_data import load_chocolate, split_target
+from src.models.fold_cached_search_cv import (
+    FoldCachedAdaptiveSearchCV, FoldCachedSearchCV)
+from src.models.nested_models import prefix_predictions
+from src.preprocessor.chocolate import make_preprocessor
+
+TRAIN_PATH = 'data/raw/train_df.csv'
+MAX_FEATURES = 'columntransformer__countvectorizer__max_features'
+
+
+@pytest.fixture(scope='module')
+def train_data():
+    return split_target(load_chocolate(TRAIN_PATH))
+
+
+class OffsetRegressor(RegressorMixin, BaseEstimator):
+    # Predicts the mean rating plus an offset, failing to fit on fewer rows
+    # than `min_rows`
+    def __init__(self, offset=0.0, min_rows=0):
+        self.offset = offset
+        self.min_rows = min_rows
+
+    def fit(self, X, y):
+        if len(y) < self.min_rows:
+            raise ValueError("Too few rows")
+        self.mean_ = np.mean(y)
+        return self
+
+    def predict(self, X):
+        return np.full(X.shape[0], self.mean_ + self.offset)
+
+
+# Pipelines with only a final estimator, and with an intermediate step fitted
+# once per fold and configuration
+SEARCHES = {
+    'ridge': (
+        make_pipeline(make_preprocessor(), Ridge()),
+        {MAX_FEATURES: randint(100, 1000),
+         'ridge__alpha': loguniform(1e-2, 1e3)}),
+    'decision_tree': (
+        make_pipeline(make_preprocessor(),
+                      DecisionTreeRegressor(random_state=0)),
+        {MAX_FEATURES: randint(100, 1000),
+         'decisiontreeregressor__max_depth': randint(1, 30)}),
+    'knn': (
+        make_pipeline(
+            make_preprocessor(),
+            KNeighborsTransformer(n_neighbors=30, mode='distance'),
+            KNeighborsRegressor(metric='precomputed')),
+        {MAX_FEATURES: [200, 800],
+         'kneighborsregressor__n_neighbors': randint(1, 30),
+         'kneighborsregressor__weights': ['uniform', 'distance']})
+}
+
+
+@pytest.mark.parametrize('name', SEARCHES)
+def test_cv_results_match_randomized_search(train_data, name):
+    pipeline, distributions = SEARCHES[name]
+    search_args = dict(n_iter=6, cv=5, random_state=522,
+                       return_train_score=True)
+    expected = RandomizedSearchCV(
+        pipeline, distributions, **search_args).fit(*train_data)
+    search = FoldCachedSearchCV(
+        pipeline, distributions, **search_args).fit(*train_data)
+
+    assert search.cv_results_['params'] == expected.cv_results_['params']
+    for key in (
+            [f'split{i}_test_score' for i in range(5)]
+            + [f'split{i}_train_score' for i in range(5)]
+            + ['mean_test_score', 'std_test_score', 'mean_train_score']):
+        np.testing.assert_allclose(
+            search.cv_results_[key], expected.cv_results_[key],
+            rtol=1e-10, atol=1e-12, err_msg=key)
+    np.testing.assert_array_equal(
+        search.cv_results_['rank_test_score'],
+        expected.cv_results_['rank_test_score'])
+    assert search.best_params_ == expected.best_params_
+    X, _ = train_data
+    np.testing.assert_allclose(
+        search.predict(X), expected.predict(X), rtol=1e-10, atol=1e-12)
+
+
+def test_failed_fits_score_error_score(train_data):
+    # A negative `alpha` fails the parameter validation of `Ridge`
+    pipeline = make_pipeline(make_preprocessor(), Ridge())
+    distributions = {'ridge__alpha': [-1.0, 1.0]}
+    with pytest.warns(FitFailedWarning, match='5 fits failed'):
+        search = FoldCachedSearchCV(
+            pipeline, distributions, n_iter=2, random_state=0,
+            error_score=-10.0).fit(*train_data)
+    failed = search.cv_results_['param_ridge__alpha'] == -1.0
+    np.testing.assert_array_equal(
+        search.cv_results_['mean_test_score'][failed], -10.0)
+    assert search.best_params_ == {'ridge__alpha': 1.0}
+
+    with pytest.raises(ValueError):
+        FoldCachedSearchCV(
+            pipeline, distributions, n_iter=2, random_state=0,
+            error_score='raise').fit(*train_data)
+
+
+def test_nested_forests_match_randomized_search(train_data):
+    # The default scoring, i.e. the R^2 of the pipeline, of the candidates
+    # scored on the first trees of a bigger forest
+    pipeline = make_pipeline(
+        make_preprocessor(), RandomForestRegressor(random_state=0))
+    distributions = {'randomforestregressor__n_estimators': [5, 10, 20],
+                     'randomforestregressor__max_depth': [3, 5]}
+    expected = RandomizedSearchCV(
+        pipeline, distributions, n_iter=6, random_state=0).fit(*train_data)
+    search = FoldCachedSearchCV(
+        pipeline, distributions, n_iter=6, random_state=0,
+        nested_param='randomforestregressor__n_estimators').fit(*train_data)
+
+    assert search.cv_results_['params'] == expected.cv_results_['params']
+    np.testing.assert_allclose(
+        search.cv_results_['mean_test_score'],
+        expected.cv_results_['mean_test_score'], rtol=1e-10)
+
+
+@pytest.mark.skipif(
+    not hasattr(RandomForestRegressor, 'estimators_samples_'),
+    reason="requires scikit-learn 1.4 or later")
+def test_out_of_bag_predictions_match_the_forest():
+    rng = np.random.RandomState(0)
+    X = rng.rand(300, 5)
+    y = X[:, 0] + 0.1 * rng.rand(300)
+    forest = RandomForestRegressor(
+        60, oob_score=True, random_state=522).fit(X, y)
+    predictions = prefix_predictions(forest, X, [10, 60], out_of_bag=True)
+    np.testing.assert_allclose(
+        predictions[60], forest.oob_prediction_, rtol=1e-6)
+
+
+def test_pruned_candidates_rank_after_the_completed_ones(train_data):
+    pipeline = make_pipeline(make_preprocessor(), OffsetRegressor())
+    distributions = {'offsetregressor__offset': [0.0, 0.1, 0.2, 3.0, 4.0]}
+    search = FoldCachedAdaptiveSearchCV(
+        pipeline, distributions, n_iter=5, random_state=0, n_startup=5,
+        scoring='neg_mean_absolute_error').fit(*train_data)
+
+    pruned = np.isnan(search.cv_results_['mean_test_score'])
+    ranks = search.cv_results_['rank_test_score']
+    assert search.n_pruned_ == pruned.sum() > 0
+    assert ranks[pruned].min() > ranks[~pruned].max()
+    np.testing.assert_array_equal(ranks[pruned], (~pruned).sum() + 1)
+    assert search.best_params_ == {'offsetregressor__offset': 0.0}
+
+
+def test_search_without_a_completed_candidate(train_data):
+    # Every fold fit fails, while the refit on the whole data does not
+    X, y = train_data
+    pipeline = make_pipeline(
+        make_preprocessor(), OffsetRegressor(min_rows=len(y)))
+    distributions = {'offsetregressor__offset': [0.0, 0.1, 0.2]}
+    with pytest.warns(FitFailedWarning):
+        search = FoldCachedAdaptiveSearchCV(
+            pipeline, distributions, n_iter=3, random_state=0).fit(X, y)
+
+    assert np.isnan(search.cv_results_['mean_test_score']).all()
+    np.testing.assert_array_equal(search.cv_results_['rank_test_score'], 1)
+    assert search.n_fits_to_best_ is None
+    assert search.best_index_ == 0
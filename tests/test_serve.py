@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+
+from src.chocolate_data import (
+    TARGET, load_chocolate, read_chocolate_rows, split_target)
+from src.preprocessor.chocolate import make_preprocessor
+from src.serve import PredictionServer
+
+TRAIN_PATH = 'data/raw/train_df.csv'
+TEST_PATH = 'data/raw/test_df.csv'
+
+
+@pytest.fixture(scope='module')
+def model():
+    return make_pipeline(make_preprocessor(), Ridge()).fit(
+        *split_target(load_chocolate(TRAIN_PATH)))
+
+
+class FailingModel():
+    # Predicts values that are not ratings, so that the whole batch fails
+    feature_names_in_ = ['ref']
+
+    def predict(self, X):
+        return ['not a rating'] * len(X)
+
+
+async def request(port, raw):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(raw)
+    await writer.drain()
+    status_line = await reader.readline()
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode().partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers['content-length']))
+    writer.close()
+    return int(status_line.split()[1]), json.loads(body)
+
+
+async def post(port, path, payload):
+    body = json.dumps(payload).encode()
+    return await request(port, (
+        f'POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n'
+        'Connection: close\r\n\r\n').encode() + body)
+
+
+def run(server, client):
+    # Serve on a free port while the client runs, failing rather than
+    # hanging if a request is never answered
+    async def main():
+        listener = await server.start(port=0)
+        async with listener:
+            return await client(listener.sockets[0].getsockname()[1])
+    return asyncio.run(asyncio.wait_for(main(), timeout=60))
+
+
+def test_batched_predictions_match_the_model(model):
+    rows = [{name: value for name, value in row.items() if name != TARGET}
+            for row in read_chocolate_rows(TEST_PATH)][:100]
+    server = PredictionServer(
+        {'ridge': model}, max_batch_size=16, max_latency=0.05)
+
+    async def client(port):
+        responses = await asyncio.gather(
+            *(post(port, '/predict/ridge', row) for row in rows),
+            post(port, '/predict/ridge', rows[:10]))
+        _, metrics = await request(port, b'GET /metrics HTTP/1.0\r\n\r\n')
+        return responses, metrics
+
+    (*responses, (many_status, many)), metrics = run(server, client)
+    X_test, _ = split_target(load_chocolate(TEST_PATH))
+    expected = model.predict(X_test)[:100]
+    assert [status for status, _ in responses] == [200] * len(rows)
+    np.testing.assert_allclose(
+        [response['rating'] for _, response in responses], expected)
+    assert many_status == 200
+    np.testing.assert_allclose(many['ratings'], expected[:10])
+    # The concurrent requests were predicted together
+    assert metrics['ridge']['rows'] == 110
+    assert metrics['ridge']['batches'] < 110
+    assert metrics['ridge']['max_batch_size'] > 1
+
+
+def test_malformed_requests_get_a_bad_request(model):
+    server = PredictionServer({'ridge': model})
+
+    async def client(port):
+        return await asyncio.gather(
+            request(port, b'POST /predict/ridge HTTP/1.1\r\n'
+                          b'Content-Length: abc\r\n\r\n'),
+            request(port, b'garbage\r\n\r\n'),
+            post(port, '/predict/ridge', 'not a row'),
+            post(port, '/predict/ridge', [1, 2]),
+            request(port, b'POST /predict/ridge HTTP/1.1\r\n'
+                          b'Content-Length: 3\r\n\r\n{{{'))
+
+    assert [status for status, _ in run(server, client)] == [400] * 5
+
+
+def test_failed_batch_does_not_stop_the_batcher():
+    server = PredictionServer(
+        {'failing': FailingModel()}, max_batch_size=4, max_latency=0.01)
+
+    async def client(port):
+        # The batcher keeps serving after a batch fails
+        first = await asyncio.gather(
+            *(post(port, '/predict/failing', {'ref': i}) for i in range(6)))
+        second = await post(port, '/predict/failing', {'ref': 0})
+        return first + [second]
+
+    assert [status for status, _ in run(server, client)] == [400] * 7